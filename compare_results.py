@@ -3,6 +3,9 @@
 
 Usage:
   python compare_results.py simple.json reasoned.json
+
+Items are matched on (task, contest_number, problem), not position. For more
+than two runs and significance tests see ``python -m humor_eval.compare``.
 """
 import json
 import argparse
@@ -14,6 +17,10 @@ def load(path: str) -> Dict[str, Any]:
         return json.load(f)
 
 
+def item_key(res):
+    return res['task'], str(res['contest_number']), res['problem']
+
+
 def compute_stats(data):
     results = data['results']
     correct = sum(1 for r in results if r['is_correct'])
@@ -39,7 +46,9 @@ def compare(simple_path: str, reasoned_path: str):
     print("\nItems where reasoned helped (simple wrong, reasoned correct):")
     helped = []
     hurt = []
-    for s_res, r_res in zip(s['results'], r['results']):
+    by_key = {item_key(res): res for res in r['results']}
+    pairs = [(s_res, by_key[item_key(s_res)]) for s_res in s['results'] if item_key(s_res) in by_key]
+    for s_res, r_res in pairs:
         if (not s_res['is_correct']) and r_res['is_correct']:
             helped.append(s_res['contest_number'])
         if s_res['is_correct'] and (not r_res['is_correct']):
@@ -47,6 +56,9 @@ def compare(simple_path: str, reasoned_path: str):
     print(helped if helped else '  (none)')
     print("Items where reasoning hurt (simple correct, reasoned wrong):")
     print(hurt if hurt else '  (none)')
+    unmatched = len(s['results']) - len(pairs)
+    if unmatched:
+        print(f"({unmatched} simple items have no reasoned counterpart)")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,356 @@
+"""Adaptive sequential evaluation: stop once accuracy is statistically settled.
+
+Entries are drawn in a stratified random order: contests are shuffled, each
+task walks its contests round-robin, and the tasks are interleaved in
+proportion to their size. Any prefix therefore covers the tasks and contests
+about as evenly as the full split does. ``SequentialMonitor`` folds every
+result into running statistics and checks a stopping rule every
+``check_every`` items once ``min_items`` are in:
+
+- without a baseline, the Wilson interval of the accuracy (both tasks pooled)
+  is narrower than ``target_width`` (``width``);
+- with a stored baseline run of the same split and answer mode, the paired
+  accuracy difference on shared items excludes 0 (``better`` / ``worse``) or
+  its interval is narrower than ``target_width`` (``equivalent``).
+
+Every check spends ``(1 - confidence) / looks`` of the error budget
+(Bonferroni over all planned looks), so peeking does not inflate the error
+rate. Intervals include the finite-population correction, since the split is
+the whole population. The results JSON records the planned order, the stop
+reason, the intervals and the items / GPU-hours saved against a full pass::
+
+    python -m humor_eval.run_simple --split test --adaptive --target_width 0.08
+    python -m humor_eval.run_dual --split test --adaptive --baseline results_simple_old.json results_reasoned_old.json
+
+Runs resume like any other; journaled items are replayed through the monitor
+in order, so a resumed run stops at the same item. Only the standard library
+(plus the lazily imported evaluation loop) is needed.
+"""
+from __future__ import annotations
+
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from statistics import NormalDist
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set, Tuple
+
+from .columnar import item_key as content_key
+from .columnar import _truthy, iter_sections, run_info
+from .data import entry_meta
+from .dataset_types import DatasetEntry, DatasetEntryResult
+from .journal import ItemKey, ResultJournal, params_digest, read_journal
+
+DEFAULT_TARGET_WIDTH = 0.1
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_ITEMS = 40
+DEFAULT_CHECK_EVERY = 10
+
+
+def _strata(entries: Sequence[DatasetEntry]) -> Tuple[List[str], List[Any]]:
+    tasks = getattr(entries, "tasks", None)
+    contests = getattr(entries, "contest_numbers", None)
+    if tasks is not None and contests is not None:
+        return list(tasks), list(contests)
+    metas = [entry_meta(entries, i) for i in range(len(entries))]
+    return [m["task"] for m in metas], [m["contest_number"] for m in metas]
+
+
+def stratified_order(entries: Sequence[DatasetEntry], seed: int = 0) -> List[int]:
+    """All entry indices in a seeded order stratified by task and contest."""
+    rng = random.Random(seed)
+    tasks, contests = _strata(entries)
+    groups: Dict[str, Dict[Any, List[int]]] = defaultdict(lambda: defaultdict(list))
+    for i, (task, contest) in enumerate(zip(tasks, contests)):
+        groups[task][contest].append(i)
+    streams: Dict[str, List[int]] = {}
+    for task in sorted(groups):
+        buckets = list(groups[task].values())
+        rng.shuffle(buckets)
+        for bucket in buckets:
+            rng.shuffle(bucket)
+        # Round-robin over contests: one item of each before a second of any.
+        streams[task] = [b[k] for k in range(max(map(len, buckets))) for b in buckets if k < len(b)]
+    order: List[int] = []
+    taken = dict.fromkeys(streams, 0)
+    total = len(entries)
+    while len(order) < total:
+        # The task furthest behind its share of the items drawn so far.
+        task = max(streams, key=lambda t: (len(streams[t]) * (len(order) + 1) / total - taken[t], t))
+        order.append(streams[task][taken[task]])
+        taken[task] += 1
+    return order
+
+
+class Adaptive:
+    """Stopping rule settings; see the module docstring."""
+
+    def __init__(
+        self,
+        target_width: float = DEFAULT_TARGET_WIDTH,
+        confidence: float = DEFAULT_CONFIDENCE,
+        min_items: int = DEFAULT_MIN_ITEMS,
+        check_every: int = DEFAULT_CHECK_EVERY,
+        seed: int = 0,
+    ):
+        if not 0 < target_width <= 2:
+            raise ValueError(f"target_width must be in (0, 2], got {target_width}")
+        if not 0 < confidence < 1:
+            raise ValueError(f"confidence must be in (0, 1), got {confidence}")
+        if min_items < 1 or check_every < 1:
+            raise ValueError("min_items and check_every must be >= 1")
+        self.target_width = target_width
+        self.confidence = confidence
+        self.min_items = min_items
+        self.check_every = check_every
+        self.seed = seed
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "target_width": self.target_width,
+            "confidence": self.confidence,
+            "min_items": self.min_items,
+            "check_every": self.check_every,
+            "seed": self.seed,
+        }
+
+
+def load_baselines(paths: Sequence[str | Path], split: str) -> Dict[str, Dict[int, bool]]:
+    """Per answer mode, item content key -> correctness from stored results
+    files of ``split`` (either layout)."""
+    baselines: Dict[str, Dict[int, bool]] = {}
+    for path in paths:
+        data = json.loads(Path(path).read_text())
+        info = run_info(data)
+        if info["split"] not in (split, "unknown"):
+            raise ValueError(f"baseline {path} is a {info['split']!r} run, not {split!r}")
+        flags = baselines.setdefault(info["answer_mode"], {})
+        for _, results in iter_sections(data):
+            for rec in results:
+                flags[content_key(split, rec["task"], rec["contest_number"], rec["problem"])] = _truthy(rec["is_correct"])
+    return baselines
+
+
+def wilson(correct: int, n: int, z: float) -> Tuple[float, float]:
+    """(center, half-width) of the Wilson score interval."""
+    if n == 0:
+        return 0.5, 0.5
+    p = correct / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    return center, z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+
+
+def _fpc(n: int, population: int) -> float:
+    return math.sqrt((population - n) / (population - 1)) if population > 1 else 0.0
+
+
+def _gpus() -> int:
+    # Never import torch just for this; a job without it has no GPUs in use.
+    torch = sys.modules.get("torch")
+    return torch.cuda.device_count() if torch is not None and torch.cuda.is_available() else 0
+
+
+class SequentialMonitor:
+    """Running accuracy over ``stratified_order(entries)`` with a stopping rule.
+
+    ``observe`` must see the results in planned order; it returns true once
+    the run should stop. ``baseline`` maps item content keys to the baseline
+    run's correctness (``load_baselines(...)[answer_mode]``).
+    """
+
+    def __init__(
+        self,
+        entries: Sequence[DatasetEntry],
+        split: str,
+        answer_mode: str,
+        settings: Adaptive,
+        baseline: Optional[Dict[int, bool]] = None,
+    ):
+        self.split = split
+        self.answer_mode = answer_mode
+        self.settings = settings
+        self.order = stratified_order(entries, settings.seed)
+        self.population = len(self.order)
+        spare = max(self.population - settings.min_items, 0)
+        self.looks = 1 + math.ceil(spare / settings.check_every)
+        alpha = (1 - settings.confidence) / self.looks
+        self.z = NormalDist().inv_cdf(1 - alpha / 2)
+        self.baseline = baseline
+        self.paired_population = 0
+        if baseline is not None:
+            self.paired_population = sum(
+                content_key(split, m["task"], m["contest_number"], m["problem"]) in baseline
+                for m in (entry_meta(entries, i) for i in range(self.population))
+            )
+            if not self.paired_population:
+                raise ValueError(f"baseline shares no items with this {split}/{answer_mode} run")
+        self.n = self.correct = 0
+        self.tasks: Dict[str, List[int]] = {}
+        self.paired = self.wins = self.losses = 0  # wins: right where the baseline was wrong
+        self.reason: Optional[str] = None
+        self.replayed = 0
+        self.seconds = 0.0  # wall time of freshly evaluated items
+
+    @property
+    def stopped(self) -> bool:
+        return self.reason is not None
+
+    def observe(self, index: int, rec: DatasetEntryResult) -> bool:
+        if self.stopped:
+            raise RuntimeError("observe() after the monitor stopped")
+        if index != self.order[self.n]:
+            raise RuntimeError(f"result for entry {index} out of order (expected {self.order[self.n]})")
+        correct = _truthy(rec["is_correct"])
+        self.n += 1
+        self.correct += correct
+        tally = self.tasks.setdefault(rec["task"], [0, 0])
+        tally[0] += 1
+        tally[1] += correct
+        if self.baseline is not None:
+            base = self.baseline.get(content_key(self.split, rec["task"], rec["contest_number"], rec["problem"]))
+            if base is not None:
+                self.paired += 1
+                self.wins += correct and not base
+                self.losses += base and not correct
+        self.reason = self._check()
+        return self.stopped
+
+    def replay(self, journaled: Dict[int, DatasetEntryResult]) -> List[int]:
+        """Feed journaled results along the planned order until the first item
+        that is missing; returns the planned indices still to evaluate."""
+        while not self.stopped and self.n < self.population and self.order[self.n] in journaled:
+            self.observe(self.order[self.n], journaled[self.order[self.n]])
+            self.replayed += 1
+        return [] if self.stopped else self.order[self.n:]
+
+    def _check(self) -> Optional[str]:
+        if self.n == self.population:
+            return "exhausted"
+        if self.n < self.settings.min_items or (self.n - self.settings.min_items) % self.settings.check_every:
+            return None
+        if self.baseline is None:
+            return "width" if 2 * self.accuracy_interval()[1] <= self.settings.target_width else None
+        if not self.paired:
+            return None
+        diff, half = self.paired_interval()
+        if diff - half > 0:
+            return "better"
+        if diff + half < 0:
+            return "worse"
+        return "equivalent" if 2 * half <= self.settings.target_width else None
+
+    def accuracy_interval(self) -> Tuple[float, float]:
+        center, half = wilson(self.correct, self.n, self.z)
+        return center, half * _fpc(self.n, self.population)
+
+    def paired_interval(self) -> Tuple[float, float]:
+        """(mean difference, half-width) of accuracy minus baseline accuracy
+        on shared items. One extra discordant pair keeps the variance above
+        zero while every pair agrees."""
+        n = self.paired
+        diff = (self.wins - self.losses) / n
+        var = max((self.wins + self.losses + 1) / (n + 1) - diff * diff, 1 / (n + 1))
+        return diff, self.z * math.sqrt(var / n) * _fpc(n, self.paired_population)
+
+    def summary(self) -> Dict[str, Any]:
+        """Stopping stats plus the items and GPU-hours saved against a full pass."""
+        center, half = self.accuracy_interval()
+        fresh = self.n - self.replayed
+        per_item = self.seconds / fresh if fresh else None
+        saved = self.population - self.n
+        seconds_saved = saved * per_item if per_item is not None else None
+        gpus = _gpus()
+        out: Dict[str, Any] = {
+            **self.settings.params(),
+            "looks": self.looks,
+            "z": self.z,
+            "population": self.population,
+            "evaluated": self.n,
+            "replayed": self.replayed,
+            "stop_reason": self.reason,
+            "accuracy": self.correct / self.n if self.n else 0.0,
+            "interval": [max(center - half, 0.0), min(center + half, 1.0)],
+            "width": 2 * half,
+            "tasks": {t: {"n": n, "accuracy": c / n} for t, (n, c) in sorted(self.tasks.items())},
+            "items_saved": saved,
+            "fraction_saved": saved / self.population if self.population else 0.0,
+            "seconds_per_item": per_item,
+            "seconds_saved": seconds_saved,
+            "gpus": gpus,
+            "gpu_hours_saved": seconds_saved * gpus / 3600 if seconds_saved is not None else None,
+            "order": self.order,
+        }
+        if self.baseline is not None:
+            diff, dhalf = self.paired_interval() if self.paired else (0.0, 1.0)
+            out["baseline"] = {
+                "population": self.paired_population,
+                "paired": self.paired,
+                "wins": self.wins,
+                "losses": self.losses,
+                "difference": diff,
+                "interval": [diff - dhalf, diff + dhalf],
+            }
+        return out
+
+
+def journaled_results(
+    path: str | Path,
+    split: str,
+    answer_mode: str,
+    params: Dict[str, Any],
+    done: Collection[ItemKey],
+) -> Dict[int, DatasetEntryResult]:
+    """Entry index -> result of the journal records whose key is in ``done``."""
+    digest = params_digest(params)
+    found: Dict[int, DatasetEntryResult] = {}
+    for _, rec in read_journal(path):
+        if rec["split"] != split or rec["answer_mode"] != answer_mode or rec["params"] != digest:
+            continue
+        if (rec["split"], rec["task"], rec["index"], rec["answer_mode"], rec["params"]) in done:
+            found[rec["index"]] = rec["result"]
+    return found
+
+
+def evaluate_adaptive(
+    entries: Sequence[DatasetEntry],
+    processor,
+    model,
+    answer_mode: str,
+    max_new_tokens: int,
+    journal: ResultJournal,
+    split: str,
+    monitor: SequentialMonitor,
+    journaled: Dict[int, DatasetEntryResult],
+    done: Collection[ItemKey] = (),
+    **kwargs: Any,
+) -> Set[ItemKey]:
+    """``evaluate_to_journal`` along ``monitor.order`` until the monitor stops.
+    ``journaled`` (see ``journaled_results``) is replayed instead of re-run;
+    runs of missing items are evaluated in one call each. ``kwargs`` go to
+    ``evaluate_to_journal``. Returns the keys journaled by this call."""
+    from .evaluate import evaluate_to_journal
+
+    new: Set[ItemKey] = set()
+    while True:
+        todo = monitor.replay(journaled)
+        if not todo:
+            return new
+        segment: List[int] = []
+        for index in todo:
+            if index in journaled:
+                break
+            segment.append(index)
+        start, before = time.perf_counter(), monitor.n
+        new |= evaluate_to_journal(
+            entries, processor, model, answer_mode, max_new_tokens, journal, split,
+            done=done, indices=segment, stop=monitor.observe, **kwargs,
+        )
+        monitor.seconds += time.perf_counter() - start
+        if monitor.stopped:
+            return new
+        if monitor.n != before + len(segment):
+            raise RuntimeError(f"{answer_mode}:{split}: evaluated {monitor.n - before} of {len(segment)} planned items")
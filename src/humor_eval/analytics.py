@@ -0,0 +1,168 @@
+"""Vectorized accuracy analytics over many runs at once.
+
+Runs (columnar ``.npz`` files, or results JSON converted on the fly into a
+cache) are stacked into one table with a ``run`` column. Grouped counts come
+from ``np.bincount`` over a combined group key, so the cost is a few passes
+over the stacked code columns regardless of how many groups there are.
+
+Bootstrap intervals use the fact that resampling a binary ``is_correct`` column
+with replacement gives a Binomial(n, p_hat) / n mean, so each group needs one
+vectorized binomial draw instead of materialising resampled indices.
+
+    python -m humor_eval.analytics results_simple_2048/*.json --by split task
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .columnar import TASKS, UNKNOWN, ColumnarRun, ensure_columnar
+
+GROUP_FIELDS = ("run", "split", "answer_mode", "task")
+
+
+@dataclass
+class RunTable:
+    """Stacked per-item columns plus per-run attributes."""
+
+    names: List[str]
+    splits: List[str]
+    answer_modes: List[str]
+    run: np.ndarray
+    task: np.ndarray
+    is_correct: np.ndarray
+    unknown: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.run)
+
+
+def load_runs(paths: Sequence[str | Path], cache_dir: Optional[str | Path] = None) -> RunTable:
+    """Stack runs given as ``.npz`` or results ``.json`` paths."""
+    names, splits, modes, runs, tasks, correct, unknown = [], [], [], [], [], [], []
+    for run_id, path in enumerate(paths):
+        path = Path(path)
+        npz = path if path.suffix == ".npz" else ensure_columnar(path, cache_dir)
+        cr = ColumnarRun(npz)
+        names.append(cr.meta.get("name", path.stem))
+        splits.append(cr.meta["split"])
+        modes.append(cr.meta["answer_mode"])
+        task = cr.column("task")
+        runs.append(np.full(len(task), run_id, dtype=np.int32))
+        tasks.append(task)
+        correct.append(cr.column("is_correct"))
+        unknown.append(cr.column("extracted") == UNKNOWN)
+        cr.close()
+
+    def cat(parts, dtype):
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    return RunTable(
+        names=names,
+        splits=splits,
+        answer_modes=modes,
+        run=cat(runs, np.int32),
+        task=cat(tasks, np.uint8),
+        is_correct=cat(correct, bool),
+        unknown=cat(unknown, bool),
+    )
+
+
+def _factor(table: RunTable, field: str):
+    """Per-row integer codes and their labels for one group field."""
+    if field == "run":
+        return table.run, list(table.names)
+    if field == "task":
+        return table.task.astype(np.int64), list(TASKS)
+    per_run = table.splits if field == "split" else table.answer_modes
+    labels, run_codes = np.unique(np.array(per_run, dtype=object), return_inverse=True)
+    return run_codes[table.run] if len(table) else np.zeros(0, dtype=np.int64), [str(x) for x in labels]
+
+
+def group_stats(
+    table: RunTable,
+    by: Sequence[str] = ("run", "task"),
+    n_boot: int = 1000,
+    alpha: float = 0.05,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """Accuracy, accuracy excluding Unknown, Unknown rate and a bootstrap
+    ``(1 - alpha)`` percentile interval for every non-empty group."""
+    unknown_fields = [f for f in by if f not in GROUP_FIELDS]
+    if unknown_fields:
+        raise ValueError(f"cannot group by {unknown_fields}; choose from {GROUP_FIELDS}")
+    codes, labels = [], []
+    for field in by:
+        c, lab = _factor(table, field)
+        codes.append(c)
+        labels.append(lab)
+    dims = tuple(max(len(lab), 1) for lab in labels)
+    key = np.ravel_multi_index(codes, dims) if by else np.zeros(len(table), dtype=np.int64)
+    size = int(np.prod(dims)) if by else 1
+    n = np.bincount(key, minlength=size)
+    correct = np.bincount(key, weights=table.is_correct, minlength=size)
+    unknown = np.bincount(key, weights=table.unknown, minlength=size)
+    groups = np.flatnonzero(n)
+    n, correct, unknown = n[groups], correct[groups], unknown[groups]
+    acc = correct / n
+    known = n - unknown
+    acc_known = np.divide(correct, known, out=np.zeros_like(acc), where=known > 0)
+    lo = hi = acc
+    if n_boot > 0:
+        rng = np.random.default_rng(seed)
+        draws = rng.binomial(n[:, None], acc[:, None], size=(len(groups), n_boot)) / n[:, None]
+        lo, hi = np.quantile(draws, [alpha / 2, 1 - alpha / 2], axis=1)
+    coords = np.unravel_index(groups, dims) if by else ()
+    rows = []
+    for g in range(len(groups)):
+        row: Dict[str, Any] = {field: labels[d][coords[d][g]] for d, field in enumerate(by)}
+        row.update(
+            total=int(n[g]),
+            correct=int(correct[g]),
+            unknown=int(unknown[g]),
+            accuracy=float(acc[g]),
+            accuracy_excl_unknown=float(acc_known[g]),
+            unknown_rate=float(unknown[g] / n[g]),
+            ci_low=float(lo[g]),
+            ci_high=float(hi[g]),
+        )
+        rows.append(row)
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]], by: Sequence[str]) -> str:
+    head = [*by, "total", "acc", "95% CI", "acc w/o Unk", "unknown"]
+    lines = [" | ".join(head)]
+    for r in rows:
+        lines.append(" | ".join([
+            *(str(r[f]) for f in by),
+            str(r["total"]),
+            f"{r['accuracy']:.3f}",
+            f"[{r['ci_low']:.3f}, {r['ci_high']:.3f}]",
+            f"{r['accuracy_excl_unknown']:.3f}",
+            f"{r['unknown_rate'] * 100:.1f}%",
+        ]))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    ap = argparse.ArgumentParser(description="Accuracy / Unknown rate / bootstrap CIs across runs")
+    ap.add_argument("runs", nargs="+", help="Columnar .npz files or results JSON files")
+    ap.add_argument("--by", nargs="*", default=["run", "task"], choices=GROUP_FIELDS)
+    ap.add_argument("--n_boot", type=int, default=1000)
+    ap.add_argument("--alpha", type=float, default=0.05)
+    ap.add_argument("--cache_dir", default=None, help="Where JSON inputs are converted to .npz (default: next to them)")
+    ap.add_argument("--json", action="store_true", help="Print rows as JSON")
+    args = ap.parse_args()
+    start = time.perf_counter()
+    rows = group_stats(load_runs(args.runs, args.cache_dir), by=args.by, n_boot=args.n_boot, alpha=args.alpha)
+    elapsed = time.perf_counter() - start
+    print(json.dumps(rows, indent=2) if args.json else format_table(rows, args.by))
+    print(f"({len(args.runs)} runs in {elapsed:.3f}s)")
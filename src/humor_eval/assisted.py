@@ -0,0 +1,112 @@
+"""Assisted (speculative) decoding with a small draft model.
+
+Reasoned mode spends most of its time decoding ``<think>`` chains one token per
+forward pass of the large model. With a draft model, ``generate`` lets the draft
+propose ``num_draft_tokens`` tokens per step and the main model checks them all
+in one forward pass, keeping the longest prefix it agrees with plus one token of
+its own. Under greedy decoding the output is exactly what the main model alone
+would produce; only the number of main-model passes changes.
+
+``Assistant`` wraps one call and records per-item ``DraftInfo`` (stored under
+``draft`` in each result): tokens drafted and accepted, the acceptance rate and
+``tokens_per_step``, the generated tokens per main-model pass, which bounds the
+speedup. Forward passes are counted with hooks, so this works for any model
+``generate`` accepts as an assistant. With ``verify=True`` every item is also
+generated without the draft to measure the actual ``speedup`` and check that
+the response is ``identical``; that doubles the cost and is meant for tuning
+``--num_draft_tokens`` on a sample::
+
+    python -m humor_eval.run_dual --split test --draft_model <small-vlm> --num_draft_tokens 6
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from .dataset_types import DraftInfo
+from .profiling import TokenTimer, token_timer
+
+DEFAULT_DRAFT_TOKENS = 4
+
+
+def draft_info(generated: int, verify_steps: int, draft_tokens: int, num_draft_tokens: int) -> DraftInfo:
+    """Every main-model pass yields its accepted proposals plus one token of its
+    own, so ``generated - verify_steps`` proposals were accepted."""
+    accepted = min(max(generated - verify_steps, 0), draft_tokens)
+    return DraftInfo(
+        num_draft_tokens=num_draft_tokens,
+        draft_tokens=draft_tokens,
+        accepted_tokens=accepted,
+        acceptance_rate=accepted / draft_tokens if draft_tokens else 0.0,
+        verify_steps=verify_steps,
+        tokens_per_step=generated / verify_steps if verify_steps else 0.0,
+    )
+
+
+class Assistant:
+    """A draft model plus the per-step draft length, shared by every call."""
+
+    def __init__(self, draft_model, num_draft_tokens: int = DEFAULT_DRAFT_TOKENS, verify: bool = False):
+        if num_draft_tokens < 1:
+            raise ValueError(f"num_draft_tokens must be >= 1, got {num_draft_tokens}")
+        self.draft_model = draft_model
+        self.num_draft_tokens = num_draft_tokens
+        self.verify = verify
+        config = draft_model.generation_config
+        # Draft a fixed block each step: no adaptive schedule, no confidence cut-off.
+        config.num_assistant_tokens = num_draft_tokens
+        config.num_assistant_tokens_schedule = "constant"
+        config.assistant_confidence_threshold = 0.0
+
+    def run(self, model, generate: Callable[..., str], timer: Optional[TokenTimer] = None) -> Tuple[str, DraftInfo]:
+        """Call ``generate(**kwargs)`` (e.g. ``chat_infer`` with its inputs
+        bound) with the draft model and a counting streamer; ``timer`` is the
+        profiler's streamer for the call, if any."""
+        counter = timer or token_timer(model)
+        calls = {"main": 0, "draft": 0}
+
+        def count(name: str):
+            def hook(module, args, output):
+                calls[name] += 1
+
+            return hook
+
+        hooks = [model.register_forward_hook(count("main")), self.draft_model.register_forward_hook(count("draft"))]
+        start = time.perf_counter()
+        try:
+            resp = generate(draft_model=self.draft_model, streamer=counter)
+        finally:
+            for handle in hooks:
+                handle.remove()
+        elapsed = time.perf_counter() - start
+        info = draft_info(counter.tokens, calls["main"], calls["draft"], self.num_draft_tokens)
+        if self.verify:
+            start = time.perf_counter()
+            plain = generate()
+            info["speedup"] = (time.perf_counter() - start) / elapsed if elapsed else 0.0
+            info["identical"] = plain == resp
+        return resp, info
+
+
+def summarize_drafts(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Acceptance over all records that carry ``draft`` (plus speedup and the
+    mismatch count when they were verified)."""
+    infos = [rec["draft"] for rec in records if "draft" in rec]
+    if not infos:
+        return {"items": 0}
+    drafted = sum(i["draft_tokens"] for i in infos)
+    accepted = sum(i["accepted_tokens"] for i in infos)
+    steps = sum(i["verify_steps"] for i in infos)
+    summary: Dict[str, Any] = {
+        "items": len(infos),
+        "num_draft_tokens": infos[0]["num_draft_tokens"],
+        "draft_tokens": drafted,
+        "accepted_tokens": accepted,
+        "acceptance_rate": accepted / drafted if drafted else 0.0,
+        "tokens_per_step": (accepted + steps) / steps if steps else 0.0,
+    }
+    verified = [i for i in infos if "speedup" in i]
+    if verified:
+        summary["mean_speedup"] = sum(i["speedup"] for i in verified) / len(verified)
+        summary["mismatches"] = sum(not i["identical"] for i in verified)
+    return summary
@@ -0,0 +1,313 @@
+"""Reproducible CPU inference benchmarks with baselines.
+
+Two backends need nothing from the Hub: ``stub`` (``tiny_model.StubModel``, no
+network, so it measures the harness: preprocessing, runners, journaling,
+parsing) and ``tiny`` (the randomly initialised Mllama from ``tiny_model``,
+which also exercises ``generate``). Entries come from
+``tiny_model.synthetic_entries``.
+
+Per backend the suite reports model load time; per-item ``chat_infer`` latency
+split into preprocessing, prefill (time to first token) and decode; decode
+tokens/sec; end-to-end items/sec of ``run_simple`` and ``run_dual``; and peak
+RSS. Every item decodes exactly ``max_new_tokens`` tokens (``min_new_tokens``
+is pinned), so timings are comparable run to run.
+
+``--precision float32 bfloat16 int8`` repeats the suite per weight precision
+(``models.apply_precision``; results keyed ``tiny@int8`` etc.), adding the
+weights' size and current RSS. For the tiny model each non-float32 setting is
+also checked against float32: the largest difference in scored-mode choice
+probabilities and the share of items with the same argmax. The exit status is
+1 when a difference exceeds ``--agreement_tolerance``.
+
+    python -m humor_eval.bench --backend stub tiny --save_baseline bench_baseline.json
+    python -m humor_eval.bench --backend stub tiny --baseline bench_baseline.json --threshold 0.25
+    python -m humor_eval.bench --backend tiny --precision float32 bfloat16 int8 --threads 4
+
+``--num_samples k`` adds the cost of self-consistency voting (``voting``): one
+k-sample call sharing a prefill against k separate single-sample calls, and the
+time each sample beyond the first adds.
+
+With ``--baseline`` the exit status is 1 when any metric is worse than the
+baseline by more than ``threshold`` (relative).
+"""
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import platform
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import torch
+
+from .dataset_types import DatasetEntry
+from .models import apply_precision, chat_score, prepare_inputs, set_threads
+from .profiling import TokenTimer, _percentile, peak_rss_mb, rss_mb
+from .tiny_model import build_stub_model, build_tiny_model, synthetic_entries
+from .voting import Voter
+
+BACKENDS: Dict[str, Callable[[], Tuple[Any, Any]]] = {"stub": build_stub_model, "tiny": build_tiny_model}
+
+# Direction of each metric; anything else is informational.
+LOWER_IS_BETTER = (
+    "load_s",
+    "item_latency_ms_p50",
+    "item_latency_ms_p90",
+    "preprocess_ms_p50",
+    "prefill_ms_p50",
+    "decode_ms_per_token_p50",
+    "peak_rss_mb",
+    "vote_extra_sample_ms_p50",
+)
+HIGHER_IS_BETTER = ("tokens_per_s", "run_simple_items_per_s", "run_dual_items_per_s", "vote_speedup_vs_separate")
+
+
+def time_item(processor, model, entry: DatasetEntry, max_new_tokens: int, answer_mode: str = "simple") -> Dict[str, float]:
+    """One ``chat_infer``-equivalent call, split into its phases (seconds)."""
+    t0 = time.perf_counter()
+    inputs = prepare_inputs(processor, entry["images"], entry["problem"], answer_mode)  # type: ignore[arg-type]
+    t1 = time.perf_counter()
+    inputs = inputs.to(model.device)
+    timer = TokenTimer()
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, streamer=timer)
+    processor.decode(outputs[0][inputs["input_ids"].shape[-1]:])
+    t2 = time.perf_counter()
+    first = timer.first_token or t2
+    return {
+        "latency": t2 - t0,
+        "preprocess": t1 - t0,
+        "prefill": first - t1,
+        "decode": t2 - first,
+        "tokens": timer.tokens,
+    }
+
+
+@contextlib.contextmanager
+def _patched(module, **attrs):
+    old = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            setattr(module, name, value)
+
+
+def time_runner(runner: str, backend: Tuple[Any, Any], entries: List[DatasetEntry], max_new_tokens: int) -> float:
+    """End-to-end items/sec of ``run_simple`` or ``run_dual`` (both modes
+    count) on ``entries`` with an already loaded backend."""
+    from . import run_dual as run_dual_mod
+    from . import run_simple as run_simple_mod
+
+    module, fn, modes = {
+        "run_simple": (run_simple_mod, run_simple_mod.run_simple, 1),
+        "run_dual": (run_dual_mod, run_dual_mod.run_dual, 2),
+    }[runner]
+    with tempfile.TemporaryDirectory() as out_dir, contextlib.redirect_stdout(io.StringIO()), _patched(
+        module, load_entries=lambda split: entries, load_model=lambda device=None, **options: backend
+    ):
+        start = time.perf_counter()
+        fn(max_new_tokens=max_new_tokens, output_dir=out_dir, show_progress=False)
+        elapsed = time.perf_counter() - start
+    return len(entries) * modes / elapsed
+
+
+def vote_cost(processor, model, entries: List[DatasetEntry], num_samples: int, max_new_tokens: int) -> Dict[str, float]:
+    """Per item: one ``num_samples``-sample ``Voter`` call against as many
+    separate single-sample ``generate`` calls."""
+    voter = Voter(num_samples)
+    shared, single = [], []
+    for e in entries:
+        inputs = prepare_inputs(processor, e["images"], e["problem"], "reasoned")  # type: ignore[arg-type]
+        with torch.inference_mode():
+            start = time.perf_counter()
+            voter.generate(processor, model, inputs, max_new_tokens, "reasoned")
+            shared.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for _ in range(num_samples):
+                model.generate(**inputs.to(model.device), max_new_tokens=max_new_tokens, do_sample=True, temperature=voter.temperature)
+            single.append((time.perf_counter() - start) / num_samples)
+    extra = [(s - one) / (num_samples - 1) for s, one in zip(shared, single)]
+    return {
+        "vote_call_ms_p50": statistics.median(shared) * 1e3,
+        "vote_single_sample_ms_p50": statistics.median(single) * 1e3,
+        "vote_extra_sample_ms_p50": statistics.median(extra) * 1e3,
+        "vote_speedup_vs_separate": sum(single) * num_samples / sum(shared),
+    }
+
+
+def weights_mb(model) -> float:
+    """Size of the model's state dict, packed int8 weights included."""
+
+    def nbytes(value) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        return 0
+
+    return sum(nbytes(v) for v in model.state_dict().values()) / 1024**2
+
+
+def precision_agreement(precision: str, items: int = 8, seed: int = 0) -> Dict[str, float]:
+    """Scored-mode choice probabilities of the tiny model at ``precision``
+    against the same weights in float32."""
+    entries = synthetic_entries(items, seed=seed)
+    ref_processor, ref_model = build_tiny_model(seed)
+    processor, model = build_tiny_model(seed)
+    model = apply_precision(model, precision)
+    diffs, same = [], 0
+    for e in entries:
+        ref = chat_score(ref_processor, ref_model, e["images"], e["problem"])
+        got = chat_score(processor, model, e["images"], e["problem"])
+        diffs.append(max(abs(ref[letter] - got[letter]) for letter in ref))
+        same += max(ref, key=ref.get) == max(got, key=got.get)
+    return {"choice_prob_max_diff": max(diffs), "choice_argmax_agreement": same / len(entries)}
+
+
+def bench_backend(
+    name: str, items: int = 8, max_new_tokens: int = 16, seed: int = 0, precision: str = "float32", num_samples: int = 1
+) -> Dict[str, float]:
+    torch.manual_seed(seed)
+    start = time.perf_counter()
+    processor, model = BACKENDS[name]()
+    model = apply_precision(model, precision)
+    load_s = time.perf_counter() - start
+    model.generation_config.min_new_tokens = max_new_tokens
+    entries = synthetic_entries(items, seed=seed)
+
+    time_item(processor, model, entries[0], max_new_tokens)  # warm-up
+    timings = [time_item(processor, model, e, max_new_tokens) for e in entries]
+    ms = lambda key: [t[key] * 1e3 for t in timings]  # noqa: E731
+    per_token = [t["decode"] * 1e3 / max(t["tokens"] - 1, 1) for t in timings]
+    gen_time = sum(t["prefill"] + t["decode"] for t in timings)
+    metrics = {
+        "load_s": load_s,
+        "item_latency_ms_p50": statistics.median(ms("latency")),
+        "item_latency_ms_p90": _percentile(ms("latency"), 0.9),
+        "preprocess_ms_p50": statistics.median(ms("preprocess")),
+        "prefill_ms_p50": statistics.median(ms("prefill")),
+        "decode_ms_per_token_p50": statistics.median(per_token),
+        "tokens_per_s": sum(t["tokens"] for t in timings) / gen_time if gen_time else 0.0,
+        "run_simple_items_per_s": time_runner("run_simple", (processor, model), entries, max_new_tokens),
+        "run_dual_items_per_s": time_runner("run_dual", (processor, model), entries, max_new_tokens),
+    }
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    metrics["rss_mb"] = rss_mb()
+    metrics["weights_mb"] = weights_mb(model)
+    if name == "tiny" and precision != "float32":
+        metrics.update(precision_agreement(precision, items, seed))
+    if num_samples > 1:
+        metrics.update(vote_cost(processor, model, entries, num_samples, max_new_tokens))
+    return metrics
+
+
+def backend_label(name: str, precision: str) -> str:
+    return name if precision == "float32" else f"{name}@{precision}"
+
+
+def run_suite(
+    backends: Sequence[str] = ("stub", "tiny"),
+    items: int = 8,
+    max_new_tokens: int = 16,
+    seed: int = 0,
+    precisions: Sequence[str] = ("float32",),
+    num_samples: int = 1,
+) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "items": items,
+            "max_new_tokens": max_new_tokens,
+            "seed": seed,
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "num_samples": num_samples,
+        },
+        "backends": {
+            backend_label(name, precision): bench_backend(name, items, max_new_tokens, seed, precision, num_samples)
+            for name in backends
+            for precision in precisions
+        },
+    }
+
+
+def regressions(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.25) -> List[str]:
+    """Metrics worse than ``baseline`` by more than ``threshold`` (relative)."""
+    found = []
+    for name, base in baseline["backends"].items():
+        current = result["backends"].get(name)
+        if current is None:
+            continue
+        for metric, old in base.items():
+            new = current.get(metric)
+            if new is None or not old:
+                continue
+            if metric in LOWER_IS_BETTER:
+                change = new / old - 1
+            elif metric in HIGHER_IS_BETTER:
+                change = old / new - 1 if new else float("inf")
+            else:
+                continue
+            if change > threshold:
+                found.append(f"{name}.{metric}: {old:.4g} -> {new:.4g} ({change:+.0%} worse)")
+    return found
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    names = list(result["backends"])
+    metrics = list(dict.fromkeys(m for b in result["backends"].values() for m in b))
+    width = max(len(m) for m in metrics)
+    cols = [max(10, len(n)) for n in names]
+    lines = [f"{'metric':<{width}} | " + " | ".join(f"{n:>{c}}" for n, c in zip(names, cols))]
+    for m in metrics:
+        lines.append(
+            f"{m:<{width}} | " + " | ".join(f"{result['backends'][n].get(m, float('nan')):>{c}.4g}" for n, c in zip(names, cols))
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    ap = argparse.ArgumentParser(description="CPU inference benchmarks (stub / tiny backends)")
+    ap.add_argument("--backend", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    ap.add_argument("--items", type=int, default=8)
+    ap.add_argument("--max_new_tokens", type=int, default=16)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="Write results JSON here")
+    ap.add_argument("--save_baseline", default=None, help="Write results JSON as the new baseline")
+    ap.add_argument("--baseline", default=None, help="Compare against this baseline and exit 1 on regressions")
+    ap.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown per metric")
+    ap.add_argument("--precision", nargs="+", default=["float32"], choices=["float32", "bfloat16", "int8"])
+    ap.add_argument("--agreement_tolerance", type=float, default=0.05, help="Max choice-probability difference from float32")
+    ap.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    ap.add_argument("--interop_threads", type=int, default=None, help="torch inter-op threads")
+    ap.add_argument("--num_samples", type=int, default=1, help="Also time k-sample voting against k separate calls")
+    args = ap.parse_args()
+
+    set_threads(args.threads, args.interop_threads)
+    result = run_suite(args.backend, args.items, args.max_new_tokens, args.seed, args.precision, args.num_samples)
+    print(format_report(result))
+    for path in (args.out, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(result, indent=2))
+    bad = []
+    for label, metrics in result["backends"].items():
+        if metrics.get("choice_prob_max_diff", 0.0) > args.agreement_tolerance:
+            bad.append(f"{label}: choice probabilities differ from float32 by {metrics['choice_prob_max_diff']:.4f}")
+            print("DISAGREEMENT", bad[-1])
+    if args.baseline:
+        found = regressions(result, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for line in found:
+            print("REGRESSION", line)
+        bad += found
+    sys.exit(1 if bad else 0)
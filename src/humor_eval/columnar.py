@@ -0,0 +1,189 @@
+"""Columnar (NumPy) copies of results JSON files.
+
+Both layouts are understood: the flat ``{"summary", "results"}`` form and the
+nested ``{"ranking": ..., "matching": ..., "meta": ...}`` form written by
+``run_simple`` / ``run_dual``. Each run becomes one uncompressed ``.npz`` with
+small code columns (``item_key``, ``task``, ``contest_number``, ``correct``,
+``extracted``, ``is_correct`` and, for scored runs, ``choice_probs``) plus UTF-8
+string tables (blob + offsets) for ``problem``, ``model_answer`` and
+``reasoning``.
+``np.load`` reads members lazily, so analytics never touches the text.
+
+Convert a directory of runs::
+
+    python -m humor_eval.columnar results_simple_2048/*.json --out_dir columnar
+
+Only NumPy and the standard library are imported.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TASKS = ("ranking", "matching")
+ANSWERS = ("A", "B", "C", "D", "E", "Unknown")
+UNKNOWN = ANSWERS.index("Unknown")
+TEXT_COLUMNS = ("problem", "model_answer", "reasoning")
+_ANSWER_CODE = {a: i for i, a in enumerate(ANSWERS)}
+
+
+def iter_sections(data: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """Yield ``(summary, results)`` for either results layout."""
+    if "results" in data:
+        yield data.get("summary", {}), data["results"]
+        return
+    for task in TASKS:
+        if task in data:
+            yield data[task].get("summary", {}), data[task]["results"]
+
+
+def _truthy(value: Any) -> bool:
+    # Older runs store is_correct as the string "True"/"False".
+    return value.lower() == "true" if isinstance(value, str) else bool(value)
+
+
+def run_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Split, answer mode and max_new_tokens of a run, from summaries or meta."""
+    meta = data.get("meta", {})
+    info = {"split": meta.get("split"), "answer_mode": None, "max_new_tokens": meta.get("max_new_tokens")}
+    for summary, _ in iter_sections(data):
+        info["split"] = info["split"] or summary.get("split")
+        info["answer_mode"] = info["answer_mode"] or summary.get("answer_mode")
+    info["split"] = info["split"] or "unknown"
+    info["answer_mode"] = info["answer_mode"] or "unknown"
+    return info
+
+
+def item_key(split: str, task: str, contest_number: int | str, problem: str) -> int:
+    """Stable 64-bit key of an item: (split, task, contest_number, problem hash)."""
+    raw = f"{split}\x1f{task}\x1f{int(contest_number)}\x1f{problem}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+def _pack(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def to_columns(data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    records = [rec for _, results in iter_sections(data) for rec in results]
+    split = run_info(data)["split"]
+    cols: Dict[str, np.ndarray] = {
+        "item_key": np.array(
+            [item_key(split, r["task"], r["contest_number"], r["problem"]) for r in records], dtype=np.uint64
+        ),
+        "task": np.array([TASKS.index(r["task"]) for r in records], dtype=np.uint8),
+        "contest_number": np.array([int(r["contest_number"]) for r in records], dtype=np.int32),
+        "correct": np.array([_ANSWER_CODE.get(r["correct_answer"], UNKNOWN) for r in records], dtype=np.uint8),
+        "extracted": np.array([_ANSWER_CODE.get(r["extracted_answer"], UNKNOWN) for r in records], dtype=np.uint8),
+        "is_correct": np.array([_truthy(r["is_correct"]) for r in records], dtype=bool),
+    }
+    if records and all("choice_probs" in r for r in records):
+        probs = np.full((len(records), len(ANSWERS) - 1), np.nan, dtype=np.float32)
+        for i, r in enumerate(records):
+            for letter, p in r["choice_probs"].items():
+                probs[i, _ANSWER_CODE[letter]] = p
+        cols["choice_probs"] = probs
+    for name in TEXT_COLUMNS:
+        cols[f"{name}_blob"], cols[f"{name}_offsets"] = _pack([r.get(name, "") for r in records])
+    return cols
+
+
+def convert(json_path: str | Path, out_path: str | Path) -> Path:
+    """Write ``json_path`` as a columnar ``.npz`` at ``out_path``."""
+    json_path, out_path = Path(json_path), Path(out_path)
+    data = json.loads(json_path.read_text())
+    meta = dict(run_info(data), name=json_path.stem, source=str(json_path))
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp.npz")
+    np.savez(tmp, meta=np.array(json.dumps(meta)), **to_columns(data))
+    tmp.replace(out_path)
+    return out_path
+
+
+def columnar_path(json_path: str | Path, cache_dir: Optional[str | Path] = None) -> Path:
+    json_path = Path(json_path)
+    return (Path(cache_dir) if cache_dir else json_path.parent) / f"{json_path.stem}.npz"
+
+
+def ensure_columnar(json_path: str | Path, cache_dir: Optional[str | Path] = None) -> Path:
+    """Columnar copy of ``json_path``, (re)converted when missing or stale."""
+    out = columnar_path(json_path, cache_dir)
+    if not out.exists() or out.stat().st_mtime < Path(json_path).stat().st_mtime:
+        convert(json_path, out)
+    return out
+
+
+class ColumnarRun:
+    """Read side of one converted run; columns load on first access."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._npz = np.load(self.path)
+        self.meta: Dict[str, Any] = json.loads(str(self._npz["meta"]))
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._cache:
+            self._cache[name] = self._npz[name]
+        return self._cache[name]
+
+    def has(self, name: str) -> bool:
+        return name in self._npz.files
+
+    def __len__(self) -> int:
+        return len(self.column("task"))
+
+    def item_keys(self) -> np.ndarray:
+        if self.has("item_key"):
+            return self.column("item_key")
+        # Files converted before the column existed.
+        split, task, contest = self.meta["split"], self.column("task"), self.column("contest_number")
+        return np.array(
+            [item_key(split, TASKS[task[i]], contest[i], self.text("problem", i)) for i in range(len(self))],
+            dtype=np.uint64,
+        )
+
+    def text(self, name: str, i: int) -> str:
+        offsets = self.column(f"{name}_offsets")
+        return self.column(f"{name}_blob")[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Rebuild the per-item result dicts (``contest_number`` as int)."""
+        task, contest = self.column("task"), self.column("contest_number")
+        correct, extracted, ok = self.column("correct"), self.column("extracted"), self.column("is_correct")
+        probs = self.column("choice_probs") if self.has("choice_probs") else None
+        for i in range(len(self)):
+            rec: Dict[str, Any] = {
+                "contest_number": int(contest[i]),
+                "problem": self.text("problem", i),
+                "correct_answer": ANSWERS[correct[i]],
+                "model_answer": self.text("model_answer", i),
+                "reasoning": self.text("reasoning", i),
+                "extracted_answer": ANSWERS[extracted[i]],
+                "task": TASKS[task[i]],
+                "is_correct": bool(ok[i]),
+            }
+            if probs is not None:
+                rec["choice_probs"] = {ANSWERS[k]: float(p) for k, p in enumerate(probs[i]) if not np.isnan(p)}
+            yield rec
+
+    def close(self) -> None:
+        self._npz.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Convert results JSON files to columnar .npz")
+    ap.add_argument("results", nargs="+", help="Results JSON files (flat or nested layout)")
+    ap.add_argument("--out_dir", default=None, help="Output directory (default: next to each JSON)")
+    args = ap.parse_args()
+    for path in args.results:
+        print(convert(path, columnar_path(path, args.out_dir)))
@@ -0,0 +1,213 @@
+"""N-way run comparison joined on a stable item key.
+
+Runs are joined through a hash index on ``columnar.item_key`` (split, task,
+contest_number, problem hash), never by position, so runs that ordered or
+subset entries differently still line up. The index is an items x runs int8
+matrix (1 correct, 0 wrong, -1 missing) that can be saved and extended: adding
+a run converts and joins only that run.
+
+For every ordered pair (i, j) on their shared items:
+
+* ``helped[i, j]``: i wrong, j correct; ``hurt[i, j]``: i correct, j wrong
+  (both from two matrix products over all pairs at once);
+* exact two-sided McNemar p-value on the discordant counts;
+* paired bootstrap of acc_j - acc_i, drawn as a multinomial over the
+  (hurt, helped, tie) item counts, with a percentile CI and two-sided p-value.
+
+    python -m humor_eval.compare run_a.json run_b.json run_c.json --index cmp.npz
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .columnar import ColumnarRun, ensure_columnar
+
+
+class ComparisonIndex:
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.matrix = np.zeros((0, 0), dtype=np.int8)
+        self.runs: List[Dict[str, Any]] = []
+        self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    @property
+    def names(self) -> List[str]:
+        return [r["name"] for r in self.runs]
+
+    def add_run(self, path: str | Path, cache_dir: Optional[str | Path] = None) -> int:
+        """Join one run (``.npz`` or results JSON); returns its column."""
+        path = Path(path)
+        cr = ColumnarRun(path if path.suffix == ".npz" else ensure_columnar(path, cache_dir))
+        keys = cr.item_keys()
+        correct = cr.column("is_correct")
+        meta = {"name": cr.meta.get("name", path.stem), "source": str(path), "split": cr.meta["split"]}
+        cr.close()
+
+        rows = np.empty(len(keys), dtype=np.int64)
+        new_keys = []
+        for pos, key in enumerate(keys.tolist()):
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = len(self.keys) + len(new_keys)
+                new_keys.append(key)
+            rows[pos] = row
+        if new_keys:
+            self.keys = np.concatenate([self.keys, np.array(new_keys, dtype=np.uint64)])
+            pad = np.full((len(new_keys), self.matrix.shape[1]), -1, dtype=np.int8)
+            self.matrix = np.concatenate([self.matrix, pad])
+        column = np.full((len(self.keys), 1), -1, dtype=np.int8)
+        column[rows, 0] = correct
+        self.matrix = np.concatenate([self.matrix, column], axis=1)
+        self.runs.append(meta)
+        return len(self.runs) - 1
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, keys=self.keys, matrix=self.matrix, runs=np.array(json.dumps(self.runs)))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ComparisonIndex":
+        index = cls()
+        with np.load(path) as npz:
+            index.keys = npz["keys"]
+            index.matrix = npz["matrix"]
+            index.runs = json.loads(str(npz["runs"]))
+        index._rows = {key: row for row, key in enumerate(index.keys.tolist())}
+        return index
+
+    def pair_counts(self) -> Dict[str, np.ndarray]:
+        """runs x runs matrices: shared items, correct-on-shared, helped, hurt."""
+        present = (self.matrix >= 0).astype(np.int64)
+        right = (self.matrix == 1).astype(np.int64)
+        wrong = (self.matrix == 0).astype(np.int64)
+        return {
+            "shared": present.T @ present,
+            "correct": right.T @ present,  # [i, j]: i correct on items j also has
+            "helped": wrong.T @ right,
+            "hurt": right.T @ wrong,
+        }
+
+
+def _log_factorials(n: int) -> np.ndarray:
+    return np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, n + 1)))])
+
+
+def mcnemar_exact(b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Two-sided exact McNemar p-values for discordant counts, elementwise."""
+    b, c = np.asarray(b, dtype=np.int64), np.asarray(c, dtype=np.int64)
+    m, k = b + c, np.minimum(b, c)
+    if m.size == 0:
+        return np.ones_like(m, dtype=float)
+    lf = _log_factorials(int(m.max()))
+    j = np.arange(int(k.max()) + 1)
+    shape = m.shape + (1,)
+    mm, kk = m.reshape(shape), k.reshape(shape)
+    log_pmf = lf[mm] - lf[np.minimum(j, mm)] - lf[np.clip(mm - j, 0, None)] - mm * np.log(2.0)
+    tail = np.where(j <= kk, np.exp(log_pmf), 0.0).sum(axis=-1)
+    return np.where(m > 0, np.minimum(1.0, 2 * tail), 1.0)
+
+
+def paired_bootstrap(
+    b: np.ndarray, c: np.ndarray, n: np.ndarray, n_boot: int = 2000, alpha: float = 0.05, seed: int = 0
+) -> Dict[str, np.ndarray]:
+    """Bootstrap of the paired accuracy difference (c - b) / n per pair."""
+    b, c, n = (np.asarray(x, dtype=np.int64).ravel() for x in (b, c, n))
+    safe_n = np.maximum(n, 1)
+    pvals = np.stack([b / safe_n, c / safe_n, (n - b - c) / safe_n], axis=-1)
+    pvals[n == 0] = (0.0, 0.0, 1.0)
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(n[:, None], pvals[:, None, :], size=(len(n), n_boot))
+    diff = (draws[..., 1] - draws[..., 0]) / safe_n[:, None]
+    lo, hi = np.quantile(diff, [alpha / 2, 1 - alpha / 2], axis=1)
+    p = np.minimum(1.0, 2 * np.minimum((diff <= 0).mean(axis=1), (diff >= 0).mean(axis=1)))
+    return {"diff": (c - b) / safe_n, "ci_low": lo, "ci_high": hi, "p_value": p}
+
+
+def pairwise(index: ComparisonIndex, n_boot: int = 2000, alpha: float = 0.05, seed: int = 0) -> List[Dict[str, Any]]:
+    """One row per unordered pair of runs that share items."""
+    counts = index.pair_counts()
+    i, j = np.triu_indices(len(index), k=1)
+    keep = counts["shared"][i, j] > 0
+    i, j = i[keep], j[keep]
+    n = counts["shared"][i, j]
+    helped, hurt = counts["helped"][i, j], counts["hurt"][i, j]
+    mc = mcnemar_exact(hurt, helped)
+    boot = paired_bootstrap(hurt, helped, n, n_boot=n_boot, alpha=alpha, seed=seed)
+    names = index.names
+    return [
+        {
+            "a": names[i[p]],
+            "b": names[j[p]],
+            "shared": int(n[p]),
+            "acc_a": float(counts["correct"][i[p], j[p]] / n[p]),
+            "acc_b": float(counts["correct"][j[p], i[p]] / n[p]),
+            "helped": int(helped[p]),
+            "hurt": int(hurt[p]),
+            "diff": float(boot["diff"][p]),
+            "ci_low": float(boot["ci_low"][p]),
+            "ci_high": float(boot["ci_high"][p]),
+            "p_bootstrap": float(boot["p_value"][p]),
+            "p_mcnemar": float(mc[p]),
+        }
+        for p in range(len(n))
+    ]
+
+
+def format_matrix(index: ComparisonIndex, counts: np.ndarray) -> str:
+    width = max([len(n) for n in index.names] + [6])
+    lines = [" " * width + " | " + " | ".join(f"{k:>6}" for k in range(len(index)))]
+    for k, name in enumerate(index.names):
+        lines.append(f"{name:>{width}} | " + " | ".join(f"{v:>6}" for v in counts[k]))
+    return "\n".join(lines)
+
+
+def build_index(paths: Sequence[str | Path], index_path: Optional[str | Path] = None, cache_dir=None) -> ComparisonIndex:
+    """Load ``index_path`` if present, join any runs it does not have yet, and save."""
+    index = ComparisonIndex.load(index_path) if index_path and Path(index_path).exists() else ComparisonIndex()
+    known = {r["source"] for r in index.runs}
+    added = [index.add_run(p, cache_dir) for p in paths if str(p) not in known]
+    if index_path and added:
+        index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Keyed N-way comparison of results files")
+    ap.add_argument("runs", nargs="*", help="Results JSON or columnar .npz files")
+    ap.add_argument("--index", default=None, help="Persistent comparison index (.npz); new runs are appended")
+    ap.add_argument("--cache_dir", default=None, help="Where JSON inputs are converted to .npz")
+    ap.add_argument("--n_boot", type=int, default=2000)
+    ap.add_argument("--alpha", type=float, default=0.05)
+    ap.add_argument("--json", action="store_true", help="Print pair rows as JSON")
+    args = ap.parse_args()
+
+    index = build_index(args.runs, args.index, args.cache_dir)
+    rows = pairwise(index, n_boot=args.n_boot, alpha=args.alpha)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        counts = index.pair_counts()
+        for k, name in enumerate(index.names):
+            print(f"[{k}] {name} ({index.runs[k]['split']})")
+        print("\nHelped (row wrong, column correct):")
+        print(format_matrix(index, counts["helped"]))
+        print("\nHurt (row correct, column wrong):")
+        print(format_matrix(index, counts["hurt"]))
+        print("\nPairs (diff = acc_b - acc_a on shared items):")
+        for r in rows:
+            print(
+                f"{r['a']} vs {r['b']}: n={r['shared']} {r['acc_a']:.3f} -> {r['acc_b']:.3f} "
+                f"diff={r['diff']:+.3f} [{r['ci_low']:+.3f}, {r['ci_high']:+.3f}] "
+                f"helped={r['helped']} hurt={r['hurt']} p_mcnemar={r['p_mcnemar']:.3g} p_boot={r['p_bootstrap']:.3g}"
+            )
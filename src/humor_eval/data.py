@@ -1,23 +1,179 @@
-from typing import Iterable, List
-from datasets import load_dataset
+"""Dataset loading.
+
+``load_entries`` returns a ``LazyEntries`` sequence: ranking entries first, then
+matching (the historical order). The split is partitioned by reading only the
+Arrow ``task`` / ``contest_number`` columns, and images are decoded only when
+an entry is accessed. The (task, contest_number, row) index is cached on disk
+per dataset fingerprint, so ``entries[N]`` on a warm cache touches one row.
+
+``python -m humor_eval.data --compare`` measures startup time and peak RSS of
+the lazy loader against the old eager one.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union, overload
+
 from .dataset_types import DatasetEntry
 
 DATASET_NAME = "newyccku/caption_dataset_rl_v5"
 DEFAULT_SPLIT = "test"
+TASK_ORDER = ("ranking", "matching")
+INDEX_DIR = Path(os.environ.get("HUMOR_EVAL_CACHE", Path.home() / ".cache" / "humor_eval")) / "index"
+
+
+def load_dataset(name: str, split: str):
+    """``datasets.load_dataset``, imported on first use so this module stays
+    importable without ``datasets``."""
+    from datasets import load_dataset as hf_load_dataset
+
+    return hf_load_dataset(name, split=split)
+
+
+def _to_entry(x) -> DatasetEntry:
+    return DatasetEntry(
+        images=x["images"],
+        contest_number=x["contest_number"],
+        problem=x["problem"],
+        answer=x["answer"],
+        task=x["task"],
+    )
+
+
+def _build_index(ds) -> Dict[str, List[Any]]:
+    """One pass over the Arrow task column; no image is decoded."""
+    tasks = ds.data.column("task").to_pylist()
+    contests = ds.data.column("contest_number").to_pylist()
+    rows = [i for task in TASK_ORDER for i, t in enumerate(tasks) if t == task]
+    return {
+        "rows": rows,
+        "task": [tasks[i] for i in rows],
+        "contest_number": [contests[i] for i in rows],
+    }
+
+
+def _load_index(ds, split: str, index_dir: Optional[Path]) -> Dict[str, List[Any]]:
+    fingerprint = getattr(ds, "_fingerprint", None)
+    if index_dir is None or fingerprint is None:
+        return _build_index(ds)
+    path = Path(index_dir) / f"{DATASET_NAME.replace('/', '__')}-{split}-{fingerprint}.json"
+    if path.exists():
+        try:
+            return json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError):
+            pass
+    index = _build_index(ds)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return index
+
+
+class LazyEntries(Sequence[DatasetEntry]):
+    """Read-only view over dataset rows that decodes images on access.
+
+    ``meta(i)`` returns the entry without its image, and ``subset(indices)``
+    returns another lazy view; neither decodes anything.
+    """
+
+    def __init__(self, ds, index: Dict[str, List[Any]], positions: Optional[List[int]] = None):
+        self._ds = ds
+        self._meta_ds = ds.remove_columns(["images"])
+        self._index = index
+        self._positions = positions if positions is not None else list(range(len(index["rows"])))
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    @overload
+    def __getitem__(self, i: int) -> DatasetEntry: ...
+    @overload
+    def __getitem__(self, i: slice) -> "LazyEntries": ...
 
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return LazyEntries(self._ds, self._index, self._positions[i])
+        return _to_entry(self._ds[self._index["rows"][self._positions[i]]])
 
-def load_entries(split: str = DEFAULT_SPLIT) -> List[DatasetEntry]:
+    def __iter__(self) -> Iterator[DatasetEntry]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        return dict(self._meta_ds[self._index["rows"][self._positions[i]]])
+
+    def subset(self, indices: Sequence[int]) -> "LazyEntries":
+        return LazyEntries(self._ds, self._index, [self._positions[i] for i in indices])
+
+    @property
+    def tasks(self) -> List[str]:
+        return [self._index["task"][p] for p in self._positions]
+
+    @property
+    def contest_numbers(self) -> List[Any]:
+        return [self._index["contest_number"][p] for p in self._positions]
+
+
+def entry_meta(entries: Sequence[DatasetEntry], i: int) -> Dict[str, Any]:
+    """Entry fields without forcing an image decode when the source is lazy."""
+    meta = getattr(entries, "meta", None)
+    return meta(i) if meta is not None else entries[i]
+
+
+def select(entries: Sequence[DatasetEntry], indices: Sequence[int]) -> Sequence[DatasetEntry]:
+    subset = getattr(entries, "subset", None)
+    return subset(indices) if subset is not None else [entries[i] for i in indices]
+
+
+def load_entries(split: str = DEFAULT_SPLIT, index_dir: Optional[Path] = INDEX_DIR) -> LazyEntries:
+    ds = load_dataset(DATASET_NAME, split=split)
+    return LazyEntries(ds, _load_index(ds, split, index_dir))
+
+
+def load_entries_eager(split: str = DEFAULT_SPLIT) -> List[DatasetEntry]:
+    """The original loader (two filter passes, every image decoded up front);
+    kept as the baseline for ``--compare``."""
     ds = load_dataset(DATASET_NAME, split=split)
     ranking = ds.filter(lambda x: x["task"] == "ranking")
     matching = ds.filter(lambda x: x["task"] == "matching")
+    return [_to_entry(x) for x in ranking] + [_to_entry(x) for x in matching]
+
+
+def _measure(split: str, loader: str, index: int) -> Dict[str, Any]:
+    import resource
+    import time
+
+    start = time.perf_counter()
+    entries = load_entries(split) if loader == "lazy" else load_entries_eager(split)
+    first = entries[index]
+    first["images"].load()
+    return {
+        "loader": loader,
+        "split": split,
+        "entries": len(entries),
+        "seconds_to_entry": time.perf_counter() - start,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
 
-    def to_entry(x) -> DatasetEntry:
-        return DatasetEntry(
-            images=x["images"],
-            contest_number=x["contest_number"],
-            problem=x["problem"],
-            answer=x["answer"],
-            task=x["task"],
-        )
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
 
-    return [to_entry(x) for x in ranking] + [to_entry(x) for x in matching]
+    ap = argparse.ArgumentParser(description="Measure dataset loader startup time and peak memory")
+    ap.add_argument("--split", default=DEFAULT_SPLIT)
+    ap.add_argument("--index", type=int, default=0, help="Entry to fetch after loading")
+    ap.add_argument("--loader", choices=["lazy", "eager"], default="lazy")
+    ap.add_argument("--compare", action="store_true", help="Run both loaders in fresh processes and print both")
+    args = ap.parse_args()
+    if args.compare:
+        for loader in ("eager", "lazy"):
+            cmd = [sys.executable, "-m", "humor_eval.data", "--split", args.split, "--index", str(args.index), "--loader", loader]
+            print(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip())
+    else:
+        print(json.dumps(_measure(args.split, args.loader, args.index)))
@@ -1,6 +1,36 @@
-from typing import Literal, TypedDict
+from typing import Dict, List, Literal, NotRequired, Optional, TypedDict
 from PIL.Image import Image
 
+class PerfInfo(TypedDict):
+    prompt_tokens: int
+    generated_tokens: int
+    batch_size: int
+    preprocess_s: float
+    ttft_s: float
+    decode_s: float
+    peak_host_mb: float  # process high-water mark when the item finished
+    peak_device_mb: float  # CUDA peak allocated during the call (0.0 on CPU)
+
+class DraftInfo(TypedDict):
+    num_draft_tokens: int
+    draft_tokens: int  # tokens proposed by the draft model
+    accepted_tokens: int  # proposals the main model kept
+    acceptance_rate: float
+    verify_steps: int  # main-model forward passes
+    tokens_per_step: float  # generated tokens per main-model pass
+    # verify=True only: plain / assisted wall time, and whether the texts match.
+    speedup: NotRequired[float]
+    identical: NotRequired[bool]
+
+class VoteInfo(TypedDict):
+    samples: List[str]
+    answers: List[Optional[str]]  # extract_answer of each sample; None if decided_early cut it off
+    votes: Dict[str, int]  # letters only; "Unknown" does not vote
+    decided_early: bool  # stopped because the running samples could not change the majority
+    generated_tokens: int  # over all samples
+    prefill_s: float  # the shared prefill (0.0 when the model has no shared-prefill path)
+    decode_s: float
+
 class DatasetEntry(TypedDict):
     images: Image
     contest_number: int
@@ -17,3 +47,15 @@ class DatasetEntryResult(TypedDict):
     extracted_answer: Literal["A", "B", "C", "D", "E", "Unknown"]
     task: Literal["matching", "ranking"]
     is_correct: bool
+    # answer_mode="scored" only: next-token probability of each option letter.
+    choice_probs: NotRequired[Dict[str, float]]
+    # early_stop only: why generation ended and the decode budget left over.
+    stop_reason: NotRequired[str]
+    generated_tokens: NotRequired[int]
+    tokens_saved: NotRequired[int]
+    # Profiler only: per-item timings, token counts and memory.
+    perf: NotRequired[PerfInfo]
+    # draft_model only: assisted decoding acceptance (and speedup when verified).
+    draft: NotRequired[DraftInfo]
+    # num_samples > 1 only: every sample and the vote over their answers.
+    vote: NotRequired[VoteInfo]
@@ -0,0 +1,764 @@
+"""Shared per-entry evaluation loop used by run_simple and run_dual.
+
+Entries are generated either one at a time (``batch_size=1``, the original
+``chat_infer`` path) or in length-bucketed batches like ``chat_infer_batch``;
+``_generate`` prepares every job the same way and ``_respond`` picks the path.
+Results are always returned in input order, so both paths produce identical
+result records. Entries may be processed in a different order (e.g. grouped by
+``contest_number`` so a ``PrefixCache`` sees repeated images back to back).
+``answer_mode="scored"`` replaces generation with one prefill that reads the
+option letters' next-token probabilities; its responses are dicts, not text.
+``early_stop`` streams generation through ``streaming.AnswerWatcher`` and stops
+once the answer is fixed, adding stop stats to each record. A
+``profiling.Profiler`` adds per-item timings and token counts under ``perf``.
+``model`` may also be a ``remote.RemoteBackend`` (with ``processor=None``):
+entries are then sent to an inference server concurrently and come back in order.
+With a ``ResponseCache`` cached responses are served without touching the
+model, and passing ``model=None`` yields only those cache hits. An
+``assisted.Assistant`` decodes generation modes with its draft model (one item
+at a time) and adds acceptance stats under ``draft``; a ``voting.Voter``
+replaces each response with the majority of k samples, kept under ``vote``.
+A ``resolution.ImageBudget`` resizes every image before preprocessing.
+``EvalSession`` holds the setup and ``meta`` reporting both runners share.
+"""
+from __future__ import annotations
+
+import json
+import time
+from contextlib import nullcontext
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from tqdm import tqdm
+
+from .data import entry_meta, select
+from .dataset_types import DatasetEntry, DatasetEntryResult, DraftInfo, PerfInfo, VoteInfo
+from .assisted import Assistant, summarize_drafts
+from .hashing import image_hash
+from .heartbeat import Heartbeat
+from .journal import ItemKey, JournalFold, ResultJournal, item_key
+from .models import (
+    MODEL_ID,
+    _build_prompt,
+    decoding_settings,
+    generate_batch_responses,
+    generate_response,
+    length_buckets,
+    prepare_batch_inputs,
+    prepare_inputs,
+    present_choices,
+    prompt_token_lengths,
+    score_batch_responses,
+    score_response,
+    summarize_device_allocation,
+)
+from .options import EvalOptions
+from .parsing import scan_response
+from .pixel_cache import attach_pixel_cache
+from .prefetch import Prefetcher, pin_inputs
+from .prefix_cache import PrefixCache
+from .profiling import Profiler, TokenTimer, format_perf, peak_rss_mb
+from .remote import RemoteBackend
+from .resolution import ImageBudget, budgeted
+from .response_cache import ResponseCache, response_key
+from .shard import shard_path
+from .streaming import StopInfo, stream_generate, summarize_stops
+from .voting import Voter, summarize_votes
+
+
+def generation_params(
+    max_new_tokens: int,
+    early_stop: Union[bool, str] = False,
+    sampling: Optional[Dict[str, Any]] = None,
+    image: Optional[Dict[str, Any]] = None,
+    model_id: str = MODEL_ID,
+    weights: Optional[Dict[str, Any]] = None,
+    backend: str = "local",
+) -> Dict[str, Any]:
+    """Settings that change a response; part of every journal key.
+    ``early_stop`` is ``True`` (closed ``</answer>`` only) or ``"heuristic"``
+    (see ``streaming``), ``sampling`` is ``Voter.params()`` for self-consistency runs, ``image``
+    is ``ImageBudget.params()`` for runs on resized images, ``model_id`` is
+    the model that answers (``--server_model`` for remote runs), ``weights``
+    the non-default ``--precision`` / offload of a local model and ``backend``
+    ``"remote"`` for a server, which decodes greedily rather than with the
+    model's generation config."""
+    params: Dict[str, Any] = {"model_id": model_id, "max_new_tokens": max_new_tokens}
+    if early_stop:
+        params["early_stop"] = early_stop
+    if sampling:
+        params["sampling"] = sampling
+    if image:
+        params["image"] = image
+    if weights:
+        params["weights"] = weights
+    if backend != "local":
+        params["backend"] = backend
+    return params
+
+
+# Generated text, or the choice distribution for answer_mode="scored".
+Response = Union[str, Dict[str, float]]
+
+
+def make_result(
+    entry: DatasetEntry,
+    resp: Response,
+    stop: Optional[StopInfo] = None,
+    perf: Optional[PerfInfo] = None,
+    draft: Optional[DraftInfo] = None,
+    vote: Optional[VoteInfo] = None,
+) -> DatasetEntryResult:
+    if isinstance(resp, dict):
+        best = max(resp, key=resp.get)
+        rec = DatasetEntryResult(
+            contest_number=entry["contest_number"],
+            problem=entry["problem"],
+            correct_answer=entry["answer"],
+            model_answer=best,
+            reasoning="",
+            extracted_answer=best,
+            task=entry["task"],
+            is_correct=best == entry["answer"],
+            choice_probs=resp,
+        )
+        if perf is not None:
+            rec["perf"] = perf
+        return rec
+    reasoning, _, extracted_answer = scan_response(resp)
+    rec = DatasetEntryResult(
+        contest_number=entry["contest_number"],
+        problem=entry["problem"],
+        correct_answer=entry["answer"],
+        model_answer=resp,
+        reasoning=reasoning,
+        extracted_answer=extracted_answer,
+        task=entry["task"],
+        is_correct=extracted_answer == entry["answer"],
+    )
+    if stop is not None:
+        rec.update(stop)
+    if perf is not None:
+        rec["perf"] = perf
+    if draft is not None:
+        rec["draft"] = draft
+    if vote is not None:
+        rec["vote"] = vote
+    return rec
+
+
+def _timed_call(profiler: Optional[Profiler], model) -> Tuple[Optional[TokenTimer], Dict[str, Any]]:
+    """A timer and the ``generate`` kwargs that attach it (none without a profiler)."""
+    if profiler is None:
+        return None, {}
+    timer = profiler.timer(model)
+    return timer, {"streamer": timer}
+
+
+def _perfs(profiler, timer, entries, job: Sequence[int], answer_mode: str) -> List[Optional[PerfInfo]]:
+    if timer is None:
+        return [None] * len(job)
+    return profiler.finish(timer, [entry_meta(entries, i) for i in job], answer_mode)
+
+
+def contest_order(entries: Sequence[DatasetEntry]) -> List[int]:
+    """Entry indices grouped by ``contest_number`` (groups in first-seen order)."""
+    groups: dict = {}
+    for idx in range(len(entries)):
+        groups.setdefault(entry_meta(entries, idx)["contest_number"], []).append(idx)
+    return [idx for group in groups.values() for idx in group]
+
+
+def _jobs(entries, order: Sequence[int], processor, answer_mode: str, batch_size: int) -> List[List[int]]:
+    if batch_size <= 1:
+        return [[idx] for idx in order]
+    lengths = prompt_token_lengths(processor, [entry_meta(entries, i)["problem"] for i in order], answer_mode)
+    return [[order[i] for i in bucket] for bucket in length_buckets(lengths, batch_size)]
+
+
+def _respond(
+    processor,
+    model,
+    inputs,
+    job: Sequence[int],
+    entries: Sequence[DatasetEntry],
+    image,
+    answer_mode: str,
+    max_new_tokens: int,
+    batch_size: int,
+    prefix_cache,
+    early_stop: Union[bool, str],
+    gen_kwargs: Dict[str, Any],
+) -> Tuple[List[Response], List[Optional[StopInfo]]]:
+    """Pick the generation path for one prepared job: scored prefill, early-stop
+    streaming, or plain ``generate``, each single or batched."""
+    infos: List[Optional[StopInfo]] = [None] * len(job)
+    if answer_mode == "scored":
+        choices = [present_choices(entry_meta(entries, i)["problem"]) for i in job]
+        if batch_size > 1:
+            return score_batch_responses(processor, model, inputs, choices, **gen_kwargs), infos
+        return [score_response(processor, model, inputs, choices[0], image=image, prefix_cache=prefix_cache, **gen_kwargs)], infos
+    if early_stop:
+        streamed = stream_generate(
+            processor, model, inputs, max_new_tokens, answer_mode, image=image, prefix_cache=prefix_cache,
+            heuristic=early_stop == "heuristic", **gen_kwargs,
+        )
+        return [resp for resp, _ in streamed], [info for _, info in streamed]
+    if batch_size > 1:
+        return generate_batch_responses(processor, model, inputs, max_new_tokens, **gen_kwargs), infos
+    return [generate_response(processor, model, inputs, max_new_tokens, image=image, prefix_cache=prefix_cache, **gen_kwargs)], infos
+
+
+def _generate(
+    entries: Sequence[DatasetEntry],
+    order: Sequence[int],
+    processor,
+    model,
+    answer_mode: str,
+    max_new_tokens: int,
+    batch_size: int,
+    progress: Optional[tqdm],
+    prefix_cache,
+    prefetcher: Optional[Prefetcher] = None,
+    early_stop: Union[bool, str] = False,
+    profiler: Optional[Profiler] = None,
+    call: Optional[Callable[[Any, Optional[TokenTimer]], Tuple[Response, Dict[str, Any]]]] = None,
+) -> Iterator[Tuple[int, Response, Optional[StopInfo], Optional[PerfInfo], Dict[str, Any]]]:
+    """Prepare each job (in ``prefetcher`` threads if given) and generate it.
+    ``call(inputs, timer) -> (response, extra result fields)`` replaces
+    ``_respond`` for the assisted and voting paths, which run one item at a time."""
+    if batch_size > 1 and prefix_cache is not None:
+        raise ValueError("prefix_cache is only supported with batch_size=1")
+    early_stop = early_stop and answer_mode != "scored"
+    if isinstance(model, RemoteBackend):
+        if answer_mode == "scored" or early_stop:
+            raise ValueError("the remote backend supports generation only (no scored mode or early_stop)")
+        items = ((entries[i]["images"], entries[i]["problem"]) for i in order)
+        for idx, resp in zip(order, model.map(items, max_new_tokens, answer_mode)):
+            if progress is not None:
+                progress.update(1)
+            yield idx, resp, None, None, {}
+        return
+    stage = prefetcher.timed if prefetcher is not None else (lambda name: nullcontext())
+
+    def prepare(job: List[int]):
+        start = time.perf_counter()
+        with stage("decode"):
+            batch = [entries[i] for i in job]
+            for entry in batch:
+                entry["images"].load()
+        with stage("preprocess"):
+            if batch_size <= 1:
+                inputs = prepare_inputs(processor, batch[0]["images"], batch[0]["problem"], answer_mode)
+            else:
+                inputs = prepare_batch_inputs(processor, [e["images"] for e in batch], [e["problem"] for e in batch], answer_mode)
+        if prefetcher is not None and prefetcher.pin_memory:
+            with stage("pin"):
+                inputs = pin_inputs(inputs)
+        return job, batch[0]["images"], inputs, time.perf_counter() - start
+
+    jobs = _jobs(entries, order, processor, answer_mode, batch_size)
+    for job, image, inputs, prepare_s in prefetcher.map(prepare, jobs) if prefetcher is not None else map(prepare, jobs):
+        timer, gen_kwargs = _timed_call(profiler, model)
+        if timer is not None:
+            timer.preprocess_s = prepare_s
+        with stage("h2d"):
+            inputs = inputs.to(model.device, non_blocking=True)
+        with stage("generate"):
+            if call is not None:
+                resp, extra = call(inputs, timer)
+                responses, infos, extras = [resp], [None], [extra]
+            else:
+                responses, infos = _respond(
+                    processor, model, inputs, job, entries, image, answer_mode, max_new_tokens, batch_size, prefix_cache,
+                    early_stop, gen_kwargs,
+                )
+                extras = [{}] * len(job)
+        if progress is not None:
+            progress.update(len(job))
+        yield from zip(job, responses, infos, _perfs(profiler, timer, entries, job, answer_mode), extras)
+
+
+def _encode_cached(resp: Response, info: Optional[StopInfo]) -> str:
+    if isinstance(resp, dict):
+        return json.dumps(resp)
+    return json.dumps({"response": resp, **info}) if info is not None else resp
+
+
+def _decode_cached(cached: str, answer_mode: str, early_stop: bool) -> Tuple[Response, Optional[StopInfo]]:
+    if answer_mode == "scored":
+        return json.loads(cached), None
+    if early_stop:
+        data = json.loads(cached)
+        return data.pop("response"), StopInfo(**data)
+    return cached, None
+
+
+def iter_results(
+    entries: Sequence[DatasetEntry],
+    processor,
+    model,
+    answer_mode: str,
+    max_new_tokens: int,
+    batch_size: int = 1,
+    progress: Optional[tqdm] = None,
+    prefix_cache=None,
+    group_by_contest: bool = False,
+    response_cache: Optional[ResponseCache] = None,
+    decoding: Optional[Dict[str, Any]] = None,
+    prefetcher: Optional[Prefetcher] = None,
+    early_stop: Union[bool, str] = False,
+    profiler: Optional[Profiler] = None,
+    assistant: Optional[Assistant] = None,
+    voter: Optional[Voter] = None,
+    image_budget: Optional[ImageBudget] = None,
+    model_id: str = MODEL_ID,
+    weights: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[int, DatasetEntryResult]]:
+    """Yield ``(entry_index, result)`` as soon as each item (or batch) finishes.
+
+    Cache hits come first; with ``batch_size > 1`` the rest complete in bucket
+    order, not input order. ``assistant`` and ``voter`` are ignored in scored
+    mode, which does not decode. With ``image_budget`` the response cache keys
+    on the resized image; ``model_id`` and ``weights`` (see
+    ``generation_params``) name the model in its keys.
+    """
+    entries = budgeted(entries, image_budget, processor)
+    early_stop = early_stop and answer_mode != "scored"
+    assistant = assistant if answer_mode != "scored" else None
+    voter = voter if answer_mode != "scored" else None
+    if assistant is not None or voter is not None:
+        if assistant is not None and voter is not None:
+            raise ValueError("draft_model and num_samples cannot be combined")
+        if isinstance(model, RemoteBackend) or batch_size > 1 or prefix_cache is not None or early_stop:
+            raise ValueError("draft_model / num_samples need a local model with batch_size=1 and no prefix_cache or early_stop")
+        if voter is not None and response_cache is not None:
+            raise ValueError("num_samples does not use the response cache")
+    order: List[int] = contest_order(entries) if group_by_contest else list(range(len(entries)))
+    cache_keys: Dict[int, str] = {}
+    if response_cache is not None:
+        if decoding is None:
+            decoding = decoding_settings(model.generation_config)
+        if early_stop:
+            decoding = dict(decoding, early_stop=early_stop)
+        if weights:
+            decoding = dict(decoding, weights=weights)
+        remaining = []
+        for idx in order:
+            entry = entries[idx]
+            key = response_key(
+                model_id,
+                _build_prompt(entry["problem"], answer_mode),
+                image_hash(entry["images"]),
+                max_new_tokens,
+                answer_mode,
+                decoding,
+            )
+            cached = response_cache.get(key)
+            if cached is None:
+                cache_keys[idx] = key
+                remaining.append(idx)
+                continue
+            if progress is not None:
+                progress.update(1)
+            yield idx, make_result(entry, *_decode_cached(cached, answer_mode, early_stop))
+        order = remaining
+    if model is None:
+        return
+
+    call = None
+    if assistant is not None:
+
+        def call(inputs, timer):
+            def generate(**kwargs) -> str:
+                return generate_response(processor, model, inputs, max_new_tokens, **kwargs)
+
+            resp, draft = assistant.run(model, generate, timer)
+            return resp, {"draft": draft}
+
+    elif voter is not None:
+
+        def call(inputs, timer):
+            gen_kwargs = {"streamer": timer} if timer is not None else {}
+            resp, vote = voter.generate(processor, model, inputs, max_new_tokens, answer_mode, **gen_kwargs)
+            return resp, {"vote": vote}
+
+    generated = _generate(
+        entries, order, processor, model, answer_mode, max_new_tokens, batch_size, progress, prefix_cache, prefetcher,
+        early_stop, profiler, call,
+    )
+    for idx, resp, info, perf, extra in generated:
+        if response_cache is not None:
+            response_cache.put(cache_keys[idx], _encode_cached(resp, info), model_id, answer_mode)
+        yield idx, make_result(entry_meta(entries, idx), resp, info, perf, **extra)
+
+
+def evaluate_entries(
+    entries: Sequence[DatasetEntry],
+    processor,
+    model,
+    answer_mode: str,
+    max_new_tokens: int,
+    batch_size: int = 1,
+    show_progress: bool = True,
+    desc: Optional[str] = None,
+    prefix_cache=None,
+    group_by_contest: bool = False,
+    response_cache: Optional[ResponseCache] = None,
+    prefetcher: Optional[Prefetcher] = None,
+    early_stop: Union[bool, str] = False,
+    profiler: Optional[Profiler] = None,
+    assistant: Optional[Assistant] = None,
+    voter: Optional[Voter] = None,
+    image_budget: Optional[ImageBudget] = None,
+) -> List[DatasetEntryResult]:
+    """Evaluate all entries and return their results in input order."""
+    progress = tqdm(total=len(entries), desc=desc or answer_mode) if show_progress else None
+    results: List[Optional[DatasetEntryResult]] = [None] * len(entries)
+    try:
+        for idx, rec in iter_results(
+            entries,
+            processor,
+            model,
+            answer_mode,
+            max_new_tokens,
+            batch_size,
+            progress,
+            prefix_cache=prefix_cache,
+            group_by_contest=group_by_contest,
+            response_cache=response_cache,
+            prefetcher=prefetcher,
+            early_stop=early_stop,
+            profiler=profiler,
+            assistant=assistant,
+            voter=voter,
+            image_budget=image_budget,
+        ):
+            results[idx] = rec
+    finally:
+        if progress is not None:
+            progress.close()
+    return results  # type: ignore[return-value]
+
+
+def pending_indices(
+    entries: Sequence[DatasetEntry],
+    split: str,
+    answer_mode: str,
+    max_new_tokens: int,
+    done: Collection[ItemKey],
+    indices: Optional[Sequence[int]] = None,
+    early_stop: Union[bool, str] = False,
+    sampling: Optional[Dict[str, Any]] = None,
+    image: Optional[Dict[str, Any]] = None,
+    model_id: str = MODEL_ID,
+    weights: Optional[Dict[str, Any]] = None,
+    backend: str = "local",
+) -> List[int]:
+    """Entry indices (all, or only ``indices``) whose key is not in ``done``."""
+    params = generation_params(max_new_tokens, early_stop, sampling, image, model_id, weights, backend)
+    return [
+        i for i in (range(len(entries)) if indices is None else indices)
+        if item_key(split, entry_meta(entries, i)["task"], i, answer_mode, params) not in done
+    ]
+
+
+def evaluate_to_journal(
+    entries: Sequence[DatasetEntry],
+    processor,
+    model,
+    answer_mode: str,
+    max_new_tokens: int,
+    journal: ResultJournal,
+    split: str,
+    done: Collection[ItemKey] = (),
+    batch_size: int = 1,
+    show_progress: bool = True,
+    desc: Optional[str] = None,
+    prefix_cache=None,
+    group_by_contest: bool = False,
+    response_cache: Optional[ResponseCache] = None,
+    decoding: Optional[Dict[str, Any]] = None,
+    prefetcher: Optional[Prefetcher] = None,
+    indices: Optional[Sequence[int]] = None,
+    early_stop: Union[bool, str] = False,
+    profiler: Optional[Profiler] = None,
+    assistant: Optional[Assistant] = None,
+    voter: Optional[Voter] = None,
+    image_budget: Optional[ImageBudget] = None,
+    heartbeat: Optional[Heartbeat] = None,
+    stop: Optional[Callable[[int, DatasetEntryResult], bool]] = None,
+    model_id: str = MODEL_ID,
+    weights: Optional[Dict[str, Any]] = None,
+    backend: str = "local",
+) -> Set[ItemKey]:
+    """Evaluate entries whose key is not in ``done``, appending each result to
+    ``journal`` as it finishes. ``indices`` restricts the run to a shard; the
+    journal always records global entry indices. ``heartbeat`` counts every
+    result; ``stop(index, result)`` returning true ends the run early.
+    ``model_id``, ``weights`` and ``backend`` (see ``generation_params``) key
+    the journal; the response cache keys on ``model_id``, ``weights`` and
+    ``decoding``. Returns the keys journaled by this call."""
+    sampling = voter.params() if voter is not None and answer_mode != "scored" else None
+    image = image_budget.params() if image_budget else None
+    params = generation_params(max_new_tokens, early_stop, sampling, image, model_id, weights, backend)
+    todo = pending_indices(
+        entries, split, answer_mode, max_new_tokens, done, indices, early_stop, sampling, image, model_id, weights, backend,
+    )
+    wanted = len(entries) if indices is None else len(indices)
+    if model is not None and len(todo) < wanted:
+        print(f"{answer_mode}:{split}: {wanted - len(todo)} already journaled, {len(todo)} remaining")
+    if heartbeat is not None:
+        heartbeat.start(answer_mode, wanted, wanted - len(todo))
+    journaled: Set[ItemKey] = set()
+    progress = tqdm(total=len(todo), desc=desc or answer_mode) if show_progress else None
+    try:
+        for local_idx, rec in iter_results(
+            select(entries, todo),
+            processor,
+            model,
+            answer_mode,
+            max_new_tokens,
+            batch_size,
+            progress,
+            prefix_cache=prefix_cache,
+            group_by_contest=group_by_contest,
+            response_cache=response_cache,
+            decoding=decoding,
+            prefetcher=prefetcher,
+            early_stop=early_stop,
+            profiler=profiler,
+            assistant=assistant,
+            voter=voter,
+            image_budget=image_budget,
+            model_id=model_id,
+            weights=weights,
+        ):
+            index = todo[local_idx]
+            journal.append(split, index, answer_mode, params, rec)
+            journaled.add(item_key(split, rec["task"], index, answer_mode, params))
+            if heartbeat is not None:
+                heartbeat.update(answer_mode, rec)
+            if stop is not None and stop(index, rec):
+                break
+    finally:
+        if progress is not None:
+            progress.close()
+        journal.sync()
+    return journaled
+
+
+class EvalSession:
+    """What ``run_simple`` and ``run_dual`` set up around their journal: the
+    prefix / response caches, prefetcher, profiler and heartbeat from
+    ``options``, the model (loaded by ``load`` only once something is left to
+    generate), and the ``meta`` stats reported at the end. ``runner`` labels the
+    heartbeat and ``part`` is the shard. The loaders are passed in by the
+    runners, which own them."""
+
+    def __init__(
+        self,
+        options: EvalOptions,
+        runner: str,
+        part: Optional[Tuple[int, int]] = None,
+        load_generation_config: Optional[Callable[[], Any]] = None,
+    ):
+        o = self.options = options
+        self.part = part
+        self.voter = o.voter()
+        self.image_budget = o.image_budget()
+        self.prefix_cache = PrefixCache(max_bytes=o.image_cache_mb * 1024**2) if o.image_cache_mb > 0 else None
+        self.response_cache = ResponseCache(o.response_cache, max_bytes=o.response_cache_mb * 1024**2) if o.response_cache else None
+        self.prefetcher = Prefetcher(depth=o.prefetch_depth, workers=o.prefetch_workers) if o.prefetch_depth > 0 else None
+        self.profiler = Profiler() if o.profile or o.trace else None
+        self.heartbeat = Heartbeat(
+            shard_path(Path(o.heartbeat), part),
+            shard_path(Path(o.heartbeat_prom), part) if o.heartbeat_prom else None,
+            o.heartbeat_s,
+            labels={"runner": runner, "split": o.split, "shard": o.shard},
+        ) if o.heartbeat else None
+        self.decoding = None
+        if self.response_cache is not None:
+            if o.server_url:  # the server decodes greedily; no local config needed
+                self.decoding = dict(decoding_settings(RemoteBackend.generation_config), backend=o.backend)
+            else:
+                self.decoding = decoding_settings(load_generation_config())
+        self.processor = self.model = self.pixel_cache = self.load_info = self.assistant = None
+
+    def use(self, options: EvalOptions) -> None:
+        """Evaluate with ``options`` from now on (a sweep cell's split, token and
+        image budget); the model, caches and heartbeat stay as they are."""
+        self.options = options
+        self.image_budget = options.image_budget()
+
+    def kwargs(self, done: Collection[ItemKey]) -> Dict[str, Any]:
+        """``evaluate_to_journal`` keywords shared by every mode and run order."""
+        o = self.options
+        return dict(
+            done=done,
+            show_progress=o.show_progress,
+            prefix_cache=self.prefix_cache,
+            prefetcher=self.prefetcher,
+            early_stop=o.stopping,
+            profiler=self.profiler,
+            assistant=self.assistant,
+            voter=self.voter,
+            image_budget=self.image_budget,
+            heartbeat=self.heartbeat,
+            model_id=o.model_id,
+            weights=o.weights(),
+            backend=o.backend,
+        )
+
+    def journal_cached(
+        self, entries, modes: Sequence[str], journal: ResultJournal, done: Collection[ItemKey], indices: Optional[Sequence[int]]
+    ) -> Set[ItemKey]:
+        """Journal the response-cache hits of ``modes``; returns ``done`` plus their keys."""
+        o = self.options
+        done = set(done)
+        if self.response_cache is None:
+            return done
+        for mode in modes:
+            done |= evaluate_to_journal(
+                entries, None, None, mode, o.max_new_tokens, journal, o.split,
+                done=done, show_progress=False, response_cache=self.response_cache, decoding=self.decoding, indices=indices,
+                early_stop=o.stopping, image_budget=self.image_budget, model_id=o.model_id, weights=o.weights(),
+                backend=o.backend,
+            )
+        return done
+
+    def pending(self, entries, mode: str, done: Collection[ItemKey], indices: Optional[Sequence[int]]) -> List[int]:
+        o = self.options
+        return pending_indices(
+            entries, o.split, mode, o.max_new_tokens, done, indices, o.stopping, o.sampling(mode), o.image(), o.model_id, o.weights(),
+            o.backend,
+        )
+
+    def evaluate(
+        self,
+        entries,
+        mode: str,
+        journal: ResultJournal,
+        done: Collection[ItemKey],
+        indices: Optional[Sequence[int]] = None,
+        monitor=None,
+        journaled: Optional[Dict[int, DatasetEntryResult]] = None,
+    ) -> None:
+        """Evaluate ``mode`` into ``journal``; adaptively along ``monitor.order``
+        (replaying ``journaled``) when a ``monitor`` is given."""
+        from .adaptive import evaluate_adaptive
+
+        o = self.options
+        kwargs = dict(self.kwargs(done), desc=f"{mode}:{o.split}")
+        if monitor is not None:
+            evaluate_adaptive(
+                entries, self.processor, self.model, mode, o.max_new_tokens, journal, o.split, monitor, journaled or {}, **kwargs,
+            )
+        else:
+            evaluate_to_journal(
+                entries, self.processor, self.model, mode, o.max_new_tokens, journal, o.split,
+                batch_size=o.batch_size, group_by_contest=o.group_by_contest, response_cache=self.response_cache,
+                decoding=self.decoding, indices=indices, **kwargs,
+            )
+
+    def load(self, load_model: Callable[..., Tuple[Any, Any]], load_draft_model: Callable[..., Any]) -> None:
+        """Connect to ``server_url`` or load the model, draft model and pixel cache."""
+        import torch
+
+        o = self.options
+        if o.server_url:
+            self.model = RemoteBackend(o.server_url, o.server_model, concurrency=o.concurrency)
+            print(f"Remote backend: {o.server_url} (model {o.server_model}, concurrency {o.concurrency})")
+            return
+        start = time.perf_counter()
+        self.processor, self.model = load_model(
+            o.device, precision=o.precision, max_cpu_memory_gb=o.max_cpu_memory_gb, offload_dir=o.offload(),
+        )
+        self.load_info = {
+            "precision": o.precision,
+            "load_s": time.perf_counter() - start,
+            "peak_rss_mb": peak_rss_mb(),
+            "threads": torch.get_num_threads(),
+        }
+        print("Model load:", self.load_info)
+        if o.draft_model:
+            self.assistant = Assistant(load_draft_model(o.draft_model, o.device, o.precision), o.num_draft_tokens, o.draft_verify)
+            print(f"Draft model: {o.draft_model} ({o.num_draft_tokens} draft tokens per step)")
+        if o.pixel_cache:
+            self.pixel_cache = attach_pixel_cache(self.processor, o.pixel_cache)
+        try:
+            print("Model device allocation:", summarize_device_allocation(self.model))
+        except Exception as e:  # pragma: no cover
+            print(f"(Could not summarize devices: {e})")
+
+    def report(
+        self,
+        meta: Dict[str, Any],
+        folds: Dict[str, JournalFold],
+        sections: Dict[str, Dict[str, Any]],
+        monitors: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Add the stats of every enabled feature to ``meta`` and print them, then
+        close the caches, heartbeat and backend. ``folds`` / ``sections`` /
+        ``monitors`` are keyed by answer mode (by cell for sweeps); a single key
+        keeps the flat layout."""
+        o = self.options
+        modes = list(folds)
+
+        def per_mode(stats: Callable[[str], Any]) -> Dict[str, Any]:
+            return stats(modes[0]) if len(modes) == 1 else {mode: stats(mode) for mode in modes}
+
+        def records(mode: str) -> Iterator[DatasetEntryResult]:
+            return chain(folds[mode].results("ranking"), folds[mode].results("matching"))
+
+        if self.part:
+            meta["shard"] = f"{self.part[0]}/{self.part[1]}"
+        if monitors:
+            meta["adaptive"] = per_mode(lambda mode: monitors[mode].summary())
+            for mode in modes:
+                summary = monitors[mode].summary()
+                print(f"Adaptive {mode}:", {k: v for k, v in summary.items() if k != "order"})
+        if o.early_stop:
+            meta["early_stop"] = summarize_stops(chain.from_iterable(records(mode) for mode in modes))
+            print("Early stop:", meta["early_stop"])
+        if self.prefix_cache is not None:
+            meta["prefix_cache"] = self.prefix_cache.summary()
+            print("Prefix cache:", meta["prefix_cache"])
+        if self.prefetcher is not None:
+            meta["pipeline"] = self.prefetcher.summary()
+            print("Pipeline stage seconds:", meta["pipeline"]["seconds"])
+        if isinstance(self.model, RemoteBackend):
+            meta["remote"] = dict(self.model.stats, url=o.server_url, model=o.server_model, concurrency=o.concurrency)
+            print("Remote backend:", meta["remote"])
+        if self.assistant is not None:
+            meta["draft"] = {"model": o.draft_model, **per_mode(lambda mode: summarize_drafts(records(mode)))}
+            print("Assisted decoding:", meta["draft"])
+        if self.voter is not None and any(o.sampling(mode) for mode in modes):
+            meta["vote"] = {**self.voter.params(), **per_mode(lambda mode: summarize_votes(records(mode)))}
+            print("Self-consistency:", meta["vote"])
+        if o.image() is not None:
+            meta["image_budget"] = o.image()
+        if self.load_info is not None and (o.precision != "auto" or o.max_cpu_memory_gb or o.threads or o.interop_threads):
+            meta["load"] = self.load_info
+        if self.pixel_cache is not None:
+            meta["pixel_cache"] = self.pixel_cache.summary()
+            print("Pixel cache:", meta["pixel_cache"])
+        if self.response_cache is not None:
+            meta["response_cache"] = self.response_cache.stats()
+            print("Response cache:", meta["response_cache"])
+        if self.profiler is not None:
+            for mode in modes:
+                for task in ("ranking", "matching"):
+                    print(f"Perf {mode}/{task}:", format_perf(sections[mode][task]["summary"]["perf"]))
+            if o.trace:
+                print("Trace:", self.profiler.write_trace(shard_path(Path(o.trace), self.part)))
+        self.close()
+
+    def close(self) -> None:
+        if self.heartbeat is not None:
+            self.heartbeat.close()
+        if isinstance(self.model, RemoteBackend):
+            self.model.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
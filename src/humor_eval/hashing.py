@@ -0,0 +1,21 @@
+"""Content hashes shared by the in-process and on-disk caches."""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict
+
+from PIL.Image import Image
+
+
+def image_hash(image: Image) -> str:
+    """Content hash of a PIL image (mode, size and raw pixel bytes)."""
+    h = hashlib.sha1()
+    h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def dict_hash(data: Dict[str, Any]) -> str:
+    """SHA-256 of a JSON-serialisable dict with sorted keys."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,260 @@
+"""Heartbeat file with live throughput, accuracy and ETA of a running job.
+
+``Heartbeat.update`` is called once per finished result and only bumps
+counters. At most every ``interval_s`` seconds it replaces a small JSON file
+atomically (temp file + rename). It can also replace a Prometheus textfile
+(for node_exporter's textfile collector) the same way. The file holds:
+
+- state (``running`` / ``done``), pid, host and the last update time;
+- items done and total, items/sec and ETA;
+- generated tokens/sec (from ``perf`` or early-stop stats, so only with
+  ``--profile`` or ``--early_stop``);
+- per mode/task accuracy and Unknown rate, overall and over the last
+  ``window`` items;
+- current and peak host memory and, with CUDA, peak device memory.
+
+Runners take ``--heartbeat PATH`` (``--heartbeat_prom PATH``,
+``--heartbeat_s``); shards write one file each. ``watch`` lists heartbeat
+files and exits 1 if any running job has not updated for ``--stale_s``::
+
+    python -m humor_eval.run_simple --split test --heartbeat hb/simple.json --heartbeat_prom /var/lib/node_exporter/humor.prom
+    python -m humor_eval.heartbeat watch hb/ --stale_s 600
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+from .profiling import peak_rss_mb, rss_mb
+
+DEFAULT_INTERVAL_S = 10.0
+DEFAULT_WINDOW = 100
+# Added to the labels when set, so array tasks can be told apart (and killed).
+SLURM_LABELS = ("SLURM_JOB_ID", "SLURM_ARRAY_JOB_ID", "SLURM_ARRAY_TASK_ID")
+
+
+def _replace(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _device_peak_mb() -> float:
+    # Never import torch just for this; a job without it has no device memory.
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return 0.0
+    return torch.cuda.max_memory_allocated() / 1024**2
+
+
+class _Tally:
+    __slots__ = ("done", "correct", "unknown", "recent")
+
+    def __init__(self, window: int):
+        self.done = self.correct = self.unknown = 0
+        self.recent: Deque[tuple] = deque(maxlen=window)
+
+    def add(self, correct: bool, unknown: bool) -> None:
+        self.done += 1
+        self.correct += correct
+        self.unknown += unknown
+        self.recent.append((correct, unknown))
+
+    def summary(self) -> Dict[str, Any]:
+        n = len(self.recent)
+        return {
+            "done": self.done,
+            "accuracy": self.correct / self.done if self.done else 0.0,
+            "unknown_rate": self.unknown / self.done if self.done else 0.0,
+            "recent_accuracy": sum(c for c, _ in self.recent) / n if n else 0.0,
+            "recent_unknown_rate": sum(u for _, u in self.recent) / n if n else 0.0,
+        }
+
+
+class Heartbeat:
+    """Counters of a running job plus the files they are flushed to."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        prom_path: Optional[str | Path] = None,
+        interval_s: float = DEFAULT_INTERVAL_S,
+        window: int = DEFAULT_WINDOW,
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.prom_path = Path(prom_path) if prom_path else None
+        self.interval_s = interval_s
+        self.window = window
+        self.labels = {name.lower(): os.environ[name] for name in SLURM_LABELS if name in os.environ}
+        self.labels.update({k: str(v) for k, v in (labels or {}).items() if v is not None})
+        self.started = time.time()
+        self._start = time.monotonic()
+        self._last_write = float("-inf")
+        self.total = 0
+        self.skipped = 0  # already journaled when the job started
+        self.done = 0
+        self.tokens = 0
+        self.token_items = 0
+        self.tasks: Dict[str, _Tally] = {}
+        self.writes = 0
+        self.write_s = 0.0
+
+    def start(self, answer_mode: str, total: int, skipped: int = 0) -> None:
+        """Register ``total`` items of one mode, ``skipped`` of them already done."""
+        self.total += total
+        self.skipped += skipped
+        self.flush()
+
+    def update(self, answer_mode: str, rec: Dict[str, Any]) -> None:
+        """Count one finished result; writes only when ``interval_s`` has passed."""
+        self.done += 1
+        key = f"{answer_mode}/{rec['task']}"
+        tally = self.tasks.get(key)
+        if tally is None:
+            tally = self.tasks[key] = _Tally(self.window)
+        tally.add(bool(rec["is_correct"]), rec["extracted_answer"] == "Unknown")
+        tokens = rec["perf"]["generated_tokens"] if "perf" in rec else rec.get("generated_tokens")
+        if tokens is not None:
+            self.tokens += tokens
+            self.token_items += 1
+        if time.monotonic() - self._last_write >= self.interval_s:
+            self.flush()
+
+    def snapshot(self, state: str = "running") -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.skipped - self.done, 0)
+        return {
+            "state": state,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "labels": self.labels,
+            "started": self.started,
+            "updated": time.time(),
+            "elapsed_s": elapsed,
+            "items_total": self.total,
+            "items_skipped": self.skipped,
+            "items_done": self.done,
+            "items_per_s": rate,
+            "eta_s": remaining / rate if rate > 0 else None,
+            "generated_tokens": self.tokens if self.token_items else None,
+            "tokens_per_s": self.tokens / elapsed if self.token_items and elapsed > 0 else None,
+            "tasks": {key: tally.summary() for key, tally in self.tasks.items()},
+            "rss_mb": rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_device_mb": _device_peak_mb(),
+            "heartbeat_writes": self.writes,
+            "heartbeat_write_s": self.write_s,
+        }
+
+    def flush(self, state: str = "running") -> None:
+        start = time.monotonic()
+        snap = self.snapshot(state)
+        _replace(self.path, json.dumps(snap, indent=2))
+        if self.prom_path is not None:
+            _replace(self.prom_path, prometheus_text(snap))
+        self._last_write = time.monotonic()
+        self.writes += 1
+        self.write_s += self._last_write - start
+
+    def close(self) -> None:
+        self.flush("done")
+
+
+def _label_text(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+_GAUGES = (
+    ("items_total", "Items this job evaluates"),
+    ("items_done", "Items finished by this process"),
+    ("items_per_s", "Items per second since start"),
+    ("eta_s", "Estimated seconds to completion"),
+    ("tokens_per_s", "Generated tokens per second since start"),
+    ("rss_mb", "Resident host memory in MB"),
+    ("peak_rss_mb", "Peak resident host memory in MB"),
+    ("peak_device_mb", "Peak CUDA memory allocated in MB"),
+    ("updated", "Unix time of the last heartbeat"),
+)
+
+
+def prometheus_text(snap: Dict[str, Any]) -> str:
+    """A heartbeat snapshot in the Prometheus text exposition format."""
+    labels = dict(snap["labels"], host=snap["host"], pid=snap["pid"])
+    lines: List[str] = []
+    for name, help_text in _GAUGES:
+        if snap[name] is None:
+            continue
+        lines += [f"# HELP humor_eval_{name} {help_text}", f"# TYPE humor_eval_{name} gauge"]
+        lines.append(f"humor_eval_{name}{_label_text(labels)} {float(snap[name])}")
+    lines.append("# TYPE humor_eval_running gauge")
+    lines.append(f"humor_eval_running{_label_text(labels)} {int(snap['state'] == 'running')}")
+    for field in ("done", "accuracy", "unknown_rate", "recent_accuracy", "recent_unknown_rate"):
+        lines.append(f"# TYPE humor_eval_task_{field} gauge")
+        for key, task in snap["tasks"].items():
+            mode, _, name = key.partition("/")
+            lines.append(f"humor_eval_task_{field}{_label_text(dict(labels, mode=mode, task=name))} {float(task[field])}")
+    return "\n".join(lines) + "\n"
+
+
+def read_heartbeats(paths: Sequence[str | Path]) -> List[Dict[str, Any]]:
+    """Heartbeat snapshots from files or directories of ``*.json`` (unreadable
+    or non-heartbeat files are skipped)."""
+    snaps = []
+    for p in map(Path, paths):
+        for f in sorted(p.glob("*.json")) if p.is_dir() else [p]:
+            try:
+                snap = json.loads(f.read_text())
+            except (OSError, ValueError):
+                continue
+            if isinstance(snap, dict) and "items_done" in snap and "state" in snap:
+                snaps.append(dict(snap, path=str(f)))
+    return snaps
+
+
+def stale(snap: Dict[str, Any], stale_s: float, now: Optional[float] = None) -> bool:
+    """A running job whose last heartbeat is older than ``stale_s``."""
+    return snap["state"] == "running" and (now if now is not None else time.time()) - snap["updated"] > stale_s
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Inspect heartbeat files of running jobs")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ap_watch = sub.add_parser("watch", help="One line per job; exit 1 if any running job is stale")
+    ap_watch.add_argument("paths", nargs="+", help="Heartbeat files or directories")
+    ap_watch.add_argument("--stale_s", type=float, default=600.0, help="Running jobs silent for longer are stale")
+    args = ap.parse_args(argv)
+
+    now = time.time()
+    snaps = read_heartbeats(args.paths)
+    any_stale = False
+    for snap in snaps:
+        flag = "STALE" if stale(snap, args.stale_s, now) else snap["state"]
+        any_stale |= flag == "STALE"
+        eta = f"{snap['eta_s'] / 60:.1f}m" if snap["eta_s"] is not None else "-"
+        accuracy = " ".join(f"{k}={t['accuracy']:.3f}" for k, t in snap["tasks"].items())
+        print(
+            f"{flag:<7} {Path(snap['path']).name:<40} {snap['items_done'] + snap['items_skipped']}/{snap['items_total']} "
+            f"{snap['items_per_s']:.2f} it/s eta {eta} age {now - snap['updated']:.0f}s "
+            f"rss {snap['rss_mb']:.0f}MB {accuracy}"
+        )
+    if not snaps:
+        print("no heartbeat files found")
+    sys.exit(1 if any_stale else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Import-time check for the light import path.
+
+Parsing helpers, result types, journals, analysis and rescoring tools, and the
+CLIs' ``--help`` must not pull in ``torch``, ``transformers`` or ``datasets``:
+those cost seconds and hundreds of MB before the first line of real work.
+``models`` and ``data`` import them inside the functions that load a model or
+a dataset. ``import_profile`` imports modules in a fresh interpreter with
+``python -X importtime`` and reports per-package self time and any heavy
+package that was loaded::
+
+    python -m humor_eval.imports            # exit 1 if a heavy module sneaks in
+    python -m humor_eval.imports --command -m humor_eval.cli --help
+
+numpy (analysis) and PIL (result types) are allowed.
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+HEAVY_MODULES = ("torch", "transformers", "datasets")
+
+LIGHT_MODULES = (
+    "humor_eval.parsing",
+    "humor_eval.dataset_types",
+    "humor_eval.journal",
+    "humor_eval.hashing",
+    "humor_eval.profiling",
+    "humor_eval.heartbeat",
+    "humor_eval.assisted",
+    "humor_eval.response_cache",
+    "humor_eval.resolution",
+    "humor_eval.adaptive",
+    "humor_eval.columnar",
+    "humor_eval.analytics",
+    "humor_eval.compare",
+    "humor_eval.rescore",
+    "humor_eval.shard",
+    "humor_eval.search",
+    "humor_eval.models",
+    "humor_eval.data",
+    "humor_eval.options",
+    "humor_eval.run_simple",
+    "humor_eval.run_dual",
+    "humor_eval.sweep",
+    "humor_eval.cli",
+)
+
+
+def import_profile(modules: Sequence[str] = LIGHT_MODULES, command: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Import ``modules`` (or run ``python <command>``) under ``-X importtime``
+    in a fresh interpreter: total seconds, self microseconds per top-level
+    package, and the heavy packages that were imported."""
+    args = list(command) if command else ["-c", "; ".join(f"import {m}" for m in modules)]
+    src = str(Path(__file__).resolve().parents[1])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in (src, os.environ.get("PYTHONPATH")) if p))
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"python {' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+    packages: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header
+        top = fields[2].strip().split(".")[0]
+        packages[top] = packages.get(top, 0) + int(fields[0])
+    return {
+        "seconds": sum(packages.values()) / 1e6,
+        "packages": dict(sorted(packages.items(), key=lambda kv: kv[1], reverse=True)),
+        "heavy": sorted(p for p in packages if p in HEAVY_MODULES),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Check that the light import path stays free of torch/transformers/datasets")
+    ap.add_argument("--modules", nargs="+", default=list(LIGHT_MODULES))
+    ap.add_argument("--command", nargs=argparse.REMAINDER, help="Profile `python <command>` instead (e.g. -m humor_eval.cli --help)")
+    ap.add_argument("--budget_s", type=float, default=None, help="Also fail when the imports take longer than this")
+    ap.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    args = ap.parse_args()
+
+    profile = import_profile(args.modules, args.command)
+    print(f"total import time: {profile['seconds']:.3f}s")
+    for name, us in list(profile["packages"].items())[: args.top]:
+        print(f"  {name:<24} {us / 1e3:8.1f} ms")
+    failed = False
+    if profile["heavy"]:
+        print("HEAVY IMPORTS:", ", ".join(profile["heavy"]))
+        failed = True
+    if args.budget_s is not None and profile["seconds"] > args.budget_s:
+        print(f"OVER BUDGET: {profile['seconds']:.3f}s > {args.budget_s}s")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,247 @@
+"""Crash-safe JSONL result journal with resume support.
+
+Runners append one line per finished item and fsync every ``fsync_every``
+lines, so a SLURM timeout or OOM loses at most the in-flight items. A line
+torn by a crash is cut off when the journal is reopened. Each line
+records the item key (split, task, entry index, answer mode and a digest of the
+generation params) and the params themselves next to the ``DatasetEntryResult``. ``--resume`` skips keys
+already present; the final results JSON is produced by ``JournalFold``, which
+keeps only byte offsets in memory and streams records back in entry order.
+
+This module only needs the standard library, so analysis tools can read
+journals without importing torch.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+ItemKey = Tuple[str, str, int, str, str]
+
+
+def params_digest(params: Dict[str, Any]) -> str:
+    """Short stable digest of generation params (model id, max_new_tokens, ...)."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _drop_torn_tail(path: Path, chunk: int = 1 << 16) -> None:
+    """Truncate ``path`` back to its last newline, so appends after a crash
+    start on a fresh line instead of extending the torn one."""
+    if not path.exists():
+        return
+    with open(path, "rb+") as fh:
+        end = fh.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(pos - chunk, 0)
+            fh.seek(start)
+            block = fh.read(pos - start)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            fh.truncate(pos)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+class ResultJournal:
+    def __init__(self, path: str | Path, fsync_every: int = 16):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync_every = fsync_every
+        _drop_torn_tail(self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._pending = 0
+
+    def append(self, split: str, index: int, answer_mode: str, params: Dict[str, Any], rec: Dict[str, Any]) -> None:
+        line = {
+            "split": split,
+            "task": rec["task"],
+            "index": index,
+            "answer_mode": answer_mode,
+            "params": params_digest(params),
+            "generation": params,
+            "result": rec,
+        }
+        self._fh.write(json.dumps(line) + "\n")
+        self._fh.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self.sync()
+            self._fh.close()
+
+    def __enter__(self) -> "ResultJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _record_key(rec: Dict[str, Any]) -> ItemKey:
+    return (rec["split"], rec["task"], rec["index"], rec["answer_mode"], rec["params"])
+
+
+def item_key(split: str, task: str, index: int, answer_mode: str, params: Dict[str, Any]) -> ItemKey:
+    return (split, task, index, answer_mode, params_digest(params))
+
+
+def read_journal(path: str | Path) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield ``(byte_offset, record)``. A torn trailing line from a crash is skipped."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "rb") as fh:
+        offset = 0
+        for raw in fh:
+            start = offset
+            offset += len(raw)
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                yield start, json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+
+
+def completed_keys(path: str | Path) -> Set[ItemKey]:
+    return {_record_key(rec) for _, rec in read_journal(path)}
+
+
+def journal_runs(paths: Sequence[str | Path], split: str, answer_mode: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Params digest -> generation params of every run of ``split`` /
+    ``answer_mode`` in ``paths`` (``None`` for lines written before the params
+    were stored)."""
+    runs: Dict[str, Optional[Dict[str, Any]]] = {}
+    for path in paths:
+        for _, rec in read_journal(path):
+            if rec["split"] == split and rec["answer_mode"] == answer_mode:
+                runs[rec["params"]] = rec.get("generation") or runs.get(rec["params"])
+    return runs
+
+
+def single_run(paths: Sequence[str | Path], split: str, answer_mode: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """``(digest, params)`` of the only run in ``paths``; raises ``ValueError``
+    when the journals hold none or runs with different settings."""
+    runs = journal_runs(paths, split, answer_mode)
+    if len(runs) != 1:
+        found = [params or digest for digest, params in runs.items()]
+        raise ValueError(
+            f"journals hold {len(runs)} {split}/{answer_mode} runs, expected exactly one: {found}"
+        )
+    return next(iter(runs.items()))
+
+
+class JournalFold:
+    """Per-task counts and ordered offsets for one (split, mode, params) run.
+
+    ``paths`` may list several journals (e.g. one per shard); records are
+    merged by entry index. Later lines win, so items re-run after a resume
+    replace earlier copies.
+    """
+
+    def __init__(self, paths: str | Path | Sequence[str | Path], split: str, answer_mode: str, params: Dict[str, Any] | str):
+        self.paths = [Path(paths)] if isinstance(paths, (str, Path)) else [Path(p) for p in paths]
+        # ``params`` may also be a digest, e.g. from ``single_run``.
+        digest = params if isinstance(params, str) else params_digest(params)
+        self._offsets: Dict[str, Dict[int, Tuple[int, int]]] = {}
+        self._correct: Dict[str, Dict[int, bool]] = {}
+        for file_no, path in enumerate(self.paths):
+            for offset, rec in read_journal(path):
+                if rec["split"] != split or rec["answer_mode"] != answer_mode or rec["params"] != digest:
+                    continue
+                self._offsets.setdefault(rec["task"], {})[rec["index"]] = (file_no, offset)
+                self._correct.setdefault(rec["task"], {})[rec["index"]] = bool(rec["result"]["is_correct"])
+
+    @property
+    def path(self) -> Path:
+        return self.paths[0]
+
+    def counts(self, task: str) -> Tuple[int, int]:
+        """Return ``(total, correct)`` for a task."""
+        flags = self._correct.get(task, {})
+        return len(flags), sum(flags.values())
+
+    def indices(self, task: str) -> List[int]:
+        return sorted(self._offsets.get(task, {}))
+
+    def restrict(self, indices: Iterable[int]) -> "JournalFold":
+        """Drop every record whose entry index is not in ``indices``."""
+        keep = set(indices)
+        for task in list(self._offsets):
+            self._offsets[task] = {i: v for i, v in self._offsets[task].items() if i in keep}
+            self._correct[task] = {i: v for i, v in self._correct[task].items() if i in keep}
+        return self
+
+    def results(self, task: str) -> Iterator[Dict[str, Any]]:
+        offsets = self._offsets.get(task, {})
+        if not offsets:
+            return
+        handles = {}
+        try:
+            for index in sorted(offsets):
+                file_no, offset = offsets[index]
+                if file_no not in handles:
+                    handles[file_no] = open(self.paths[file_no], "rb")
+                fh = handles[file_no]
+                fh.seek(offset)
+                yield json.loads(fh.readline())["result"]
+        finally:
+            for fh in handles.values():
+                fh.close()
+
+
+def _write_json(obj: Any, fp: IO[str], level: int) -> None:
+    pad = "  " * (level + 1)
+    if isinstance(obj, dict):
+        if not obj:
+            fp.write("{}")
+            return
+        fp.write("{")
+        for i, (key, value) in enumerate(obj.items()):
+            fp.write(("," if i else "") + "\n" + pad + json.dumps(key) + ": ")
+            _write_json(value, fp, level + 1)
+        fp.write("\n" + "  " * level + "}")
+    elif isinstance(obj, (str, int, float, bool)) or obj is None:
+        fp.write(json.dumps(obj))
+    elif isinstance(obj, Iterable):
+        empty = True
+        for item in obj:
+            fp.write(("[" if empty else ",") + "\n" + pad)
+            _write_json(item, fp, level + 1)
+            empty = False
+        fp.write("[]" if empty else "\n" + "  " * level + "]")
+    else:
+        fp.write(json.dumps(obj))
+
+
+def write_json(path: str | Path, payload: Dict[str, Any], fsync: bool = True) -> None:
+    """Write ``payload`` exactly like ``json.dumps(payload, indent=2)``, but
+    stream any iterator values (e.g. ``JournalFold.results``) element by
+    element. The file is written to a temp name and renamed into place."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fp:
+        _write_json(payload, fp, 0)
+        if fsync:
+            fp.flush()
+            os.fsync(fp.fileno())
+    os.replace(tmp, path)
+
+
+def default_journal_path(output_dir: str | Path, name: str, journal: Optional[str] = None) -> Path:
+    return Path(journal) if journal else Path(output_dir) / f"{name}.journal.jsonl"
@@ -2,35 +2,213 @@
 
 Updated to use Llama 3.2V chain-of-thought model and provide reasoning vs simple
 answer prompting. Includes answer extraction utilities validated by tests.
+
+``torch`` and ``transformers`` are imported inside the functions that need
+them, so prompt building and the re-exported parsing helpers import without
+them (see ``imports``).
 """
 from __future__ import annotations
 
-from typing import Tuple
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Sequence, Tuple
 import re
-import torch
-from transformers import AutoProcessor, AutoModelForVision2Seq
-from PIL.Image import Image
+import threading
+import warnings
+
+if TYPE_CHECKING:
+    import torch
+    from PIL.Image import Image
+    from transformers import AutoModelForVision2Seq, AutoProcessor, GenerationConfig
+
+from .parsing import CHOICES, extract_answer, parse_model_response  # noqa: F401  (re-exported)
 
 MODEL_ID = "Xkev/Llama-3.2V-11B-cot"
-CHOICES = ["A", "B", "C", "D", "E"]
 
 
-def load_model():
+# ``auto`` keeps the historical default: bfloat16 on CUDA, float32 on CPU.
+PRECISIONS = ("auto", "float32", "bfloat16", "int8")
+
+
+def weights_params(precision: str = "auto", max_cpu_memory_gb: float | None = None) -> Dict[str, Any] | None:
+    """Non-default ``load_model`` settings; part of the journal and response
+    cache keys, since they change the logits."""
+    weights: Dict[str, Any] = {}
+    if precision != "auto":
+        weights["precision"] = precision
+    if max_cpu_memory_gb:
+        weights["max_cpu_memory_gb"] = max_cpu_memory_gb
+    return weights or None
+
+
+def precision_dtype(precision: str, on_cuda: bool) -> torch.dtype:
+    """Weight dtype to load for ``precision`` (int8 loads float32, then quantizes)."""
+    import torch
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+    if precision == "bfloat16" or (precision == "auto" and on_cuda):
+        return torch.bfloat16
+    return torch.float32
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the ``nn.Linear`` layers, in place (CPU
+    only). ``lm_head`` stays in float so the answer-letter logits keep full
+    resolution."""
+    import torch
+
+    # torch.ao.quantization is deprecated in favour of torchao, which is not a
+    # dependency; its dynamic int8 kernels still ship with torch, so keep using it quietly.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=r"torch\.ao\.quantization is deprecated", category=DeprecationWarning)
+        warnings.filterwarnings("ignore", message=r"torch\.quantize_per_tensor", category=UserWarning)
+        from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+        spec = {
+            name: default_dynamic_qconfig
+            for name, module in model.named_modules()
+            if isinstance(module, torch.nn.Linear) and not name.endswith("lm_head")
+        }
+        return quantize_dynamic(model, qconfig_spec=spec, dtype=torch.qint8, inplace=True)
+
+
+def apply_precision(model, precision: str):
+    """Cast or quantize an already loaded CPU model (``auto`` leaves it as is)."""
+    import torch
+
+    if precision in ("float32", "int8"):
+        model = model.float()
+    elif precision == "bfloat16":
+        model = model.to(torch.bfloat16)
+    elif precision != "auto":
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+    return quantize_int8(model) if precision == "int8" else model
+
+
+def set_threads(threads: int | None = None, interop_threads: int | None = None) -> None:
+    """Set torch intra-op / inter-op thread counts (``None`` keeps the default).
+    The inter-op pool can only be sized before its first use."""
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            print(f"(Could not set inter-op threads: {e})")
+
+
+def load_model(
+    device: str | None = None,
+    precision: str = "auto",
+    max_cpu_memory_gb: float | None = None,
+    offload_dir: str | None = None,
+):
+    """Load processor and model; ``device`` pins the whole model to one device
+    (one replica per shard worker) instead of ``device_map="auto"``.
+
+    ``precision`` picks the weight dtype (``int8`` dynamically quantizes the
+    linear layers after a float32 load, CPU only). ``max_cpu_memory_gb`` caps
+    the weights kept in host memory; the rest is offloaded to ``offload_dir``
+    and paged in per layer, trading speed for fitting on small nodes.
+    """
+    import torch
+    from transformers import AutoModelForVision2Seq, AutoProcessor
+
     processor = AutoProcessor.from_pretrained(MODEL_ID)
+    on_cuda = device.startswith("cuda") if device else torch.cuda.is_available()
+    if precision == "int8" and (on_cuda or max_cpu_memory_gb):
+        raise ValueError("int8 quantization needs the whole model on CPU (no CUDA, no --max_cpu_memory_gb)")
+    kwargs: Dict[str, Any] = {}
+    if max_cpu_memory_gb:
+        if device or on_cuda:
+            raise ValueError("--max_cpu_memory_gb is for CPU-only loading with device_map=auto")
+        if not offload_dir:
+            raise ValueError("--max_cpu_memory_gb needs an offload directory")
+        kwargs = dict(max_memory={"cpu": f"{max_cpu_memory_gb}GiB"}, offload_folder=offload_dir)
     model = AutoModelForVision2Seq.from_pretrained(
         MODEL_ID,
-        torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
-        device_map="auto",
+        torch_dtype=precision_dtype(precision, on_cuda),
+        device_map=device or "auto",
+        low_cpu_mem_usage=True,
+        **kwargs,
     )
     model.eval()
+    if precision == "int8":
+        model = quantize_int8(model)
     return processor, model
 
 
-def _build_prompt(problem: str, answer_mode: str) -> str:
-    base = (
-        "You are an assistant solving a multiple-choice humor caption problem. "
-        "Choices are A, B, C, D, E. Respond with ONLY the letter when possible."
+def load_draft_model(model_id: str, device: str | None = None, precision: str = "auto"):
+    """Load a small model for assisted decoding. It must share the main model's
+    tokenizer and accept its inputs (a smaller vision-language checkpoint)."""
+    import torch
+    from transformers import AutoModelForVision2Seq
+
+    on_cuda = device.startswith("cuda") if device else torch.cuda.is_available()
+    if precision == "int8" and on_cuda:
+        raise ValueError("int8 quantization needs the draft model on CPU")
+    model = AutoModelForVision2Seq.from_pretrained(
+        model_id, torch_dtype=precision_dtype(precision, on_cuda), device_map=device or "auto", low_cpu_mem_usage=True
     )
+    model.eval()
+    if precision == "int8":
+        model = quantize_int8(model)
+    return model
+
+
+# Shared leading instruction of every prompt; prefix caches key on it.
+BASE_INSTRUCTION = (
+    "You are an assistant solving a multiple-choice humor caption problem. "
+    "Choices are A, B, C, D, E. Respond with ONLY the letter when possible."
+)
+
+# Named instructions for prompt ablations (``sweep --prompt_variants``).
+PROMPT_VARIANTS = {
+    "default": BASE_INSTRUCTION,
+    "plain": "You are an assistant solving a multiple-choice humor caption problem. Choices are A, B, C, D, E.",
+}
+_instruction = BASE_INSTRUCTION
+
+
+def current_instruction() -> str:
+    """The instruction ``_build_prompt`` currently starts every prompt with."""
+    return _instruction
+
+
+@contextmanager
+def prompt_instruction(instruction: str) -> Iterator[None]:
+    """Build every prompt inside the block with ``instruction`` in place of
+    ``BASE_INSTRUCTION``. Process-wide, so prefetch threads see it too."""
+    global _instruction
+    previous, _instruction = _instruction, instruction
+    try:
+        yield
+    finally:
+        _instruction = previous
+
+
+def load_generation_config() -> GenerationConfig:
+    """The model's generation config without loading weights (defaults if absent)."""
+    from transformers import GenerationConfig
+
+    try:
+        return GenerationConfig.from_pretrained(MODEL_ID)
+    except (OSError, ValueError):
+        return GenerationConfig()
+
+
+def decoding_settings(generation_config: GenerationConfig) -> Dict[str, Any]:
+    """Generation-config fields that change the completion for a fixed prompt."""
+    return {
+        name: getattr(generation_config, name, None)
+        for name in ("do_sample", "temperature", "top_p", "top_k", "num_beams", "repetition_penalty")
+    }
+
+
+def _build_prompt(problem: str, answer_mode: str) -> str:
+    base = _instruction
     if answer_mode == "reasoned":
         return (
             base
@@ -41,16 +219,8 @@ def _build_prompt(problem: str, answer_mode: str) -> str:
         return base + " Question: " + problem + "\nAnswer:"
 
 
-def chat_infer(
-    processor: AutoProcessor,
-    model: AutoModelForVision2Seq,
-    image: Image,
-    text: str,
-    max_new_tokens: int = 64,
-    answer_mode: str = "simple",
-) -> str:
-    prompt = _build_prompt(text, answer_mode)
-    messages = [
+def _build_messages(image: Image, prompt: str) -> list:
+    return [
         {
             "role": "user",
             "content": [
@@ -59,75 +229,248 @@ def chat_infer(
             ],
         }
     ]
-    inputs = processor.apply_chat_template(
-        messages,
+
+
+def prepare_inputs(processor: AutoProcessor, image: Image, text: str, answer_mode: str = "simple"):
+    """Processor outputs (token ids, pixel values, masks) for one prompt, on the host."""
+    return processor.apply_chat_template(
+        _build_messages(image, _build_prompt(text, answer_mode)),
         add_generation_prompt=True,
         tokenize=True,
         return_dict=True,
         return_tensors="pt",
-    ).to(model.device)
-    outputs = model.generate(**inputs, max_new_tokens=max_new_tokens)
+    )
+
+
+# Batch preparation flips the shared tokenizer's padding side; prefetch workers
+# run it concurrently, so the flip is serialised.
+_PADDING_LOCK = threading.Lock()
+
+
+def prepare_batch_inputs(processor: AutoProcessor, images: Sequence[Image], texts: Sequence[str], answer_mode: str = "simple"):
+    """Left-padded processor outputs for a batch, on the host."""
+    messages = [_build_messages(image, _build_prompt(text, answer_mode)) for image, text in zip(images, texts)]
+    tokenizer = getattr(processor, "tokenizer", processor)
+    with _PADDING_LOCK:
+        padding_side = tokenizer.padding_side
+        tokenizer.padding_side = "left"
+        try:
+            return processor.apply_chat_template(
+                messages,
+                add_generation_prompt=True,
+                tokenize=True,
+                return_dict=True,
+                return_tensors="pt",
+                padding=True,
+            )
+        finally:
+            tokenizer.padding_side = padding_side
+
+
+def generate_response(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    inputs,
+    max_new_tokens: int = 64,
+    image: Image | None = None,
+    prefix_cache=None,
+    draft_model=None,
+    **generate_kwargs,
+) -> str:
+    """Generate from ``prepare_inputs`` output. Host tensors are copied with
+    ``non_blocking`` so pinned inputs overlap the copy. ``generate_kwargs``
+    (e.g. a ``streamer``) go to ``model.generate``. ``draft_model`` turns on
+    assisted decoding: it proposes token blocks that ``model`` verifies in one
+    forward pass, so greedy output is unchanged."""
+    inputs = inputs.to(model.device, non_blocking=True)
+    extra = prefix_cache.generate_kwargs(processor, model, image, inputs) if prefix_cache is not None else {}
+    if draft_model is not None:
+        if prefix_cache is not None:
+            raise ValueError("draft_model cannot be combined with prefix_cache")
+        extra["assistant_model"] = draft_model
+    outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, **extra, **generate_kwargs)
     return processor.decode(outputs[0][inputs["input_ids"].shape[-1]:]).strip()
 
 
-_ANSWER_TAG_RE = re.compile(r"<answer>(.*?)</answer>", re.IGNORECASE | re.DOTALL)
-_CONCLUSION_TAG_RE = re.compile(r"<conclusion>(.*?)</conclusion>", re.IGNORECASE | re.DOTALL)
-_REASONING_TAG_RE = re.compile(r"<reasoning>(.*?)</reasoning>", re.IGNORECASE | re.DOTALL)
-_THINK_TAG_RE = re.compile(r"<think>(.*?)</think>", re.IGNORECASE | re.DOTALL)
-_BOX_LETTER_RE = re.compile(r"<\|begin_of_box\|>([A-E])<\|end_of_box\|>")
-_LETTER_RE = re.compile(r"\b([A-E])\b")
+def chat_infer(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    image: Image,
+    text: str,
+    max_new_tokens: int = 64,
+    answer_mode: str = "simple",
+    prefix_cache=None,
+    draft_model=None,
+    image_budget=None,
+    **generate_kwargs,
+) -> str:
+    """Generate one response. ``prefix_cache`` (a ``prefix_cache.PrefixCache``)
+    lets calls that share an image reuse the image + instruction prefill;
+    ``draft_model`` (see ``load_draft_model``) decodes with assisted generation;
+    ``image_budget`` (a ``resolution.ImageBudget``) resizes the image first."""
+    if image_budget:
+        image = image_budget.apply(image, getattr(processor, "image_processor", None))
+    inputs = prepare_inputs(processor, image, text, answer_mode)
+    return generate_response(
+        processor, model, inputs, max_new_tokens, image=image, prefix_cache=prefix_cache, draft_model=draft_model,
+        **generate_kwargs,
+    )
+
+
+def _eos_token_ids(model) -> set:
+    eos = model.generation_config.eos_token_id
+    if eos is None:
+        return set()
+    return set(eos) if isinstance(eos, (list, tuple)) else {eos}
+
+
+def generate_batch_responses(
+    processor: AutoProcessor, model: AutoModelForVision2Seq, inputs, max_new_tokens: int = 64, **generate_kwargs
+) -> List[str]:
+    """Generate from ``prepare_batch_inputs`` output; one response per row.
+
+    Rows that finish early are padded by ``generate``; generated ids are cut
+    after the first EOS so each response decodes exactly like a batch-size-1 call.
+    """
+    inputs = inputs.to(model.device, non_blocking=True)
+    outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, **generate_kwargs)
+    prompt_len = inputs["input_ids"].shape[-1]
+    eos_ids = _eos_token_ids(model)
+    responses = []
+    for row in outputs:
+        generated = row[prompt_len:].tolist()
+        for pos, token_id in enumerate(generated):
+            if token_id in eos_ids:
+                generated = generated[: pos + 1]
+                break
+        responses.append(processor.decode(generated).strip())
+    return responses
+
+
+def chat_infer_batch(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    images: Sequence[Image],
+    texts: Sequence[str],
+    max_new_tokens: int = 64,
+    answer_mode: str = "simple",
+    **generate_kwargs,
+) -> List[str]:
+    """Batched ``chat_infer``: one response per (image, text) pair, in input order.
+
+    Prompts are left-padded so every row ends at the generation position.
+    """
+    inputs = prepare_batch_inputs(processor, images, texts, answer_mode)
+    return generate_batch_responses(processor, model, inputs, max_new_tokens, **generate_kwargs)
+
+
+_OPTION_RE = re.compile(r"^([A-E])\)", re.MULTILINE)
+
+
+def present_choices(problem: str) -> List[str]:
+    """Option letters listed in the problem (``A) ...`` lines), else all ``CHOICES``."""
+    found = sorted(set(_OPTION_RE.findall(problem)))
+    return found or list(CHOICES)
+
+
+def choice_token_ids(processor: AutoProcessor, letters: Sequence[str]) -> Dict[str, List[int]]:
+    """Single-token spellings of each letter (``"A"`` and ``" A"``)."""
+    tokenizer = getattr(processor, "tokenizer", processor)
+    ids: Dict[str, List[int]] = {}
+    for letter in letters:
+        variants = {tuple(tokenizer.encode(v, add_special_tokens=False)) for v in (letter, " " + letter)}
+        ids[letter] = sorted(v[0] for v in variants if len(v) == 1)
+    return ids
+
+
+def choice_probabilities(logits: torch.Tensor, token_ids: Dict[str, List[int]]) -> Dict[str, float]:
+    """Next-token probability of each letter, renormalised over the letters."""
+    import torch
+
+    probs = torch.softmax(logits.float(), dim=-1)
+    mass = {letter: float(probs[ids].sum()) if ids else 0.0 for letter, ids in token_ids.items()}
+    total = sum(mass.values())
+    if total == 0.0:
+        return {letter: 1.0 / len(mass) for letter in mass}
+    return {letter: m / total for letter, m in mass.items()}
+
+
+def score_response(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    inputs,
+    choices: Sequence[str],
+    image: Image | None = None,
+    prefix_cache=None,
+    **generate_kwargs,
+) -> Dict[str, float]:
+    """Choice distribution from one prefill: ``generate`` stops after a single
+    token, so the prefix cache path still applies and no decode loop runs."""
+    inputs = inputs.to(model.device, non_blocking=True)
+    extra = prefix_cache.generate_kwargs(processor, model, image, inputs) if prefix_cache is not None else {}
+    out = model.generate(
+        **inputs, max_new_tokens=1, output_logits=True, return_dict_in_generate=True, **extra, **generate_kwargs
+    )
+    return choice_probabilities(out.logits[0][0], choice_token_ids(processor, choices))
+
+
+def chat_score(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    image: Image,
+    text: str,
+    prefix_cache=None,
+    **generate_kwargs,
+) -> Dict[str, float]:
+    """``answer_mode="scored"``: probabilities of the option letters in ``text``."""
+    inputs = prepare_inputs(processor, image, text, "scored")
+    return score_response(
+        processor, model, inputs, present_choices(text), image=image, prefix_cache=prefix_cache, **generate_kwargs
+    )
+
+
+def score_batch_responses(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    inputs,
+    choices: Sequence[Sequence[str]],
+    **generate_kwargs,
+) -> List[Dict[str, float]]:
+    """Batched ``score_response`` over ``prepare_batch_inputs`` output; left
+    padding puts every row's next-token logits in the last column."""
+    inputs = inputs.to(model.device, non_blocking=True)
+    out = model.generate(**inputs, max_new_tokens=1, output_logits=True, return_dict_in_generate=True, **generate_kwargs)
+    logits = out.logits[0]
+    return [choice_probabilities(logits[row], choice_token_ids(processor, letters)) for row, letters in enumerate(choices)]
+
+
+def chat_score_batch(
+    processor: AutoProcessor,
+    model: AutoModelForVision2Seq,
+    images: Sequence[Image],
+    texts: Sequence[str],
+    **generate_kwargs,
+) -> List[Dict[str, float]]:
+    inputs = prepare_batch_inputs(processor, images, texts, "scored")
+    return score_batch_responses(processor, model, inputs, [present_choices(t) for t in texts], **generate_kwargs)
+
+
+def prompt_token_lengths(processor: AutoProcessor, texts: Sequence[str], answer_mode: str) -> List[int]:
+    """Token count of each rendered prompt (the chat template adds a constant)."""
+    tokenizer = getattr(processor, "tokenizer", processor)
+    return [len(tokenizer(_build_prompt(t, answer_mode), add_special_tokens=False)["input_ids"]) for t in texts]
 
 
-def parse_model_response(resp: str) -> Tuple[str, str]:
-    """Return (reasoning_segment, answer_segment_raw).
+def length_buckets(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    """Group indices into batches of similar length to keep padding low.
 
-    Reasoning priority:
-      1. <answer> or <conclusion> do NOT count as reasoning; we capture <think> or <reasoning>.
-      2. Prefer <think> if present, else <reasoning>, else ''.
-    Answer segment priority (raw segment returned for transparency):
-      1. <answer>...</answer>
-      2. <conclusion>...</conclusion>
-      3. Single standalone letter (A-E) if entire trimmed output is that letter.
-      4. Full response as last resort.
+    Indices are sorted by (length, position) and chunked, so the grouping is
+    deterministic and each batch spans a narrow length range.
     """
-    think_match = _THINK_TAG_RE.search(resp)
-    reasoning_match = think_match or _REASONING_TAG_RE.search(resp)
-    reasoning = reasoning_match.group(1).strip() if reasoning_match else ""
-
-    for regex in (_ANSWER_TAG_RE, _CONCLUSION_TAG_RE):
-        m = regex.search(resp)
-        if m:
-            return reasoning, m.group(0)
-    stripped = resp.strip()
-    if stripped in CHOICES:
-        return reasoning, stripped
-    return reasoning, resp
-
-
-def extract_answer(resp: str) -> str:
-    # Priority 1: <answer> tag
-    answer_match = _ANSWER_TAG_RE.search(resp)
-    if answer_match:
-        inner = answer_match.group(1)
-        letter = _LETTER_RE.search(inner)
-        if letter:
-            return letter.group(1)
-    # Priority 2: <conclusion> tag
-    concl = _CONCLUSION_TAG_RE.search(resp)
-    if concl:
-        letter = _LETTER_RE.search(concl.group(1))
-        if letter:
-            return letter.group(1)
-    # Priority 3: answer box token pattern
-    box_matches = list(_BOX_LETTER_RE.finditer(resp))
-    candidate_from_box = box_matches[-1].group(1) if box_matches else None
-    # Priority 4: last standalone letter overall
-    letters = _LETTER_RE.findall(resp)
-    if letters:
-        return letters[-1]
-    if candidate_from_box:
-        return candidate_from_box
-    return "Unknown"
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+    order = sorted(range(len(lengths)), key=lambda i: (lengths[i], i))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
 
 
 def summarize_device_allocation(model) -> str:
@@ -0,0 +1,216 @@
+"""Evaluation options shared by ``run_simple``, ``run_dual`` and their workers.
+
+``EvalOptions`` holds every setting both runners accept, ``add_eval_args``
+declares the matching command-line flags once and ``EvalOptions.from_args``
+reads them back. The runners take an ``EvalOptions`` (or the same fields as
+keyword arguments) and ``--num_workers`` hands each worker a copy with its own
+shard and device. Settings that change a response (and so the journal key)
+are derived here too, so every runner and merge computes them the same way.
+
+Only light modules are imported: ``--help`` must not load torch.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, List, Optional, Union
+
+from .adaptive import DEFAULT_CHECK_EVERY, DEFAULT_CONFIDENCE, DEFAULT_MIN_ITEMS, DEFAULT_TARGET_WIDTH, Adaptive
+from .assisted import DEFAULT_DRAFT_TOKENS
+from .heartbeat import DEFAULT_INTERVAL_S
+from .models import MODEL_ID, PRECISIONS, weights_params
+from .resolution import ImageBudget
+
+
+@dataclass
+class EvalOptions:
+    split: str = "test"
+    max_new_tokens: int = 512
+    output_dir: str = "."
+    show_progress: bool = True
+    batch_size: int = 1
+    image_cache_mb: int = 0
+    group_by_contest: bool = False
+    resume: bool = False
+    journal: Optional[str] = None
+    response_cache: Optional[str] = None
+    response_cache_mb: int = 1024
+    prefetch_depth: int = 0
+    prefetch_workers: int = 2
+    shard: Optional[str] = None
+    num_workers: int = 1
+    device: Optional[str] = None
+    early_stop: bool = False
+    heuristic_stop: bool = False
+    profile: bool = False
+    trace: Optional[str] = None
+    server_url: Optional[str] = None
+    server_model: str = MODEL_ID
+    concurrency: int = 8
+    pixel_cache: Optional[str] = None
+    precision: str = "auto"
+    max_cpu_memory_gb: Optional[float] = None
+    offload_dir: Optional[str] = None
+    threads: Optional[int] = None
+    interop_threads: Optional[int] = None
+    draft_model: Optional[str] = None
+    num_draft_tokens: int = DEFAULT_DRAFT_TOKENS
+    draft_verify: bool = False
+    num_samples: int = 1
+    temperature: float = 0.7
+    top_p: float = 1.0
+    sample_seed: int = 0
+    max_image_side: Optional[int] = None
+    max_image_tiles: Optional[int] = None
+    heartbeat: Optional[str] = None
+    heartbeat_prom: Optional[str] = None
+    heartbeat_s: float = DEFAULT_INTERVAL_S
+    adaptive: bool = False
+    target_width: float = DEFAULT_TARGET_WIDTH
+    confidence: float = DEFAULT_CONFIDENCE
+    min_items: int = DEFAULT_MIN_ITEMS
+    check_every: int = DEFAULT_CHECK_EVERY
+    adaptive_seed: int = 0
+    baseline: Optional[List[str]] = None
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "EvalOptions":
+        return cls(**{f.name: getattr(args, f.name) for f in fields(cls)})
+
+    def worker(self, shard: str, device: str) -> "EvalOptions":
+        """Options of one ``--num_workers`` process. CPU workers split the
+        cores (unless ``threads`` is set) so replicas do not oversubscribe."""
+        threads = self.threads
+        if device == "cpu" and threads is None:
+            threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        return replace(self, shard=shard, device=device, num_workers=1, show_progress=False, threads=threads)
+
+    def validate(self) -> None:
+        """Raise ``ValueError`` for option combinations no runner supports."""
+        if self.num_workers > 1 and self.shard is not None:
+            raise ValueError("--shard and --num_workers are mutually exclusive")
+        if self.adaptive and (
+            self.shard is not None or self.num_workers > 1 or self.batch_size > 1 or self.group_by_contest or self.response_cache
+        ):
+            raise ValueError("--adaptive evaluates in order: no --shard, --num_workers, --batch_size, --group_by_contest or --response_cache")
+        if self.baseline and not self.adaptive:
+            raise ValueError("--baseline needs --adaptive")
+        if self.heuristic_stop and not self.early_stop:
+            raise ValueError("--heuristic_stop needs --early_stop")
+        if self.draft_model and self.server_url:
+            raise ValueError("--draft_model needs a local model (not --server_url)")
+        if self.num_samples > 1 and (self.server_url or self.response_cache):
+            raise ValueError("--num_samples needs a local model and no --response_cache")
+
+    def voter(self):
+        """The self-consistency ``Voter``, or ``None`` for greedy decoding."""
+        if self.num_samples <= 1:
+            return None
+        from .voting import Voter
+
+        return Voter(self.num_samples, self.temperature, self.top_p, self.sample_seed)
+
+    def sampling(self, answer_mode: str) -> Optional[Dict[str, Any]]:
+        """Sampling settings that key ``answer_mode`` (scored mode does not sample)."""
+        voter = self.voter()
+        return voter.params() if voter is not None and answer_mode != "scored" else None
+
+    def image_budget(self) -> ImageBudget:
+        return ImageBudget(self.max_image_side, self.max_image_tiles)
+
+    def image(self) -> Optional[Dict[str, Any]]:
+        return self.image_budget().params() or None
+
+    @property
+    def model_id(self) -> str:
+        """The model that answers: ``server_model`` for remote runs."""
+        return self.server_model if self.server_url else MODEL_ID
+
+    @property
+    def stopping(self) -> Union[bool, str]:
+        """The ``early_stop`` argument of ``evaluate``: ``"heuristic"`` adds the
+        stops that may change answers to the closed-``</answer>`` one."""
+        return "heuristic" if self.early_stop and self.heuristic_stop else self.early_stop
+
+    @property
+    def backend(self) -> str:
+        return "remote" if self.server_url else "local"
+
+    def offload(self) -> str:
+        """Directory for weights that ``max_cpu_memory_gb`` keeps out of RAM."""
+        return self.offload_dir or os.path.join(self.output_dir, "offload")
+
+    def weights(self) -> Optional[Dict[str, Any]]:
+        """Non-default precision / offload of the local model (``None`` for
+        remote runs, whose server picks its own)."""
+        return None if self.server_url else weights_params(self.precision, self.max_cpu_memory_gb)
+
+    def params(self, answer_mode: str) -> Dict[str, Any]:
+        """Generation params of ``answer_mode``; part of every journal key."""
+        from .evaluate import generation_params
+
+        return generation_params(
+            self.max_new_tokens, self.stopping, self.sampling(answer_mode), self.image(), self.model_id, self.weights(),
+            self.backend,
+        )
+
+    def adaptive_settings(self) -> Adaptive:
+        return Adaptive(self.target_width, self.confidence, self.min_items, self.check_every, self.adaptive_seed)
+
+
+def add_eval_args(ap: argparse.ArgumentParser) -> None:
+    """Declare the ``EvalOptions`` flags on ``ap``."""
+    ap.add_argument("--split", default="test", help="Dataset split: test | test_hard | test_very_hard")
+    ap.add_argument("--max_new_tokens", type=int, default=512)
+    ap.add_argument("--output_dir", default=".")
+    ap.add_argument("--no_progress", dest="show_progress", action="store_false", help="Disable tqdm progress bars")
+    ap.add_argument("--batch_size", type=int, default=1, help="Entries per generate call (length-bucketed, left-padded)")
+    ap.add_argument("--image_cache_mb", type=int, default=0, help="Image-prefix KV cache budget in MB (0 disables; needs --batch_size 1)")
+    ap.add_argument("--group_by_contest", action="store_true", help="Process entries grouped by contest_number for more cache hits")
+    ap.add_argument("--resume", action="store_true", help="Skip entries already recorded in the results journal")
+    ap.add_argument("--journal", default=None, help="Journal path (default: <output_dir>/<results name>.journal.jsonl)")
+    ap.add_argument("--response_cache", default=None, help="SQLite response cache path (opt-in)")
+    ap.add_argument("--response_cache_mb", type=int, default=1024, help="Response cache size cap in MB (LRU eviction)")
+    ap.add_argument("--prefetch_depth", type=int, default=0, help="Prepare this many upcoming items in background threads (0 disables)")
+    ap.add_argument("--prefetch_workers", type=int, default=2, help="Worker threads for --prefetch_depth")
+    ap.add_argument("--shard", default=None, help="Evaluate only shard i/N (e.g. 0/4); merge with python -m humor_eval.shard merge")
+    ap.add_argument("--num_workers", type=int, default=1, help="Run N shard processes (one model replica per device) and merge")
+    ap.add_argument("--device", default=None, help="Place the whole model on this device instead of device_map=auto")
+    ap.add_argument("--early_stop", action="store_true", help="Stop generating once a closed <answer> tag fixes the answer")
+    ap.add_argument(
+        "--heuristic_stop",
+        action="store_true",
+        help="With --early_stop, also stop at a closed <conclusion>, a box token or (simple mode) a bare letter; "
+        "a later tag or letter could have overridden these, so they may change answers",
+    )
+    ap.add_argument("--profile", action="store_true", help="Record per-item timings/tokens/memory under 'perf' and summarize them")
+    ap.add_argument("--trace", default=None, help="Write a Chrome/Perfetto trace of the run here (implies --profile)")
+    ap.add_argument("--server_url", default=None, help="OpenAI-compatible server (e.g. http://localhost:8000/v1) instead of loading the model")
+    ap.add_argument("--server_model", default=MODEL_ID, help="Model name to request from --server_url")
+    ap.add_argument("--concurrency", type=int, default=8, help="Requests in flight with --server_url")
+    ap.add_argument("--pixel_cache", default=None, help="Directory of the persistent preprocessed-image cache (see humor_eval.pixel_cache)")
+    ap.add_argument("--precision", choices=PRECISIONS, default="auto", help="Weights: auto (bf16 on CUDA, fp32 on CPU), float32, bfloat16, or int8 (dynamic, CPU)")
+    ap.add_argument("--max_cpu_memory_gb", type=float, default=None, help="Cap host memory for weights and offload the rest to disk (CPU only)")
+    ap.add_argument("--offload_dir", default=None, help="Where --max_cpu_memory_gb offloads weights (default: <output_dir>/offload)")
+    ap.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    ap.add_argument("--interop_threads", type=int, default=None, help="torch inter-op threads")
+    ap.add_argument("--draft_model", default=None, help="Small model (same tokenizer) for assisted decoding; greedy output is unchanged")
+    ap.add_argument("--num_draft_tokens", type=int, default=DEFAULT_DRAFT_TOKENS, help="Tokens the draft model proposes per step")
+    ap.add_argument("--draft_verify", action="store_true", help="Also generate each item without the draft to record speedup and check identity")
+    ap.add_argument("--num_samples", type=int, default=1, help="Majority vote over this many sampled continuations sharing one prefill (1 = greedy)")
+    ap.add_argument("--temperature", type=float, default=0.7, help="Sampling temperature for --num_samples")
+    ap.add_argument("--top_p", type=float, default=1.0, help="Nucleus sampling for --num_samples")
+    ap.add_argument("--sample_seed", type=int, default=0, help="Seed for --num_samples (set per item)")
+    ap.add_argument("--max_image_side", type=int, default=None, help="Resize cartoons so the longer side is at most this many pixels")
+    ap.add_argument("--max_image_tiles", type=int, default=None, help="Resize cartoons to fit a canvas of at most this many image tiles")
+    ap.add_argument("--heartbeat", default=None, help="Keep a JSON heartbeat (progress, rates, accuracy, memory, ETA) here (see humor_eval.heartbeat)")
+    ap.add_argument("--heartbeat_prom", default=None, help="Also write the heartbeat as a Prometheus textfile here")
+    ap.add_argument("--heartbeat_s", type=float, default=DEFAULT_INTERVAL_S, help="Seconds between heartbeat writes")
+    ap.add_argument("--adaptive", action="store_true", help="Evaluate in stratified random order and stop once accuracy is settled (see humor_eval.adaptive)")
+    ap.add_argument("--target_width", type=float, default=DEFAULT_TARGET_WIDTH, help="Stop when the confidence interval is at most this wide")
+    ap.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="Confidence level, split over all planned checks")
+    ap.add_argument("--min_items", type=int, default=DEFAULT_MIN_ITEMS, help="Items before the first stopping check")
+    ap.add_argument("--check_every", type=int, default=DEFAULT_CHECK_EVERY, help="Items between stopping checks")
+    ap.add_argument("--adaptive_seed", type=int, default=0, help="Seed of the stratified order")
+    ap.add_argument("--baseline", nargs="+", default=None, help="Stored results JSON(s), one per mode; stop once the paired difference is settled")
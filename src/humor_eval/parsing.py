@@ -0,0 +1,130 @@
+"""Response parsing: reasoning / answer segments and the extracted letter.
+
+Kept free of torch / transformers so results can be re-parsed (see
+``humor_eval.rescore``) without loading the model stack. ``models`` re-exports
+``CHOICES``, ``parse_model_response`` and ``extract_answer``.
+"""
+from __future__ import annotations
+
+import re
+from typing import Tuple
+
+CHOICES = ["A", "B", "C", "D", "E"]
+
+_ANSWER_TAG_RE = re.compile(r"<answer>(.*?)</answer>", re.IGNORECASE | re.DOTALL)
+_CONCLUSION_TAG_RE = re.compile(r"<conclusion>(.*?)</conclusion>", re.IGNORECASE | re.DOTALL)
+_REASONING_TAG_RE = re.compile(r"<reasoning>(.*?)</reasoning>", re.IGNORECASE | re.DOTALL)
+_THINK_TAG_RE = re.compile(r"<think>(.*?)</think>", re.IGNORECASE | re.DOTALL)
+_BOX_LETTER_RE = re.compile(r"<\|begin_of_box\|>([A-E])<\|end_of_box\|>")
+_LETTER_RE = re.compile(r"\b([A-E])\b")
+
+
+def parse_model_response(resp: str) -> Tuple[str, str]:
+    """Return (reasoning_segment, answer_segment_raw).
+
+    Reasoning priority:
+      1. <answer> or <conclusion> do NOT count as reasoning; we capture <think> or <reasoning>.
+      2. Prefer <think> if present, else <reasoning>, else ''.
+    Answer segment priority (raw segment returned for transparency):
+      1. <answer>...</answer>
+      2. <conclusion>...</conclusion>
+      3. Single standalone letter (A-E) if entire trimmed output is that letter.
+      4. Full response as last resort.
+    """
+    think_match = _THINK_TAG_RE.search(resp)
+    reasoning_match = think_match or _REASONING_TAG_RE.search(resp)
+    reasoning = reasoning_match.group(1).strip() if reasoning_match else ""
+
+    for regex in (_ANSWER_TAG_RE, _CONCLUSION_TAG_RE):
+        m = regex.search(resp)
+        if m:
+            return reasoning, m.group(0)
+    stripped = resp.strip()
+    if stripped in CHOICES:
+        return reasoning, stripped
+    return reasoning, resp
+
+
+def extract_answer(resp: str) -> str:
+    # Priority 1: <answer> tag
+    answer_match = _ANSWER_TAG_RE.search(resp)
+    if answer_match:
+        inner = answer_match.group(1)
+        letter = _LETTER_RE.search(inner)
+        if letter:
+            return letter.group(1)
+    # Priority 2: <conclusion> tag
+    concl = _CONCLUSION_TAG_RE.search(resp)
+    if concl:
+        letter = _LETTER_RE.search(concl.group(1))
+        if letter:
+            return letter.group(1)
+    # Priority 3: answer box token pattern
+    box_matches = list(_BOX_LETTER_RE.finditer(resp))
+    candidate_from_box = box_matches[-1].group(1) if box_matches else None
+    # Priority 4: last standalone letter overall
+    letters = _LETTER_RE.findall(resp)
+    if letters:
+        return letters[-1]
+    if candidate_from_box:
+        return candidate_from_box
+    return "Unknown"
+
+
+# Every tag the parsers above look at, in one pattern. Letters are not part of
+# the scan: they are only ever needed inside an answer/conclusion span or as the
+# last one in the text, so they are looked up locally afterwards. Box letters
+# never need a pass of their own: ``\b([A-E])\b`` already matches them, so the
+# box fallback in ``extract_answer`` can only fire when there is no letter at all.
+_TAG_SCAN_RE = re.compile(r"<(/?)(think|reasoning|answer|conclusion)>", re.IGNORECASE)
+
+
+def _last_letter(resp: str) -> str | None:
+    m = _LETTER_RE.search(resp[::-1])  # \b is symmetric, so the reversed text works
+    return m.group(1) if m else None
+
+
+def scan_response(resp: str) -> Tuple[str, str, str]:
+    """Single-scan equivalent of ``parse_model_response`` + ``extract_answer``.
+
+    Returns ``(reasoning, answer_segment, extracted_answer)``. For each tag kind
+    the span is the first opening tag and the first closing tag after it, which
+    is what the non-greedy ``search`` calls match.
+    """
+    opened = {}
+    spans = {}
+    for m in _TAG_SCAN_RE.finditer(resp):
+        kind = m.group(2).lower()
+        if not m.group(1):
+            opened.setdefault(kind, m)
+        elif kind in opened and kind not in spans:
+            spans[kind] = (opened[kind], m)
+
+    def inner(kind):
+        start, end = spans[kind]
+        return start.end(), end.start()
+
+    reasoning = ""
+    for kind in ("think", "reasoning"):
+        if kind in spans:
+            lo, hi = inner(kind)
+            reasoning = resp[lo:hi].strip()
+            break
+
+    segment = None
+    for kind in ("answer", "conclusion"):
+        if kind in spans:
+            start, end = spans[kind]
+            segment = resp[start.start():end.end()]
+            break
+    if segment is None:
+        stripped = resp.strip()
+        segment = stripped if stripped in CHOICES else resp
+
+    for kind in ("answer", "conclusion"):
+        if kind in spans:
+            # Span edges are ``>`` / ``<``, so \b behaves as on the sliced text.
+            m = _LETTER_RE.search(resp, *inner(kind))
+            if m:
+                return reasoning, segment, m.group(1)
+    return reasoning, segment, _last_letter(resp) or "Unknown"
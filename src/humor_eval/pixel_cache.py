@@ -0,0 +1,259 @@
+"""Persistent cache of preprocessed image tensors, memory-mapped on read.
+
+The Mllama image processor (resize, tile, rescale, normalise) does the same work
+for a cartoon in every run, split and mode. ``PixelCache`` stores its outputs
+for one image (the real tiles of ``pixel_values`` plus ``aspect_ratio_ids``,
+``aspect_ratio_mask`` and ``num_tiles``) under the image content hash, so
+contests and splits that share a cartoon share one entry. Tiles are ``.npy``
+files opened with ``mmap_mode="r"``: concurrent workers and shard processes read
+the same page-cache pages instead of each re-running the processor, and the
+only copy is into the padded batch tensor the model needs anyway.
+
+Entries live in a namespace directory named after a digest of the model id, the
+image processor config and the format version, so changing any of them starts
+a fresh namespace and old entries are never read (``prune`` deletes them).
+
+``attach_pixel_cache`` swaps ``processor.image_processor`` for a caching proxy,
+so ``prepare_inputs``, batching and prefetch pick it up unchanged::
+
+    python -m humor_eval.pixel_cache precompute --splits test test_hard test_very_hard --workers 8
+    python -m humor_eval.run_simple --split test --pixel_cache ~/.cache/humor_eval/pixels
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL.Image import Image
+from transformers import BatchFeature
+
+from .data import INDEX_DIR, entry_meta
+from .hashing import dict_hash, image_hash
+from .models import MODEL_ID
+
+FORMAT_VERSION = 1
+DEFAULT_DIR = INDEX_DIR.parent / "pixels"
+
+
+def supports_pixel_cache(image_processor) -> bool:
+    return getattr(image_processor, "max_image_tiles", None) is not None
+
+
+def namespace(image_processor, model_id: str = MODEL_ID) -> str:
+    """Digest of everything that changes the processor output for an image."""
+    config = json.loads(image_processor.to_json_string())
+    return dict_hash({"model_id": model_id, "image_processor": config, "format": FORMAT_VERSION})[:16]
+
+
+class PixelCache:
+    def __init__(self, root: str | Path = DEFAULT_DIR, image_processor=None, model_id: str = MODEL_ID):
+        self.root = Path(root)
+        self.image_processor = image_processor
+        self.dir = self.root / namespace(image_processor, model_id)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, key: str):
+        base = self.dir / key[:2] / key
+        return base.with_suffix(".npy"), base.with_suffix(".json")
+
+    def __contains__(self, image: Image) -> bool:
+        return self._paths(image_hash(image))[1].exists()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached entry for an image hash (tiles memory-mapped), or ``None``."""
+        tiles_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            tiles = np.load(tiles_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        return dict(meta, tiles=tiles)
+
+    def put(self, key: str, features: Dict[str, Any]) -> Dict[str, Any]:
+        """Store the single-image processor output ``features``; the metadata
+        file is renamed into place last, so readers never see a partial entry."""
+        n = features["num_tiles"][0][0]
+        pixel_values = np.asarray(features["pixel_values"])
+        entry = {
+            "num_tiles": n,
+            "shape": list(pixel_values.shape[1:]),
+            "dtype": str(pixel_values.dtype),
+            "aspect_ratio_ids": np.asarray(features["aspect_ratio_ids"])[0].tolist(),
+            "aspect_ratio_mask": np.asarray(features["aspect_ratio_mask"])[0].tolist(),
+        }
+        tiles_path, meta_path = self._paths(key)
+        tiles_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp = tiles_path.with_name(tiles_path.name + suffix)
+        with open(tmp, "wb") as fh:
+            np.save(fh, np.ascontiguousarray(pixel_values[0, 0, :n]))
+        os.replace(tmp, tiles_path)
+        tmp = meta_path.with_name(meta_path.name + suffix)
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, meta_path)
+        return dict(entry, tiles=pixel_values[0, 0, :n])
+
+    def entry(self, image: Image) -> Dict[str, Any]:
+        """Cached entry for ``image``, running the image processor on a miss."""
+        key = image_hash(image)
+        cached = self.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            return cached
+        return self.put(key, self.image_processor([[image]]))
+
+    def features(self, images: Sequence[Image]) -> Dict[str, Any]:
+        """Batch processor output (numpy, padded tiles) for one image per row."""
+        entries = [self.entry(image) for image in images]
+        shape = entries[0]["shape"]
+        pixel_values = np.zeros([len(entries), *shape], dtype=entries[0]["dtype"])
+        for row, entry in enumerate(entries):
+            pixel_values[row, 0, : entry["num_tiles"]] = entry["tiles"]
+        return {
+            "pixel_values": pixel_values,
+            "aspect_ratio_ids": np.array([e["aspect_ratio_ids"] for e in entries], dtype=np.int64),
+            "aspect_ratio_mask": np.array([e["aspect_ratio_mask"] for e in entries], dtype=np.int64),
+            "num_tiles": [[e["num_tiles"]] for e in entries],
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "dir": str(self.dir),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class CachedImageProcessor:
+    """Drop-in for ``processor.image_processor`` that serves ``PixelCache``
+    entries; anything but one image per row goes to the real processor."""
+
+    def __init__(self, image_processor, cache: PixelCache):
+        self.image_processor = image_processor
+        self.cache = cache
+
+    def __getattr__(self, name: str):
+        return getattr(self.image_processor, name)
+
+    def __call__(self, images, return_tensors=None, **kwargs):
+        single = isinstance(images, list) and all(isinstance(row, list) and len(row) == 1 for row in images)
+        if kwargs or not images or not single:
+            with self.cache._lock:
+                self.cache.bypassed += 1
+            return self.image_processor(images, return_tensors=return_tensors, **kwargs)
+        features = self.cache.features([row[0] for row in images])
+        num_tiles = features.pop("num_tiles")
+        encoded = BatchFeature(data=features, tensor_type=return_tensors)
+        encoded["num_tiles"] = num_tiles
+        return encoded
+
+
+def attach_pixel_cache(processor, root: str | Path = DEFAULT_DIR, model_id: str = MODEL_ID) -> Optional[PixelCache]:
+    """Route ``processor``'s image preprocessing through a ``PixelCache`` at
+    ``root``; returns ``None`` (and changes nothing) for unsupported processors."""
+    current = processor.image_processor
+    if isinstance(current, CachedImageProcessor):
+        return current.cache
+    if not supports_pixel_cache(current):
+        return None
+    cache = PixelCache(root, current, model_id)
+    processor.image_processor = CachedImageProcessor(current, cache)
+    return cache
+
+
+def _fill(image_processor, root: str, model_id: str, entries, indices: Sequence[int]) -> Dict[str, int]:
+    cache = PixelCache(root, image_processor, model_id)
+    for i in indices:
+        cache.entry(entries[i]["images"])
+    return {"hits": cache.hits, "misses": cache.misses}
+
+
+def precompute(
+    entries, image_processor, root: str | Path = DEFAULT_DIR, model_id: str = MODEL_ID, workers: int = 1
+) -> Dict[str, int]:
+    """Fill the cache for every entry. Entries of one contest go to the same
+    worker, so a cartoon shared by several entries is processed once."""
+    groups: Dict[Any, List[int]] = {}
+    for i in range(len(entries)):
+        groups.setdefault(entry_meta(entries, i)["contest_number"], []).append(i)
+    parts: List[List[int]] = [[] for _ in range(max(workers, 1))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(parts, key=len).extend(group)
+    parts = [p for p in parts if p]
+    if len(parts) <= 1:
+        counts = [_fill(image_processor, str(root), model_id, entries, parts[0] if parts else [])]
+    else:
+        from multiprocessing import get_context
+
+        from .shard import START_METHOD
+
+        with ProcessPoolExecutor(len(parts), mp_context=get_context(START_METHOD)) as pool:
+            futures = [pool.submit(_fill, image_processor, str(root), model_id, entries, part) for part in parts]
+            counts = [f.result() for f in futures]
+    return {key: sum(c[key] for c in counts) for key in ("hits", "misses")}
+
+
+def prune(root: str | Path, keep: str) -> List[str]:
+    """Delete namespaces other than ``keep``; returns the removed names."""
+    removed = []
+    for path in Path(root).iterdir() if Path(root).exists() else ():
+        if path.is_dir() and path.name != keep:
+            shutil.rmtree(path)
+            removed.append(path.name)
+    return removed
+
+
+def cache_stats(root: str | Path) -> Dict[str, Dict[str, int]]:
+    """Entry count and bytes per namespace."""
+    stats = {}
+    for path in sorted(Path(root).iterdir()) if Path(root).exists() else ():
+        if path.is_dir():
+            files = list(path.glob("*/*.npy"))
+            stats[path.name] = {"entries": len(files), "bytes": sum(f.stat().st_size for f in files)}
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Persistent cache of preprocessed image tensors")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p_pre = sub.add_parser("precompute", help="Preprocess every image of the given splits")
+    p_pre.add_argument("--splits", nargs="+", default=["test"])
+    p_pre.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    for p in (p_pre, sub.add_parser("stats"), sub.add_parser("prune", help="Delete namespaces of other processors / models")):
+        p.add_argument("--cache_dir", default=str(DEFAULT_DIR))
+    args = ap.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(cache_stats(args.cache_dir), indent=2))
+    else:
+        from transformers import AutoProcessor
+
+        image_processor = AutoProcessor.from_pretrained(MODEL_ID).image_processor
+        if args.command == "prune":
+            print("Removed namespaces:", prune(args.cache_dir, namespace(image_processor)))
+        else:
+            from .data import load_entries
+
+            for split in args.splits:
+                start = time.perf_counter()
+                counts = precompute(load_entries(split), image_processor, args.cache_dir, workers=args.workers)
+                print(f"{split}: {counts['misses']} processed, {counts['hits']} already cached ({time.perf_counter() - start:.1f}s)")
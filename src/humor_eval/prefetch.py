@@ -0,0 +1,88 @@
+"""Background preprocessing pipeline for the generate loop.
+
+A pool of worker threads runs image decoding, ``apply_chat_template``
+tokenization and pixel normalisation (and pins the host tensors when CUDA is
+available) for the next ``depth`` jobs while the main thread generates. Jobs are
+submitted lazily, so besides the item being consumed at most ``depth`` inputs
+are queued or in preparation (backpressure), and results come back in
+submission order.
+
+Per-stage wall times are accumulated in ``stats``: worker-side ``decode``,
+``preprocess`` and ``pin``; consumer-side ``wait`` (time the generate loop spent
+blocked on the queue), ``h2d`` and ``generate``. A large ``wait`` share means
+preprocessing is the bottleneck.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, TypeVar
+
+import torch
+
+J = TypeVar("J")
+R = TypeVar("R")
+
+
+def pin_inputs(inputs):
+    """Page-lock every tensor in a ``BatchFeature`` for async host-to-device copies."""
+    for key, value in list(inputs.items()):
+        if isinstance(value, torch.Tensor):
+            inputs[key] = value.pin_memory()
+    return inputs
+
+
+class Prefetcher:
+    def __init__(self, depth: int = 4, workers: int = 2, pin_memory: Optional[bool] = None):
+        if depth < 1 or workers < 1:
+            raise ValueError(f"depth and workers must be >= 1, got depth={depth} workers={workers}")
+        self.depth = depth
+        self.workers = workers
+        self.pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        self.stats: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stats[stage] = self.stats.get(stage, 0.0) + elapsed
+                self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def map(self, fn: Callable[[J], R], jobs: Iterable[J]) -> Iterator[R]:
+        """Yield ``fn(job)`` for each job, in order, keeping ``depth`` jobs ahead."""
+        pending: Deque[Future] = deque()
+        job_iter = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch") as pool:
+            try:
+                for job in job_iter:
+                    pending.append(pool.submit(fn, job))
+                    if len(pending) >= self.depth:
+                        break
+                while pending:
+                    with self.timed("wait"):
+                        result = pending.popleft().result()
+                    for job in job_iter:
+                        pending.append(pool.submit(fn, job))
+                        break
+                    yield result
+            finally:
+                for fut in pending:
+                    fut.cancel()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "workers": self.workers,
+            "pin_memory": self.pin_memory,
+            "seconds": dict(self.stats),
+            "mean_seconds": {k: self.stats[k] / self.counts[k] for k in self.stats if self.counts.get(k)},
+        }
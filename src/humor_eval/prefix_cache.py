@@ -0,0 +1,159 @@
+"""In-process image-prefix KV cache shared across modes and entries.
+
+Every prompt starts with the same tokens for a given image: the chat header,
+the image token and the fixed instruction sentence from ``_build_prompt`` that
+both answer modes share. For Mllama (Llama 3.2V) the KV state of that prefix
+also holds the projected vision-encoder output in its cross-attention layers, so
+reusing it skips both the vision encoder and the prefix prefill; ``generate``
+drops ``pixel_values`` once it starts from a non-empty cache.
+
+Entries are keyed by image content hash plus prefix token ids and evicted LRU
+once ``max_bytes`` is exceeded.
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import torch
+from PIL.Image import Image
+from transformers import DynamicCache
+
+from .hashing import image_hash
+from .models import current_instruction
+
+_SUPPORTED_MODEL_TYPES = {"mllama"}
+
+
+def supports_prefix_cache(model) -> bool:
+    return getattr(model.config, "model_type", None) in _SUPPORTED_MODEL_TYPES
+
+
+@dataclass
+class _Entry:
+    prefix_len: int
+    cache: DynamicCache
+    nbytes: int
+    prefill_seconds: float
+
+
+def _cache_nbytes(cache: DynamicCache) -> int:
+    total = 0
+    for layer in cache.layers:
+        for t in (layer.keys, layer.values):
+            if t is not None:
+                total += t.numel() * t.element_size()
+    return total
+
+
+def _prefix_length(input_ids: List[int], image_token_id: int, text_ids: List[int]) -> int:
+    """Length of the shared prefix: everything up to the image token plus the
+    instruction tokens that match exactly. At least one token is left for
+    ``generate`` to prefill."""
+    if image_token_id not in input_ids:
+        return 0
+    pos = input_ids.index(image_token_id) + 1
+    n = 0
+    while n < len(text_ids) and pos + n < len(input_ids) - 1 and input_ids[pos + n] == text_ids[n]:
+        n += 1
+    return pos + n
+
+
+def prefill(model, inputs, length: int) -> Tuple[DynamicCache, float]:
+    """KV cache of the first ``length`` prompt tokens (vision encoder
+    included) and the seconds it took."""
+    start = time.perf_counter()
+    with torch.no_grad():
+        out = model(
+            input_ids=inputs["input_ids"][:, :length],
+            attention_mask=inputs["attention_mask"][:, :length],
+            pixel_values=inputs["pixel_values"],
+            aspect_ratio_ids=inputs["aspect_ratio_ids"],
+            aspect_ratio_mask=inputs["aspect_ratio_mask"],
+            cross_attention_mask=inputs["cross_attention_mask"][:, :length],
+            past_key_values=DynamicCache(),
+            use_cache=True,
+        )
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return out.past_key_values, time.perf_counter() - start
+
+
+class PrefixCache:
+    def __init__(self, max_bytes: int = 2 * 1024**3):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._text_ids: Dict[Tuple[int, str], List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+        self.prefill_seconds = 0.0
+        self.prefill_seconds_saved = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _instruction_ids(self, processor) -> List[int]:
+        tokenizer = getattr(processor, "tokenizer", processor)
+        instruction = current_instruction()
+        key = (id(tokenizer), instruction)
+        if key not in self._text_ids:
+            self._text_ids[key] = tokenizer(instruction, add_special_tokens=False)["input_ids"]
+        return self._text_ids[key]
+
+    def generate_kwargs(self, processor, model, image: Image, inputs) -> Dict[str, Any]:
+        """Return extra ``generate`` kwargs (a private copy of the prefix KV),
+        building and storing the prefix on a miss. Returns ``{}`` when the
+        model or prompt does not allow prefix reuse."""
+        if not supports_prefix_cache(model) or inputs["input_ids"].shape[0] != 1:
+            self.skipped += 1
+            return {}
+        ids = inputs["input_ids"][0].tolist()
+        prefix_len = _prefix_length(ids, model.config.image_token_index, self._instruction_ids(processor))
+        if prefix_len == 0:
+            self.skipped += 1
+            return {}
+        key = image_hash(image) + ":" + hashlib.sha1(repr(ids[:prefix_len]).encode()).hexdigest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.prefill_seconds_saved += entry.prefill_seconds
+        else:
+            self.misses += 1
+            entry = self._build(model, inputs, prefix_len)
+            self._insert(key, entry)
+        return {"past_key_values": copy.deepcopy(entry.cache)}
+
+    def _build(self, model, inputs, prefix_len: int) -> _Entry:
+        cache, elapsed = prefill(model, inputs, prefix_len)
+        self.prefill_seconds += elapsed
+        return _Entry(prefix_len=prefix_len, cache=cache, nbytes=_cache_nbytes(cache), prefill_seconds=elapsed)
+
+    def _insert(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.evictions += 1
+
+    def summary(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "prefill_seconds": self.prefill_seconds,
+            "prefill_seconds_saved": self.prefill_seconds_saved,
+        }
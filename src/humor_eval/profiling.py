@@ -0,0 +1,242 @@
+"""Per-item performance instrumentation and Chrome trace export.
+
+A ``TokenTimer`` is passed to ``generate`` as its ``streamer``: ``generate``
+puts the prompt ids once it has its inputs ready and then one token per row per
+step (a block of accepted tokens per step under assisted decoding), so one
+object timestamps preprocessing (call start to prompt), prefill (prompt to
+first token) and decode (first token to each row's EOS) without touching the
+model code. Rows of a batch share preprocessing and prefill.
+
+``Profiler`` turns timers into ``PerfInfo`` records (stored under ``perf`` in
+each result) and trace events. ``Profiler.write_trace`` writes the Chrome /
+Perfetto JSON format (open in ``chrome://tracing`` or ui.perfetto.dev).
+``summarize_perf`` gives latency percentiles, tokens/sec and the slowest items
+for a set of records; the runners put it in each section summary.
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .dataset_types import PerfInfo
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (0.0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if platform.system() == "Darwin" else peak / 1024
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (peak where unsupported)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def _cuda():
+    """The ``torch.cuda`` module when a GPU is usable, else ``None``."""
+    try:
+        import torch
+    except ImportError:  # pragma: no cover
+        return None
+    return torch.cuda if torch.cuda.is_available() else None
+
+
+class TokenTimer:
+    """``generate`` streamer recording per-row token counts and finish times."""
+
+    def __init__(self, eos_token_ids: Iterable[int] = (), pad_token_id: Optional[int] = None):
+        self.eos_token_ids = set(eos_token_ids)
+        self.pad_token_id = pad_token_id
+        self.start = time.perf_counter()
+        self.prompt_time: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.preprocess_s: Optional[float] = None  # set when preprocessing ran elsewhere
+        self.prompt_tokens: List[int] = []
+        self.generated: List[int] = []
+        self.finished_at: List[Optional[float]] = []
+        self._last_step = 0.0
+
+    def put(self, value) -> None:
+        now = time.perf_counter()
+        if self.prompt_time is None:
+            self.prompt_time = now
+            rows = value.tolist() if value.dim() == 2 else [value.tolist()]
+            pad = self.pad_token_id
+            self.prompt_tokens = [sum(t != pad for t in row) for row in rows]
+            self.generated = [0] * len(rows)
+            self.finished_at = [None] * len(rows)
+            return
+        if self.first_token is None:
+            self.first_token = now
+        # One token per row, or (assisted decoding) a ``(rows, n)`` block of accepted tokens.
+        rows = value.tolist() if value.dim() == 2 else [[token] for token in value.tolist()]
+        for row, tokens in enumerate(rows):
+            for token in tokens:
+                if self.finished_at[row] is not None:
+                    break
+                if token == self.pad_token_id and token not in self.eos_token_ids:
+                    # Row was stopped by a stopping criterion at the previous step.
+                    self.finished_at[row] = self._last_step
+                    break
+                self.generated[row] += 1
+                if token in self.eos_token_ids:
+                    self.finished_at[row] = now
+        self._last_step = now
+
+    def end(self) -> None:
+        self.end_time = time.perf_counter()
+
+    @property
+    def tokens(self) -> int:
+        return sum(self.generated)
+
+    def row_perf(self, row: int) -> PerfInfo:
+        end = self.end_time or time.perf_counter()
+        prompt = self.prompt_time or end
+        first = self.first_token or end
+        finished = self.finished_at[row] if row < len(self.finished_at) and self.finished_at[row] else end
+        return PerfInfo(
+            prompt_tokens=int(self.prompt_tokens[row]) if row < len(self.prompt_tokens) else 0,
+            generated_tokens=self.generated[row] if row < len(self.generated) else 0,
+            batch_size=max(len(self.generated), 1),
+            preprocess_s=self.preprocess_s if self.preprocess_s is not None else prompt - self.start,
+            ttft_s=first - prompt,
+            decode_s=max(finished - first, 0.0),
+            peak_host_mb=0.0,
+            peak_device_mb=0.0,
+        )
+
+
+def token_timer(model) -> TokenTimer:
+    """A streamer that knows ``model``'s EOS and pad ids."""
+    config = model.generation_config
+    eos = config.eos_token_id
+    eos_ids = [] if eos is None else list(eos) if isinstance(eos, (list, tuple)) else [eos]
+    return TokenTimer(eos_ids, config.pad_token_id)
+
+
+class Profiler:
+    """Collects ``PerfInfo`` per item and trace events for one run."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self._tracks: Dict[str, int] = {}
+
+    def timer(self, model) -> TokenTimer:
+        """A fresh streamer for one ``generate`` call on ``model``."""
+        cuda = _cuda()
+        if cuda is not None:
+            cuda.reset_peak_memory_stats()
+        return token_timer(model)
+
+    def _us(self, t: float) -> float:
+        return (t - self.origin) * 1e6
+
+    def _track(self, name: str) -> int:
+        if name not in self._tracks:
+            tid = self._tracks[name] = len(self._tracks) + 1
+            self.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}})
+        return self._tracks[name]
+
+    def _slice(self, name: str, tid: int, start: float, end: float, args: Optional[Dict[str, Any]] = None) -> None:
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": tid, "ts": self._us(start), "dur": max(end - start, 0.0) * 1e6}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def finish(self, timer: TokenTimer, items: Sequence[Dict[str, Any]], answer_mode: str) -> List[PerfInfo]:
+        """``PerfInfo`` for each row of the call; ``items`` are the rows' entry
+        metadata (``task``, ``contest_number``)."""
+        if timer.end_time is None:
+            timer.end()
+        host = peak_rss_mb()
+        cuda = _cuda()
+        device = cuda.max_memory_allocated() / 1024**2 if cuda is not None else 0.0
+        perfs = []
+        for row in range(len(items)):
+            perf = timer.row_perf(row)
+            perf["peak_host_mb"] = host
+            perf["peak_device_mb"] = device
+            perfs.append(perf)
+
+        tid = self._track(answer_mode)
+        start = timer.prompt_time - perfs[0]["preprocess_s"] if timer.prompt_time else timer.start
+        prompt = timer.prompt_time or timer.end_time
+        first = timer.first_token or timer.end_time
+        labels = [f"{meta['task']} {meta['contest_number']}" for meta in items]
+        args = {"items": labels, "generated_tokens": [p["generated_tokens"] for p in perfs]}
+        self._slice(labels[0] if len(items) == 1 else f"batch of {len(items)}", tid, start, timer.end_time, args)
+        self._slice("preprocess", tid, start, prompt)
+        self._slice("prefill", tid, prompt, first)
+        self._slice("decode", tid, first, timer.end_time)
+        return perfs
+
+    def write_trace(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"}))
+        return path
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    pos = (len(ordered) - 1) * q
+    lo, hi = int(pos), min(int(pos) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def format_perf(summary: Dict[str, Any]) -> str:
+    """One-line rendering of a ``summarize_perf`` result."""
+    if not summary.get("items"):
+        return "no profiled items"
+    lat = summary["latency_s"]
+    return (
+        f"{summary['items']} items, latency p50 {lat['p50']:.3f}s p90 {lat['p90']:.3f}s max {lat['max']:.3f}s, "
+        f"TTFT p50 {summary['ttft_s']['p50']:.3f}s, {summary['tokens_per_s']:.1f} tok/s"
+    )
+
+
+def summarize_perf(records: Iterable[Dict[str, Any]], slowest: int = 5) -> Dict[str, Any]:
+    """Latency / TTFT percentiles, tokens/sec and the slowest items over records
+    that carry ``perf``."""
+    rows = [(rec, rec["perf"]) for rec in records if "perf" in rec]
+    if not rows:
+        return {"items": 0}
+    latency = [p["preprocess_s"] + p["ttft_s"] + p["decode_s"] for _, p in rows]
+    ttft = [p["ttft_s"] for _, p in rows]
+    generated = sum(p["generated_tokens"] for _, p in rows)
+    gen_time = sum(p["ttft_s"] + p["decode_s"] for _, p in rows)
+    top = sorted(range(len(rows)), key=lambda i: latency[i], reverse=True)[:slowest]
+    return {
+        "items": len(rows),
+        "latency_s": {f"p{q}": _percentile(latency, q / 100) for q in (50, 90, 99)} | {"max": max(latency)},
+        "ttft_s": {f"p{q}": _percentile(ttft, q / 100) for q in (50, 90, 99)},
+        "generated_tokens": generated,
+        "tokens_per_s": generated / gen_time if gen_time else 0.0,
+        "peak_host_mb": max(p["peak_host_mb"] for _, p in rows),
+        "peak_device_mb": max(p["peak_device_mb"] for _, p in rows),
+        "slowest": [
+            {
+                "contest_number": rows[i][0].get("contest_number"),
+                "latency_s": latency[i],
+                "generated_tokens": rows[i][1]["generated_tokens"],
+            }
+            for i in top
+        ],
+    }
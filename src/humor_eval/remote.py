@@ -0,0 +1,268 @@
+"""Backend for OpenAI-compatible inference servers (vLLM, TGI, ...).
+
+``RemoteBackend`` stands in for the in-process model: the runners pass it as
+``model`` (with ``processor=None``) and ``evaluate`` sends each entry to
+``POST {base_url}/chat/completions`` with the same image + prompt messages that
+``chat_infer`` renders locally (the image as a PNG data URL). Greedy decoding
+(``temperature=0``) matches the local default.
+
+Requests run on an asyncio loop in a background thread over a pool of
+keep-alive HTTP/1.1 connections (at most ``concurrency`` in flight). Connection
+errors, 429 and 5xx responses are retried with exponential backoff (honouring a
+numeric ``Retry-After``). ``map`` submits up to ``2 * concurrency`` items ahead
+and yields responses in input order. Only the standard library is used.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import json
+import ssl
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from PIL.Image import Image
+
+from .models import MODEL_ID, _build_prompt
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RemoteError(RuntimeError):
+    """The server answered with a non-retryable error, or retries ran out."""
+
+
+def image_data_url(image: Image) -> str:
+    buf = io.BytesIO()
+    image.convert("RGB").save(buf, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def chat_request(model: str, image: Image, text: str, max_new_tokens: int, answer_mode: str = "simple") -> Dict[str, Any]:
+    """Chat-completions body for one entry, mirroring ``_build_messages``."""
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image_url", "image_url": {"url": image_data_url(image)}},
+                    {"type": "text", "text": _build_prompt(text, answer_mode)},
+                ],
+            }
+        ],
+        "max_tokens": max_new_tokens,
+        "temperature": RemoteBackend.generation_config.temperature,
+    }
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self) -> None:
+        self.writer.close()
+
+    async def request(self, head: bytes, body: bytes) -> Tuple[int, Dict[str, str], bytes, bool]:
+        """Send one request; returns (status, headers, body, reusable)."""
+        self.writer.write(head + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("server closed the connection")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(chunks)
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            return status, headers, data, False
+        return status, headers, data, headers.get("connection", "").lower() != "close"
+
+
+class RemoteBackend:
+    """OpenAI-compatible chat-completions client with an in-order ``map``."""
+
+    # What evaluate reads from a model: decoding settings (greedy; every request
+    # sends this temperature) and, per instance, a device label.
+    generation_config = SimpleNamespace(do_sample=False, temperature=0.0)
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = MODEL_ID,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        timeout: float = 600.0,
+        api_key: Optional[str] = None,
+    ):
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be >= 1, got {concurrency}")
+        url = urlsplit(base_url.rstrip("/"))
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"base_url must be http(s)://..., got {base_url!r}")
+        self.host = url.hostname or "localhost"
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.path = f"{url.path}/chat/completions"
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.api_key = api_key
+        self.device = "remote"
+        self.stats = {"requests": 0, "retries": 0, "connections": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._idle: List[_Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # -- event loop -------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name="remote-backend", daemon=True)
+            self._thread.start()
+            self._loop = loop
+            self._slots = asyncio.run_coroutine_threadsafe(self._make_slots(), loop).result()
+        return self._loop
+
+    async def _make_slots(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.concurrency)
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        for conn in self._idle:
+            self._loop.call_soon_threadsafe(conn.close)
+        self._idle.clear()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = None
+
+    def __enter__(self) -> "RemoteBackend":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -- requests ---------------------------------------------------------
+
+    async def _connect(self) -> _Connection:
+        if self._idle:
+            return self._idle.pop()
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.stats["connections"] += 1
+        return _Connection(reader, writer)
+
+    def _head(self, body: bytes) -> bytes:
+        lines = [
+            f"POST {self.path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: keep-alive",
+        ]
+        if self.api_key:
+            lines.append(f"Authorization: Bearer {self.api_key}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _post(self, payload: Dict[str, Any]) -> str:
+        body = json.dumps(payload).encode("utf-8")
+        head = self._head(body)
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.stats["retries"] += 1
+                conn = await self._connect()
+                try:
+                    status, headers, data, reusable = await asyncio.wait_for(conn.request(head, body), self.timeout)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                    conn.close()
+                    error: Exception = e
+                    delay = self.backoff * 2**attempt
+                else:
+                    self.stats["requests"] += 1
+                    if reusable:
+                        self._idle.append(conn)
+                    else:
+                        conn.close()
+                    if status == 200:
+                        return json.loads(data)["choices"][0]["message"]["content"]
+                    error = RemoteError(f"server returned {status}: {data[:200]!r}")
+                    if status not in RETRY_STATUSES:
+                        raise error
+                    retry_after = headers.get("retry-after", "")
+                    delay = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else self.backoff * 2**attempt
+                if attempt < self.max_retries:
+                    await asyncio.sleep(delay)
+            raise RemoteError(f"giving up after {self.max_retries} retries: {error}") from error
+
+    def submit(self, image: Image, text: str, max_new_tokens: int, answer_mode: str = "simple") -> "Future[str]":
+        """Schedule one entry; the image is encoded in the calling thread."""
+        payload = chat_request(self.model, image, text, max_new_tokens, answer_mode)
+        return asyncio.run_coroutine_threadsafe(self._post(payload), self._ensure_loop())
+
+    def map(self, items: Iterable[Tuple[Image, str]], max_new_tokens: int, answer_mode: str = "simple") -> Iterator[str]:
+        """Responses for ``(image, text)`` items, in input order."""
+        window: List[Future] = []
+        try:
+            for image, text in items:
+                window.append(self.submit(image, text, max_new_tokens, answer_mode))
+                if len(window) >= 2 * self.concurrency:
+                    yield window.pop(0).result().strip()
+            while window:
+                yield window.pop(0).result().strip()
+        finally:
+            for fut in window:
+                fut.cancel()
+
+    def chat_infer(self, image: Image, text: str, max_new_tokens: int = 64, answer_mode: str = "simple") -> str:
+        """Blocking single request, like ``models.chat_infer``."""
+        return self.submit(image, text, max_new_tokens, answer_mode).result().strip()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .data import load_entries
+
+    ap = argparse.ArgumentParser(description="Send one dataset entry to an OpenAI-compatible server")
+    ap.add_argument("--server_url", required=True, help="e.g. http://localhost:8000/v1")
+    ap.add_argument("--server_model", default=MODEL_ID)
+    ap.add_argument("--split", default="test")
+    ap.add_argument("--index", type=int, default=0)
+    ap.add_argument("--answer_mode", choices=["simple", "reasoned"], default="simple")
+    ap.add_argument("--max_new_tokens", type=int, default=512)
+    args = ap.parse_args()
+    entry = load_entries(args.split)[args.index]
+    with RemoteBackend(args.server_url, args.server_model) as backend:
+        start = time.perf_counter()
+        print(backend.chat_infer(entry["images"], entry["problem"], args.max_new_tokens, args.answer_mode))
+        print(f"({time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,204 @@
+"""Re-extract answers in existing results files without regenerating.
+
+Every record's saved ``model_answer`` is re-parsed with
+``parsing.scan_response`` (one tag scan instead of the eight regex passes of
+``parse_model_response`` + ``extract_answer``) across a process pool, and
+``reasoning``, ``extracted_answer``, ``is_correct`` and the section summaries
+are updated. Scored records (``choice_probs``) have no text to parse and are
+left alone. Files are handled one after another; within a file the texts are
+fed to the pool in chunks and results come back in order.
+
+    python -m humor_eval.rescore apply results_simple_2048/*.json --diff changed.jsonl
+    python -m humor_eval.rescore apply results.json --in_place --workers 8
+    python -m humor_eval.rescore bench results.json
+
+Without ``--in_place`` or ``--out_dir`` nothing is rewritten (dry run).
+"""
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .columnar import iter_sections
+from .journal import write_json
+from .parsing import extract_answer, parse_model_response, scan_response
+
+RESCORED_FIELDS = ("reasoning", "extracted_answer", "is_correct")
+
+
+def _scan_chunk(texts: List[str]) -> List[Tuple[str, str]]:
+    out = []
+    for text in texts:
+        reasoning, _, extracted = scan_response(text)
+        out.append((reasoning, extracted))
+    return out
+
+
+def _chunks(items: List[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def rescore_data(data: Dict[str, Any], pool=None, chunksize: int = 64) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Update ``data`` in place; returns (changes, counts).
+
+    Each change is ``{"task", "index", "contest_number", "before", "after"}``
+    holding only the fields that differ; ``index`` is the position within the
+    record's section.
+    """
+    sections = [(summary, results) for summary, results in iter_sections(data)]
+    todo = [(s, i) for s, (_, results) in enumerate(sections) for i, rec in enumerate(results) if "choice_probs" not in rec]
+    texts = [sections[s][1][i]["model_answer"] for s, i in todo]
+    chunks = _chunks(texts, chunksize)
+    parsed = pool.imap(_scan_chunk, chunks) if pool is not None else map(_scan_chunk, chunks)
+
+    changes: List[Dict[str, Any]] = []
+    flat = (row for chunk in parsed for row in chunk)
+    for (s, i), (reasoning, extracted) in zip(todo, flat):
+        rec = sections[s][1][i]
+        new = {"reasoning": reasoning, "extracted_answer": extracted, "is_correct": extracted == rec["correct_answer"]}
+        diff = [f for f in RESCORED_FIELDS if rec.get(f) != new[f]]
+        if diff:
+            changes.append({
+                "task": rec.get("task"),
+                "index": i,
+                "contest_number": rec.get("contest_number"),
+                "before": {f: rec.get(f) for f in diff},
+                "after": {f: new[f] for f in diff},
+            })
+            rec.update(new)
+
+    for summary, results in sections:
+        if "correct_answers" in summary:
+            correct = sum(bool(r["is_correct"]) for r in results)
+            summary["correct_answers"] = correct
+            summary["accuracy"] = correct / len(results) if results else 0.0
+    counts = {"records": len(todo), "skipped": sum(len(r) for _, r in sections) - len(todo), "changed": len(changes)}
+    counts["bytes"] = sum(len(t.encode("utf-8")) for t in texts)
+    return changes, counts
+
+
+def rescore_files(
+    paths: Sequence[str | Path],
+    workers: int = 1,
+    out_dir: Optional[str | Path] = None,
+    in_place: bool = False,
+    diff: Optional[IO[str]] = None,
+    chunksize: int = 64,
+) -> Dict[str, Any]:
+    """Rescore each file; write it to ``out_dir`` / in place and the changed
+    records to ``diff`` (JSONL, one line per record) if given."""
+    if in_place and out_dir is not None:
+        raise ValueError("use either in_place or out_dir, not both")
+    totals = {"files": 0, "records": 0, "skipped": 0, "changed": 0, "bytes": 0}
+    start = time.perf_counter()
+    pool = mp.Pool(workers) if workers > 1 else None
+    try:
+        for path in paths:
+            path = Path(path)
+            data = json.loads(path.read_text(encoding="utf-8"))
+            changes, counts = rescore_data(data, pool, chunksize)
+            if diff is not None:
+                for change in changes:
+                    diff.write(json.dumps({"file": str(path), **change}) + "\n")
+            if in_place:
+                write_json(path, data)
+            elif out_dir is not None:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+                write_json(Path(out_dir) / path.name, data)
+            totals["files"] += 1
+            for key, value in counts.items():
+                totals[key] += value
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+    totals["seconds"] = elapsed
+    totals["records_per_s"] = totals["records"] / elapsed if elapsed else 0.0
+    totals["mb_per_s"] = totals["bytes"] / 1e6 / elapsed if elapsed else 0.0
+    return totals
+
+
+def bench(path: str | Path, repeat: int = 5) -> Dict[str, Any]:
+    """Time the old two-parser path against ``scan_response`` on one file's
+    ``model_answer`` texts (best of ``repeat``) after checking they agree."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    texts = [r["model_answer"] for _, results in iter_sections(data) for r in results if "choice_probs" not in r]
+
+    def old(text):
+        reasoning, segment = parse_model_response(text)
+        return reasoning, segment, extract_answer(text)
+
+    mismatches = sum(old(t) != scan_response(t) for t in texts)
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for t in texts:
+                fn(t)
+            times.append(time.perf_counter() - t0)
+        return min(times)
+
+    old_s, new_s = best(old), best(scan_response)
+    return {
+        "records": len(texts),
+        "mean_chars": sum(map(len, texts)) / len(texts) if texts else 0.0,
+        "mismatches": mismatches,
+        "old_s": old_s,
+        "new_s": new_s,
+        "speedup": old_s / new_s if new_s else float("inf"),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+    import sys
+
+    ap = argparse.ArgumentParser(description="Re-extract answers in existing results files")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ap_apply = sub.add_parser("apply", help="Rescore results files")
+    ap_apply.add_argument("results", nargs="+", help="Results JSON files (flat or nested layout)")
+    ap_apply.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap_apply.add_argument("--chunksize", type=int, default=64, help="Texts per pool task")
+    ap_apply.add_argument("--out_dir", default=None, help="Write rescored copies here")
+    ap_apply.add_argument("--in_place", action="store_true", help="Overwrite the input files")
+    ap_apply.add_argument("--diff", default=None, help="Write changed records as JSONL ('-' for stdout)")
+    ap_bench = sub.add_parser("bench", help="Old vs single-scan parser on one results file")
+    ap_bench.add_argument("results")
+    ap_bench.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        r = bench(args.results, args.repeat)
+        print(
+            f"{r['records']} responses (mean {r['mean_chars']:.0f} chars), mismatches={r['mismatches']}\n"
+            f"old: {r['old_s'] * 1e3:.1f} ms  scan: {r['new_s'] * 1e3:.1f} ms  speedup: {r['speedup']:.1f}x"
+        )
+        return
+
+    diff = None
+    if args.diff == "-":
+        diff = sys.stdout
+    elif args.diff:
+        diff = open(args.diff, "w", encoding="utf-8")
+    try:
+        totals = rescore_files(args.results, args.workers, args.out_dir, args.in_place, diff, args.chunksize)
+    finally:
+        if diff is not None and diff is not sys.stdout:
+            diff.close()
+    print(
+        f"{totals['files']} files, {totals['records']} records ({totals['skipped']} scored skipped), "
+        f"{totals['changed']} changed in {totals['seconds']:.2f}s "
+        f"({totals['records_per_s']:.0f} records/s, {totals['mb_per_s']:.1f} MB/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Image resolution / tile budgets.
+
+The Llama 3.2V image processor resizes each cartoon onto a canvas of up to
+``max_image_tiles`` (4) tiles of 560x560, and the vision encoder and every
+cross-attention layer pay per tile. ``ImageBudget`` shrinks the image before
+it reaches the processor, always keeping its aspect ratio:
+
+- ``max_side`` caps the longer side in pixels;
+- ``max_tiles`` resizes the image to fit exactly the canvas the processor
+  would pick if it were limited to that many tiles. The processor prefers the
+  canvas needing the least upscaling, so it then picks that canvas (or a
+  smaller one) with its usual settings. ``max_image_tiles`` itself is not
+  changed, because that would renumber the aspect-ratio ids the model was
+  trained with.
+
+Resizing happens on the entries (``budgeted``), so batching, prefetch and the
+remote backend see the smaller image. The prefix, pixel and response caches key
+on the resized image. The budget is part of the journal key::
+
+    python -m humor_eval.run_simple --split test --max_image_tiles 2
+    python -m humor_eval.sweep --splits test --image_budgets full tiles2 tiles1 side560 --accuracy_tolerance 0.01
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from PIL import Image as PILImage
+from PIL.Image import Image
+
+from .data import entry_meta, select
+from .dataset_types import DatasetEntry
+
+# Llama 3.2 Vision processor defaults; used when no processor is at hand (remote backend).
+DEFAULT_TILE_SIZE = 560
+DEFAULT_MAX_TILES = 4
+
+_SPEC = re.compile(r"^(?:side(?P<side>\d+))?_?(?:tiles(?P<tiles>\d+))?$")
+
+
+def _tiling(image_processor) -> Tuple[int, int]:
+    """(tile size, max tiles) of an Mllama-style processor, else the defaults."""
+    size = getattr(image_processor, "size", None) or {}
+    tiles = getattr(image_processor, "max_image_tiles", None)
+    return int(size.get("height", DEFAULT_TILE_SIZE)), int(tiles or DEFAULT_MAX_TILES)
+
+
+def canvas(width: int, height: int, max_tiles: int, tile_size: int) -> Tuple[int, int]:
+    """(width, height) of the tile canvas the Mllama processor picks for an image."""
+    from transformers.models.mllama.image_processing_mllama import get_optimal_tiled_canvas
+
+    canvas_h, canvas_w = get_optimal_tiled_canvas(height, width, max_tiles, tile_size)
+    return int(canvas_w), int(canvas_h)
+
+
+class ImageBudget:
+    """Cap on image side length and/or tile count; see the module docstring."""
+
+    def __init__(self, max_side: Optional[int] = None, max_tiles: Optional[int] = None):
+        if max_side is not None and max_side < 1:
+            raise ValueError(f"max_side must be >= 1, got {max_side}")
+        if max_tiles is not None and max_tiles < 1:
+            raise ValueError(f"max_tiles must be >= 1, got {max_tiles}")
+        self.max_side = max_side
+        self.max_tiles = max_tiles
+
+    @classmethod
+    def parse(cls, spec: str) -> "ImageBudget":
+        """``full``, ``side768``, ``tiles2`` or ``side1120_tiles2``."""
+        match = _SPEC.match(spec) if spec != "full" else None
+        if spec != "full" and (match is None or not any(match.groups())):
+            raise ValueError(f"image budget must be full, side<N>, tiles<N> or side<N>_tiles<N>, got {spec!r}")
+        if match is None:
+            return cls()
+        side, tiles = match.group("side"), match.group("tiles")
+        return cls(int(side) if side else None, int(tiles) if tiles else None)
+
+    @property
+    def name(self) -> str:
+        parts = ([f"side{self.max_side}"] if self.max_side else []) + ([f"tiles{self.max_tiles}"] if self.max_tiles else [])
+        return "_".join(parts) or "full"
+
+    def __bool__(self) -> bool:
+        return self.max_side is not None or self.max_tiles is not None
+
+    def params(self) -> Dict[str, Any]:
+        """Settings that change the model input; part of the journal key."""
+        return {k: v for k, v in (("max_side", self.max_side), ("max_tiles", self.max_tiles)) if v is not None}
+
+    def size(self, width: int, height: int, image_processor=None) -> Tuple[int, int]:
+        """Size an image of ``width`` x ``height`` is resized to."""
+        if self.max_side is not None and max(width, height) > self.max_side:
+            scale = self.max_side / max(width, height)
+            width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        tile_size, processor_tiles = _tiling(image_processor)
+        if self.max_tiles is None or self.max_tiles >= processor_tiles:
+            return width, height
+        cw, ch = canvas(width, height, processor_tiles, tile_size)
+        if cw * ch <= self.max_tiles * tile_size**2:
+            return width, height
+        cw, ch = canvas(width, height, self.max_tiles, tile_size)
+        # Fill the limiting side exactly, so this canvas needs no upscaling.
+        if cw / width <= ch / height:
+            return cw, min(ch, max(1, round(height * cw / width)))
+        return min(cw, max(1, round(width * ch / height))), ch
+
+    def apply(self, image: Image, image_processor=None) -> Image:
+        """``image`` resized to the budget (the same object if it fits)."""
+        target = self.size(*image.size, image_processor=image_processor)
+        if target == image.size:
+            return image
+        return image.resize(target, PILImage.Resampling.BICUBIC)
+
+    def tiles(self, image: Image, image_processor=None) -> int:
+        """Tiles the processor cuts ``image`` into under this budget."""
+        return self.tile_count(*image.size, image_processor=image_processor)
+
+    def tile_count(self, width: int, height: int, image_processor=None) -> int:
+        """Tiles of an image of ``width`` x ``height`` under this budget; needs
+        only the size, so callers can read it once for several budgets."""
+        if image_processor is not None and getattr(image_processor, "max_image_tiles", None) is None:
+            return 1
+        tile_size, processor_tiles = _tiling(image_processor)
+        cw, ch = canvas(*self.size(width, height, image_processor=image_processor), processor_tiles, tile_size)
+        return (cw // tile_size) * (ch // tile_size)
+
+
+def tile_tokens(model) -> int:
+    """Vision-encoder tokens per tile (patches plus the class token), 0 if unknown."""
+    vision = getattr(getattr(model, "config", None), "vision_config", None)
+    if vision is None or not getattr(vision, "patch_size", None):
+        return 0
+    return (vision.image_size // vision.patch_size) ** 2 + 1
+
+
+class BudgetedEntries(Sequence[DatasetEntry]):
+    """View of ``entries`` whose images are resized to ``budget`` on access.
+    ``meta`` and ``subset`` pass through without decoding anything."""
+
+    def __init__(self, entries: Sequence[DatasetEntry], budget: ImageBudget, image_processor=None):
+        self._entries = entries
+        self.budget = budget
+        self.image_processor = image_processor
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, i: int) -> DatasetEntry:
+        entry = self._entries[i]
+        return DatasetEntry(**{**entry, "images": self.budget.apply(entry["images"], self.image_processor)})
+
+    def __iter__(self) -> Iterator[DatasetEntry]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        return entry_meta(self._entries, i)
+
+    def subset(self, indices: Sequence[int]) -> "BudgetedEntries":
+        return BudgetedEntries(select(self._entries, indices), self.budget, self.image_processor)
+
+
+def budgeted(entries: Sequence[DatasetEntry], budget: Optional[ImageBudget], processor=None) -> Sequence[DatasetEntry]:
+    """``entries`` with images resized to ``budget`` (unchanged without one)."""
+    if not budget:
+        return entries
+    return BudgetedEntries(entries, budget, getattr(processor, "image_processor", None))
@@ -0,0 +1,215 @@
+"""Content-addressed on-disk cache of ``chat_infer`` responses.
+
+Keys hash everything that determines a completion: ``MODEL_ID``, the rendered
+prompt from ``_build_prompt``, the image content hash, ``max_new_tokens``,
+``answer_mode`` and the decoding settings of the generation config. Values live
+in one SQLite file in WAL mode, so several processes (e.g. a SLURM array) can
+read and write it at once. A byte cap is enforced by evicting least recently
+used rows.
+
+Command line::
+
+    python -m humor_eval.response_cache stats  CACHE.sqlite
+    python -m humor_eval.response_cache prune  CACHE.sqlite --max_mb 512
+    python -m humor_eval.response_cache warm   CACHE.sqlite results.json [...] --split test
+"""
+from __future__ import annotations
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .hashing import dict_hash
+
+DEFAULT_MAX_BYTES = 1024**3
+_PRUNE_EVERY = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    nbytes INTEGER NOT NULL,
+    model_id TEXT NOT NULL,
+    answer_mode TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+"""
+
+
+def response_key(
+    model_id: str,
+    prompt: str,
+    image_digest: str,
+    max_new_tokens: int,
+    answer_mode: str,
+    decoding: Dict[str, Any],
+) -> str:
+    return dict_hash(
+        {
+            "model_id": model_id,
+            "prompt": prompt,
+            "image": image_digest,
+            "max_new_tokens": max_new_tokens,
+            "answer_mode": answer_mode,
+            "decoding": decoding,
+        }
+    )
+
+
+class ResponseCache:
+    def __init__(self, path: str | Path, max_bytes: int = DEFAULT_MAX_BYTES, timeout: float = 60.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.hits = 0
+        self._missed: set = set()
+        self._puts = 0
+
+    @property
+    def misses(self) -> int:
+        """Distinct keys looked up without a hit (re-checks are not double counted)."""
+        return len(self._missed)
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._missed.add(key)
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, response: str, model_id: str, answer_mode: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, nbytes, model_id, answer_mode, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, response, len(response.encode()), model_id, answer_mode, now, now),
+        )
+        self._puts += 1
+        if self._puts % _PRUNE_EVERY == 0:
+            self.prune()
+
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM responses").fetchone()[0]
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Evict least recently used rows until under ``max_bytes``; returns rows removed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        excess = self.total_bytes() - limit
+        if excess <= 0:
+            return 0
+        removed = 0
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, nbytes in self._conn.execute("SELECT key, nbytes FROM responses ORDER BY accessed").fetchall():
+                if excess <= 0:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                excess -= nbytes
+                removed += 1
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries, nbytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM responses").fetchone()
+        by_mode = {
+            f"{model_id}:{mode}": count
+            for model_id, mode, count in self._conn.execute(
+                "SELECT model_id, answer_mode, COUNT(*) FROM responses GROUP BY model_id, answer_mode"
+            )
+        }
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "bytes": nbytes,
+            "max_bytes": self.max_bytes,
+            "by_model_mode": by_mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _warm(cache: ResponseCache, result_files, split: str, max_new_tokens: Optional[int], answer_mode: Optional[str]) -> int:
+    """Insert ``model_answer`` strings from existing results files, matched to
+    dataset entries by (task, contest_number, problem)."""
+    import json
+
+    from .data import load_entries
+    from .hashing import image_hash
+    from .models import MODEL_ID, _build_prompt, decoding_settings, load_generation_config
+
+    entries = {(e["task"], str(e["contest_number"]), e["problem"]): e for e in load_entries(split)}
+    decoding = decoding_settings(load_generation_config())
+    inserted = 0
+    for path in result_files:
+        data = json.loads(Path(path).read_text())
+        meta = data.get("meta", {})
+        tokens = max_new_tokens if max_new_tokens is not None else meta.get("max_new_tokens")
+        if tokens is None:
+            print(f"{path}: no meta.max_new_tokens; pass --max_new_tokens")
+            continue
+        sections = [data] if "results" in data else [data[t] for t in ("ranking", "matching") if t in data]
+        for section in sections:
+            mode = answer_mode or section.get("summary", {}).get("answer_mode")
+            if mode is None:
+                print(f"{path}: no summary.answer_mode; pass --answer_mode")
+                break
+            for rec in section["results"]:
+                entry = entries.get((rec["task"], str(rec["contest_number"]), rec["problem"]))
+                if entry is None:
+                    continue
+                key = response_key(MODEL_ID, _build_prompt(entry["problem"], mode), image_hash(entry["images"]), tokens, mode, decoding)
+                response = json.dumps(rec["choice_probs"]) if mode == "scored" else rec["model_answer"]
+                cache.put(key, response, MODEL_ID, mode)
+                inserted += 1
+    return inserted
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description="Inspect, prune or warm the chat_infer response cache")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p_stats = sub.add_parser("stats", help="Print entry counts and size")
+    p_stats.add_argument("cache")
+    p_prune = sub.add_parser("prune", help="Evict least recently used entries down to a size")
+    p_prune.add_argument("cache")
+    p_prune.add_argument("--max_mb", type=float, required=True)
+    p_warm = sub.add_parser("warm", help="Seed the cache from existing results JSON files")
+    p_warm.add_argument("cache")
+    p_warm.add_argument("results", nargs="+")
+    p_warm.add_argument("--split", default="test")
+    p_warm.add_argument("--max_new_tokens", type=int, default=None, help="Override meta.max_new_tokens")
+    p_warm.add_argument("--answer_mode", default=None, help="Override summary.answer_mode (needed for flat results files)")
+    args = ap.parse_args()
+
+    with ResponseCache(args.cache, max_bytes=2**62) as cache:
+        if args.command == "prune":
+            removed = cache.prune(int(args.max_mb * 1024**2))
+            print(f"Removed {removed} entries")
+        elif args.command == "warm":
+            print(f"Inserted {_warm(cache, args.results, args.split, args.max_new_tokens, args.answer_mode)} responses")
+        print(json.dumps(cache.stats(), indent=2))
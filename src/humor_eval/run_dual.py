@@ -1,45 +1,37 @@
 """Utility to run evaluation in both simple and reasoned modes sequentially.
 
-It will invoke the CLI twice (in-process) to avoid reloading the dataset twice,
-while reusing the same loaded model for efficiency.
+Both modes run in one process over one ``evaluate.EvalSession``, so the
+dataset, the model and the caches are loaded once.
+
+torch and transformers are imported inside the functions that evaluate, so
+``--help`` and ``merge_dual`` do not load them (see ``imports``).
 """
 from __future__ import annotations
-import json
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Collection
 
+from .adaptive import SequentialMonitor, journaled_results, load_baselines
 from .data import load_entries
-from tqdm import tqdm
-from .models import load_model, chat_infer, parse_model_response, extract_answer, summarize_device_allocation, MODEL_ID
-from .dataset_types import DatasetEntryResult
-
-
-def run_mode(entries, processor, model, answer_mode: str, max_new_tokens: int, show_progress: bool, split: str) -> dict:
-    ranking: List[DatasetEntryResult] = []
-    matching: List[DatasetEntryResult] = []
-    iterator = entries if not show_progress else tqdm(entries, desc=answer_mode)
-    for entry in iterator:
-        resp = chat_infer(processor, model, entry["images"], entry["problem"], max_new_tokens=max_new_tokens, answer_mode=answer_mode)
-        reasoning, _ = parse_model_response(resp)
-        extracted_answer = extract_answer(resp)
-        is_correct = extracted_answer == entry["answer"]
-        rec = DatasetEntryResult(
-            contest_number=entry["contest_number"],
-            problem=entry["problem"],
-            correct_answer=entry["answer"],
-            model_answer=resp,
-            reasoning=reasoning,
-            extracted_answer=extracted_answer,
-            task=entry["task"],
-            is_correct=is_correct,
-        )
-        (ranking if entry["task"] == "ranking" else matching).append(rec)
+from .journal import ItemKey, JournalFold, ResultJournal, completed_keys, default_journal_path, single_run, write_json
+from .models import load_draft_model, load_generation_config, load_model, set_threads
+from .options import EvalOptions, add_eval_args
+from .profiling import summarize_perf
+from .shard import launch_workers, parse_shard, shard_indices, shard_path, shard_paths, worker_devices
+
+if TYPE_CHECKING:
+    from .evaluate import EvalSession
+
+MODES = ("simple", "reasoned")
 
-    def summarize(lst: List[DatasetEntryResult], task_name: str):
-        total = len(lst)
-        correct = sum(1 for r in lst if r["is_correct"])
-        return {
+
+def mode_sections(fold: JournalFold, answer_mode: str, split: str, profile: bool = False) -> dict:
+    """Ranking/matching sections for one mode; ``results`` are lazy."""
+
+    def summarize(task_name: str):
+        total, correct = fold.counts(task_name)
+        summary = {
             "total_entries": total,
             "correct_answers": correct,
             "accuracy": (correct / total) if total else 0.0,
@@ -47,30 +39,142 @@ def run_mode(entries, processor, model, answer_mode: str, max_new_tokens: int, s
             "task": task_name,
             "split": split,
         }
+        if profile:
+            summary["perf"] = summarize_perf(fold.results(task_name))
+        return summary
 
     return {
-        "ranking": {"summary": summarize(ranking, "ranking"), "results": ranking},
-        "matching": {"summary": summarize(matching, "matching"), "results": matching},
+        "ranking": {"summary": summarize("ranking"), "results": fold.results("ranking")},
+        "matching": {"summary": summarize("matching"), "results": fold.results("matching")},
     }
 
 
-def run_dual(split: str = "test", max_new_tokens: int = 4096, output_dir: str = ".", show_progress: bool = True) -> tuple[str, str]:
+def run_mode(
+    session: EvalSession,
+    entries,
+    answer_mode: str,
+    journal: ResultJournal,
+    done: Collection[ItemKey] = (),
+    indices: list[int] | None = None,
+    monitor: SequentialMonitor | None = None,
+    journaled: dict | None = None,
+) -> tuple[JournalFold, dict]:
+    """Evaluate one mode into ``journal`` and return its fold and ranking/matching
+    sections; ``results`` are lazy iterators folded from the journal. With a
+    ``monitor`` the mode is evaluated adaptively (``journaled`` are its
+    already-journaled results) and only the items it saw are folded."""
+    session.evaluate(entries, answer_mode, journal, done, indices, monitor, journaled)
+    o = session.options
+    fold = JournalFold(journal.path, o.split, answer_mode, o.params(answer_mode))
+    if monitor is not None:
+        fold.restrict(monitor.order[:monitor.n])
+    return fold, mode_sections(fold, answer_mode, o.split, profile=session.profiler is not None)
+
+
+def merge_dual(
+    split: str,
+    max_new_tokens: int | None,
+    output_dir: str,
+    num_shards: int,
+    journal: str | None = None,
+    profile: bool = False,
+    params: dict | None = None,
+) -> tuple[str, str]:
+    """Fold the journals of ``num_shards`` shards into the two results JSONs.
+    ``params`` are the run's generation params (default: greedy with
+    ``max_new_tokens``). With neither, they are read from the journals, which
+    must then hold exactly one run per mode."""
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    base = default_journal_path(output_dir, f"results_dual_{split}", journal)
+    paths = shard_paths(base, num_shards)
+    missing = [str(p) for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"missing shard journals: {missing}")
+    if params is None and max_new_tokens is None:
+        runs = {mode: single_run(paths, split, mode) for mode in MODES}
+        stored = runs["simple"][1]
+        max_new_tokens = stored.get("max_new_tokens") if stored else None
+    else:
+        if params is None:
+            from .evaluate import generation_params
+
+            params = generation_params(max_new_tokens)
+        runs = {mode: (params, None) for mode in MODES}
+    meta = {"split": split, "max_new_tokens": max_new_tokens, "shards": num_shards}
+    outs = []
+    for mode in MODES:
+        out = Path(output_dir) / f"results_{mode}_{ts}.json"
+        fold = JournalFold(paths, split, mode, runs[mode][0])
+        write_json(out, {"meta": meta, **mode_sections(fold, mode, split, profile)})
+        outs.append(str(out))
+    print(f"Merged {num_shards} shards into {outs[0]} and {outs[1]}")
+    return outs[0], outs[1]
+
+
+def run_dual(options: EvalOptions | None = None, **overrides) -> tuple[str, str]:
+    """Evaluate the simple and reasoned modes with one loaded model;
+    ``overrides`` are ``EvalOptions`` fields applied on top of ``options``."""
+    o = replace(options or EvalOptions(max_new_tokens=4096), **overrides)
+    o.validate()
+    from .evaluate import EvalSession
+
+    params = o.params("reasoned")
+    if o.num_workers > 1:
+        devices = worker_devices(o.num_workers)
+        launch_workers("humor_eval.run_dual", "run_dual", [
+            dict(options=o.worker(f"{k}/{o.num_workers}", devices[k])) for k in range(o.num_workers)
+        ])
+        return merge_dual(
+            o.split, o.max_new_tokens, o.output_dir, o.num_workers, journal=o.journal,
+            profile=o.profile or o.trace is not None, params=params,
+        )
+
+    split = o.split
+    set_threads(o.threads, o.interop_threads)
     entries = load_entries(split)
-    processor, model = load_model()
-    try:
-        print("Model device allocation:", summarize_device_allocation(model))
-    except Exception as e:
-        print(f"(Could not summarize devices: {e})")
+    part = parse_shard(o.shard)
+    indices = shard_indices(len(entries), part) if part else None
+    tag = f"shard{part[0]}of{part[1]}_" if part else ""
     ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    out_simple = Path(output_dir) / f"results_simple_{ts}.json"
-    out_reasoned = Path(output_dir) / f"results_reasoned_{ts}.json"
+    out_simple = Path(o.output_dir) / f"results_simple_{tag}{ts}.json"
+    out_reasoned = Path(o.output_dir) / f"results_reasoned_{tag}{ts}.json"
+    journal_path = shard_path(default_journal_path(o.output_dir, f"results_dual_{split}", o.journal), part)
+    done = completed_keys(journal_path) if o.resume else set()
+    monitors: dict = {}
+    journaled: dict = {}
+    if o.adaptive:
+        # One monitor per mode; the same seed gives both modes the same order.
+        baselines = load_baselines(o.baseline or [], split)
+        unknown = sorted(set(baselines) - set(MODES))
+        if unknown:
+            raise ValueError(f"baselines must be simple or reasoned runs, got {unknown}")
+        settings = o.adaptive_settings()
+        for mode in MODES:
+            monitors[mode] = SequentialMonitor(entries, split, mode, settings, baselines.get(mode))
+            journaled[mode] = journaled_results(journal_path, split, mode, params, done)
 
-    simple_data = run_mode(entries, processor, model, "simple", max_new_tokens, show_progress, split)
-    reasoned_data = run_mode(entries, processor, model, "reasoned", max_new_tokens, show_progress, split)
+    # One session for both modes: they share the model, the caches and the image + instruction prefix.
+    session = EvalSession(o, "dual", part, load_generation_config)
+    with ResultJournal(journal_path) as jr:
+        # Journal cache hits for both modes first; load the model only if anything is left.
+        done = session.journal_cached(entries, MODES, jr, done, indices)
+        if monitors:
+            # Journaled items along the planned order may already settle a mode.
+            pending = [monitors[mode].replay(journaled[mode]) for mode in MODES]
+        else:
+            pending = [session.pending(entries, mode, done, indices) for mode in MODES]
+        if any(pending):
+            session.load(load_model, load_draft_model)
+        folds, sections = {}, {}
+        for mode in MODES:
+            folds[mode], sections[mode] = run_mode(
+                session, entries, mode, jr, done, indices, monitor=monitors.get(mode), journaled=journaled.get(mode),
+            )
 
-    meta = {"split": split, "max_new_tokens": max_new_tokens}
-    out_simple.write_text(json.dumps({"meta": meta, **simple_data}, indent=2))
-    out_reasoned.write_text(json.dumps({"meta": meta, **reasoned_data}, indent=2))
+    meta = {"split": split, "max_new_tokens": o.max_new_tokens}
+    session.report(meta, folds, sections, monitors)
+    write_json(out_simple, {"meta": meta, **sections["simple"]})
+    write_json(out_reasoned, {"meta": meta, **sections["reasoned"]})
 
     print(f"Saved simple mode results to {out_simple}")
     print(f"Saved reasoned mode results to {out_reasoned}")
@@ -80,9 +184,6 @@ def run_dual(split: str = "test", max_new_tokens: int = 4096, output_dir: str =
 if __name__ == "__main__":
     import argparse
     ap = argparse.ArgumentParser(description="Run dual-mode (simple + reasoned) evaluation")
-    ap.add_argument("--split", default="test", help="Dataset split: test | test_hard | test_very_hard")
-    ap.add_argument("--max_new_tokens", type=int, default=512)
-    ap.add_argument("--output_dir", default=".")
-    ap.add_argument("--no_progress", action="store_true", help="Disable tqdm progress bars")
+    add_eval_args(ap)
     args = ap.parse_args()
-    run_dual(split=args.split, max_new_tokens=args.max_new_tokens, output_dir=args.output_dir, show_progress=not args.no_progress)
+    run_dual(EvalOptions.from_args(args))
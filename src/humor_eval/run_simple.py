@@ -1,89 +1,180 @@
 """Run simple (no reasoning prompt) evaluation over a split.
 
-Outputs a single JSON file with summary + per-item records.
+Outputs a single JSON file with summary + per-item records. ``--answer_mode
+scored`` reads the option letters' next-token probabilities from one prefill
+instead of generating, and stores them per item as ``choice_probs``.
+``--early_stop`` stops each generation once its answer is fixed (see
+``streaming``). ``--profile`` / ``--trace`` record per-item timings (see
+``profiling``). ``--draft_model`` decodes with assisted generation (see
+``assisted``). ``--max_image_side`` / ``--max_image_tiles`` resize the cartoons
+first (see ``resolution``). ``--heartbeat`` keeps a live progress file (see
+``heartbeat``). ``--adaptive`` stops early once accuracy is settled (see
+``adaptive``).
+
+torch and transformers are imported inside ``run_simple``, so ``--help`` and
+``merge_simple`` do not load them (see ``imports``).
 """
 from __future__ import annotations
-import json
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
-from typing import List
 
+from .adaptive import SequentialMonitor, journaled_results, load_baselines
 from .data import load_entries
-from tqdm import tqdm
-from .models import load_model, chat_infer, parse_model_response, extract_answer, summarize_device_allocation
-from .dataset_types import DatasetEntryResult
+from .journal import JournalFold, ResultJournal, completed_keys, default_journal_path, single_run, write_json
+from .models import load_draft_model, load_generation_config, load_model, set_threads
+from .options import EvalOptions, add_eval_args
+from .profiling import summarize_perf
+from .shard import launch_workers, parse_shard, shard_indices, shard_path, shard_paths, worker_devices
+
+
+def results_name(split: str, answer_mode: str = "simple") -> str:
+    return f"results_simple_only_{split}" if answer_mode == "simple" else f"results_{answer_mode}_only_{split}"
 
-def run_simple(split: str = "test", max_new_tokens: int = 512, output_dir: str = ".", show_progress: bool = True) -> str:
-    entries = load_entries(split)
-    processor, model = load_model()
-    try:
-        print("Model device allocation:", summarize_device_allocation(model))
-    except Exception as e:  # pragma: no cover
-        print(f"(Could not summarize devices: {e})")
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    out_path = Path(output_dir) / f"results_simple_only_{split}_{ts}.json"
-
-    results_ranking: List[DatasetEntryResult] = []
-    results_matching: List[DatasetEntryResult] = []
-    iterator = entries if not show_progress else tqdm(entries, desc=f"simple:{split}")
-    for entry in iterator:
-        resp = chat_infer(processor, model, entry["images"], entry["problem"], max_new_tokens=max_new_tokens, answer_mode="simple")
-        reasoning, _ = parse_model_response(resp)
-        extracted_answer = extract_answer(resp)
-        is_correct = extracted_answer == entry["answer"]
-        rec = DatasetEntryResult(
-            contest_number=entry["contest_number"],
-            problem=entry["problem"],
-            correct_answer=entry["answer"],
-            model_answer=resp,
-            reasoning=reasoning,
-            extracted_answer=extracted_answer,
-            task=entry["task"],
-            is_correct=is_correct,
-        )
-        if entry["task"] == "ranking":
-            results_ranking.append(rec)
-        else:
-            results_matching.append(rec)
 
-    def summarize(lst: List[DatasetEntryResult]):
-        total = len(lst)
-        correct = sum(1 for r in lst if r["is_correct"])
+def simple_sections(fold: JournalFold, split: str, answer_mode: str = "simple", profile: bool = False) -> dict:
+    """Ranking/matching sections with lazy ``results`` folded from journals;
+    ``profile`` adds latency / throughput stats of the records' ``perf``."""
+
+    def summarize(task: str):
+        total, correct = fold.counts(task)
         acc = correct / total if total else 0.0
-        return {
+        summary = {
             "total_entries": total,
             "correct_answers": correct,
             "accuracy": acc,
-            "answer_mode": "simple",
+            "answer_mode": answer_mode,
             "split": split,
-            "task": lst[0]["task"] if total else None,
+            "task": task if total else None,
         }
+        if profile:
+            summary["perf"] = summarize_perf(fold.results(task))
+        return summary
 
-    payload = {
+    return {
         "ranking": {
-            "summary": summarize(results_ranking),
-            "results": results_ranking,
+            "summary": summarize("ranking"),
+            "results": fold.results("ranking"),
         },
         "matching": {
-            "summary": summarize(results_matching),
-            "results": results_matching,
+            "summary": summarize("matching"),
+            "results": fold.results("matching"),
         },
-        "meta": {
-            "split": split,
-            "max_new_tokens": max_new_tokens,
-            "generated_at": ts,
-        }
     }
-    out_path.write_text(json.dumps(payload, indent=2))
-    print(f"Saved simple evaluation to {out_path}")
+
+
+def merge_simple(
+    split: str,
+    max_new_tokens: int | None,
+    output_dir: str,
+    num_shards: int,
+    journal: str | None = None,
+    answer_mode: str = "simple",
+    profile: bool = False,
+    params: dict | None = None,
+) -> str:
+    """Fold the journals of ``num_shards`` shards into one results JSON.
+    ``params`` are the run's generation params (default: greedy with
+    ``max_new_tokens``). With neither, they are read from the journals, which
+    must then hold exactly one run."""
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    out_path = Path(output_dir) / f"{results_name(split, answer_mode)}_{ts}.json"
+    base = default_journal_path(output_dir, results_name(split, answer_mode), journal)
+    paths = shard_paths(base, num_shards)
+    missing = [str(p) for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"missing shard journals: {missing}")
+    if params is None and max_new_tokens is None:
+        params, stored = single_run(paths, split, answer_mode)
+        max_new_tokens = stored.get("max_new_tokens") if stored else None
+    elif params is None:
+        from .evaluate import generation_params
+
+        params = generation_params(max_new_tokens)
+    fold = JournalFold(paths, split, answer_mode, params)
+    payload = simple_sections(fold, split, answer_mode, profile)
+    payload["meta"] = {
+        "split": split,
+        "max_new_tokens": max_new_tokens,
+        "generated_at": ts,
+        "shards": num_shards,
+    }
+    write_json(out_path, payload)
+    print(f"Merged {num_shards} shards into {out_path}")
+    return str(out_path)
+
+
+def run_simple(options: EvalOptions | None = None, answer_mode: str = "simple", **overrides) -> str:
+    """Evaluate one answer mode over a split; ``overrides`` are ``EvalOptions``
+    fields applied on top of ``options``."""
+    o = replace(options or EvalOptions(), **overrides)
+    if answer_mode not in ("simple", "scored"):
+        raise ValueError(f"run_simple supports answer_mode simple or scored, got {answer_mode!r}")
+    o.validate()
+    from .evaluate import EvalSession
+
+    params = o.params(answer_mode)
+    if o.num_workers > 1:
+        devices = worker_devices(o.num_workers)
+        launch_workers("humor_eval.run_simple", "run_simple", [
+            dict(options=o.worker(f"{k}/{o.num_workers}", devices[k]), answer_mode=answer_mode) for k in range(o.num_workers)
+        ])
+        return merge_simple(
+            o.split, o.max_new_tokens, o.output_dir, o.num_workers, journal=o.journal, answer_mode=answer_mode,
+            profile=o.profile or o.trace is not None, params=params,
+        )
+
+    split, max_new_tokens = o.split, o.max_new_tokens
+    set_threads(o.threads, o.interop_threads)
+    entries = load_entries(split)
+    part = parse_shard(o.shard)
+    indices = shard_indices(len(entries), part) if part else None
+    tag = f"_shard{part[0]}of{part[1]}" if part else ""
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    out_path = Path(o.output_dir) / f"{results_name(split, answer_mode)}{tag}_{ts}.json"
+    journal_path = shard_path(default_journal_path(o.output_dir, results_name(split, answer_mode), o.journal), part)
+    done = completed_keys(journal_path) if o.resume else set()
+    monitor = journaled = None
+    if o.adaptive:
+        baselines = load_baselines(o.baseline or [], split)
+        if o.baseline and answer_mode not in baselines:
+            raise ValueError(f"no {answer_mode} run among the baselines ({sorted(baselines)})")
+        monitor = SequentialMonitor(entries, split, answer_mode, o.adaptive_settings(), baselines.get(answer_mode))
+        journaled = journaled_results(journal_path, split, answer_mode, params, done)
+
+    session = EvalSession(o, "simple", part, load_generation_config)
+    with ResultJournal(journal_path) as jr:
+        # Journal cache hits first; the model is only loaded if anything is left.
+        done = session.journal_cached(entries, [answer_mode], jr, done, indices)
+        if monitor is not None:
+            # Journaled items along the planned order may already settle the run.
+            pending = monitor.replay(journaled)
+        else:
+            pending = session.pending(entries, answer_mode, done, indices)
+        if pending:
+            session.load(load_model, load_draft_model)
+        session.evaluate(entries, answer_mode, jr, done, indices, monitor, journaled)
+    fold = JournalFold(journal_path, split, answer_mode, params)
+    if monitor is not None:
+        # Only the items the monitor saw; older journal lines past the stop are left out.
+        fold.restrict(monitor.order[:monitor.n])
+    payload = simple_sections(fold, split, answer_mode, profile=session.profiler is not None)
+    payload["meta"] = {
+        "split": split,
+        "max_new_tokens": max_new_tokens,
+        "generated_at": ts,
+    }
+    session.report(
+        payload["meta"], {answer_mode: fold}, {answer_mode: payload}, {answer_mode: monitor} if monitor is not None else None,
+    )
+    write_json(out_path, payload)
+    print(f"Saved simple evaluation to {out_path} (journal: {journal_path})")
     return str(out_path)
 
 if __name__ == "__main__":
     import argparse
     ap = argparse.ArgumentParser(description="Run simple-mode evaluation only")
-    ap.add_argument("--split", default="test")
-    ap.add_argument("--max_new_tokens", type=int, default=512)
-    ap.add_argument("--output_dir", default=".")
-    ap.add_argument("--no_progress", action="store_true", help="Disable tqdm progress bar")
+    add_eval_args(ap)
+    ap.add_argument("--answer_mode", choices=["simple", "scored"], default="simple", help="scored: one prefill, choice probabilities instead of generation")
     args = ap.parse_args()
-    run_simple(split=args.split, max_new_tokens=args.max_new_tokens, output_dir=args.output_dir, show_progress=not args.no_progress)
+    run_simple(EvalOptions.from_args(args), answer_mode=args.answer_mode)
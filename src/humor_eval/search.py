@@ -0,0 +1,266 @@
+"""Incremental full-text index over results files.
+
+Every record of every indexed run goes into one SQLite file: an FTS5 table over
+``reasoning``, ``model_answer`` and ``problem`` plus a plain table of filter
+columns (task, split, answer mode, correctness, contest number, source file).
+Files are keyed by resolved path, size and mtime, so ``update`` only reads runs
+that are new or have changed since the last call and drops the rows of files
+that changed or (with ``prune``) disappeared. Both results layouts are read via
+``columnar.iter_sections``.
+
+Queries use FTS5 syntax: terms (``pun irony``, all must match), phrases
+(``"double meaning"``), prefixes (``absurd*``), ``OR`` / ``NOT`` and column
+filters (``reasoning: pun``). Hits are ranked by BM25 and carry a snippet::
+
+    python -m humor_eval.search --index search.sqlite index results_simple_2048/ results.json
+    python -m humor_eval.search --index search.sqlite query '"talking animal" pun*' --task matching --wrong
+
+Only the standard library is imported (SQLite must be built with FTS5, which
+CPython's bundled SQLite is).
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TypedDict
+
+from .columnar import _truthy, iter_sections, run_info
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    split TEXT NOT NULL,
+    answer_mode TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    task TEXT NOT NULL,
+    split TEXT NOT NULL,
+    answer_mode TEXT NOT NULL,
+    contest_number INTEGER NOT NULL,
+    is_correct INTEGER NOT NULL,
+    extracted_answer TEXT NOT NULL,
+    correct_answer TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_file ON items(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(reasoning, model_answer, problem, prefix='2 3');
+"""
+
+
+class Hit(TypedDict):
+    file: str
+    task: str
+    split: str
+    answer_mode: str
+    contest_number: int
+    is_correct: bool
+    extracted_answer: str
+    correct_answer: str
+    snippet: str
+    score: float  # BM25, lower is better
+
+
+def results_files(paths: Iterable[str | Path]) -> List[Path]:
+    """Expand directories to the ``*.json`` files below them."""
+    files: List[Path] = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.rglob("*.json")) if p.is_dir() else [p])
+    return files
+
+
+class SearchIndex:
+    """One SQLite FTS5 index file; see the module docstring."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _drop(self, file_id: int) -> None:
+        self._conn.execute("DELETE FROM docs WHERE rowid IN (SELECT id FROM items WHERE file_id = ?)", (file_id,))
+        self._conn.execute("DELETE FROM items WHERE file_id = ?", (file_id,))
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _add(self, path: Path, stat) -> int:
+        data = json.loads(path.read_text())
+        info = run_info(data)
+        cur = self._conn.execute(
+            "INSERT INTO files (path, size, mtime_ns, split, answer_mode, records, indexed) VALUES (?, ?, ?, ?, ?, 0, ?)",
+            (str(path), stat.st_size, stat.st_mtime_ns, info["split"], info["answer_mode"], time.time()),
+        )
+        file_id = cur.lastrowid
+        count = 0
+        for _, results in iter_sections(data):
+            for rec in results:
+                row = self._conn.execute(
+                    "INSERT INTO items (file_id, task, split, answer_mode, contest_number, is_correct,"
+                    " extracted_answer, correct_answer) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        file_id,
+                        rec["task"],
+                        info["split"],
+                        info["answer_mode"],
+                        int(rec["contest_number"]),
+                        int(_truthy(rec["is_correct"])),
+                        rec.get("extracted_answer", "Unknown"),
+                        rec.get("correct_answer", "Unknown"),
+                    ),
+                ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO docs (rowid, reasoning, model_answer, problem) VALUES (?, ?, ?, ?)",
+                    (row, rec.get("reasoning", ""), rec.get("model_answer", ""), rec.get("problem", "")),
+                )
+                count += 1
+        self._conn.execute("UPDATE files SET records = ? WHERE id = ?", (count, file_id))
+        return count
+
+    def update(self, paths: Iterable[str | Path], prune: bool = False) -> Dict[str, int]:
+        """Index new or changed results files (directories are searched for
+        ``*.json``); unchanged files are only stat'ed. With ``prune``, files
+        indexed earlier that no longer exist are removed."""
+        known = {row[1]: row for row in self._conn.execute("SELECT id, path, size, mtime_ns FROM files")}
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "records": 0}
+        with self._conn:
+            for path in results_files(paths):
+                path = path.resolve()
+                stat = path.stat()
+                old = known.get(str(path))
+                if old is not None and (old[2], old[3]) == (stat.st_size, stat.st_mtime_ns):
+                    stats["unchanged"] += 1
+                    continue
+                if old is not None:
+                    self._drop(old[0])
+                stats["records"] += self._add(path, stat)
+                stats["updated" if old is not None else "added"] += 1
+            if prune:
+                for file_id, path, _, _ in known.values():
+                    if not Path(path).exists():
+                        self._drop(file_id)
+                        stats["removed"] += 1
+        return stats
+
+    def search(
+        self,
+        query: str,
+        task: Optional[str] = None,
+        split: Optional[str] = None,
+        answer_mode: Optional[str] = None,
+        correct: Optional[bool] = None,
+        limit: int = 20,
+        snippet_tokens: int = 16,
+    ) -> List[Hit]:
+        """Best ``limit`` hits for an FTS5 ``query`` under the given filters.
+        Raises ``ValueError`` for a malformed query."""
+        where, params = ["docs MATCH ?"], [query]
+        for column, value in (("task", task), ("split", split), ("answer_mode", answer_mode)):
+            if value is not None:
+                where.append(f"items.{column} = ?")
+                params.append(value)
+        if correct is not None:
+            where.append("items.is_correct = ?")
+            params.append(int(correct))
+        sql = (
+            "SELECT files.path, items.task, items.split, items.answer_mode, items.contest_number, items.is_correct,"
+            " items.extracted_answer, items.correct_answer,"
+            f" snippet(docs, -1, '[', ']', '...', {int(snippet_tokens)}), bm25(docs)"
+            " FROM docs JOIN items ON items.id = docs.rowid JOIN files ON files.id = items.file_id"
+            f" WHERE {' AND '.join(where)} ORDER BY bm25(docs) LIMIT ?"
+        )
+        try:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        except sqlite3.OperationalError as exc:
+            raise ValueError(f"bad search query {query!r}: {exc}") from exc
+        return [
+            Hit(
+                file=row[0],
+                task=row[1],
+                split=row[2],
+                answer_mode=row[3],
+                contest_number=row[4],
+                is_correct=bool(row[5]),
+                extracted_answer=row[6],
+                correct_answer=row[7],
+                snippet=row[8],
+                score=row[9],
+            )
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        files, records = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(records), 0) FROM files").fetchone()
+        return {"files": files, "records": records, "bytes": self.path.stat().st_size}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Full-text search over results files")
+    ap.add_argument("--index", default="search.sqlite", help="Index file")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ap_index = sub.add_parser("index", help="Add new or changed results files to the index")
+    ap_index.add_argument("results", nargs="+", help="Results JSON files or directories")
+    ap_index.add_argument("--prune", action="store_true", help="Drop indexed files that no longer exist")
+    ap_query = sub.add_parser("query", help="Search the index")
+    ap_query.add_argument("query", help='FTS5 query: terms, "phrases", prefix*, OR/NOT')
+    ap_query.add_argument("--task", choices=["ranking", "matching"])
+    ap_query.add_argument("--split")
+    ap_query.add_argument("--answer_mode")
+    correct = ap_query.add_mutually_exclusive_group()
+    correct.add_argument("--correct", dest="correct", action="store_true", default=None)
+    correct.add_argument("--wrong", dest="correct", action="store_false")
+    ap_query.add_argument("--limit", type=int, default=20)
+    ap_query.add_argument("--json", action="store_true", help="Print hits as JSON lines")
+    args = ap.parse_args(argv)
+
+    with SearchIndex(args.index) as index:
+        if args.cmd == "index":
+            start = time.perf_counter()
+            stats = index.update(args.results, prune=args.prune)
+            total = index.stats()
+            print(
+                f"{stats['added']} added, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+                f"{stats['removed']} removed ({stats['records']} records) in {time.perf_counter() - start:.2f}s; "
+                f"index: {total['files']} files, {total['records']} records, {total['bytes'] / 1e6:.1f} MB"
+            )
+            return
+        start = time.perf_counter()
+        try:
+            hits = index.search(args.query, args.task, args.split, args.answer_mode, args.correct, args.limit)
+        except ValueError as exc:
+            ap.error(str(exc))
+        elapsed = time.perf_counter() - start
+        for hit in hits:
+            if args.json:
+                print(json.dumps(hit))
+                continue
+            mark = "ok " if hit["is_correct"] else "bad"
+            print(
+                f"{mark} {hit['task']:<8} #{hit['contest_number']:<5} {hit['split']}/{hit['answer_mode']} "
+                f"{hit['extracted_answer']}->{hit['correct_answer']}  {Path(hit['file']).name}\n    {hit['snippet']}"
+            )
+        if not args.json:
+            print(f"{len(hits)} hits in {elapsed * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Data-parallel sharded evaluation and deterministic merge.
+
+``--shard i/N`` (e.g. from a SLURM array) evaluates the entries whose index is
+congruent to ``i`` mod ``N`` (a strided slice, so every shard gets a mix of
+ranking and matching items) into its own journal. ``--num_workers N`` does the
+same with N local processes, each loading its own model replica on its own
+device, and merges when they finish. Journals keep the global entry index, so
+merging is a fold over all shard journals sorted by index and reproduces the
+unsharded results JSON exactly.
+
+Merge shards written by a SLURM array (the generation settings are read from
+the journals; merging refuses journals holding runs with different settings)::
+
+    python -m humor_eval.shard merge --runner simple --split test --num_shards 4 --output_dir results_simple_2048
+"""
+from __future__ import annotations
+
+import importlib
+import multiprocessing as mp
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Shard = Tuple[int, int]
+
+# "spawn" keeps CUDA usable in workers; tests switch to "fork" so monkeypatched
+# loaders carry over.
+START_METHOD = "spawn"
+
+
+def parse_shard(spec: Optional[str]) -> Optional[Shard]:
+    """Parse ``"i/N"`` into ``(i, N)``; ``None`` means unsharded."""
+    if spec is None:
+        return None
+    try:
+        i, n = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, got {spec!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard index must satisfy 0 <= i < N, got {spec!r}")
+    return i, n
+
+
+def shard_indices(total: int, shard: Optional[Shard]) -> List[int]:
+    if shard is None:
+        return list(range(total))
+    i, n = shard
+    return list(range(i, total, n))
+
+
+def shard_path(base: Path, shard: Optional[Shard]) -> Path:
+    """``x.journal.jsonl`` -> ``x.journal.shard1of4.jsonl``."""
+    if shard is None:
+        return base
+    i, n = shard
+    return base.with_name(f"{base.stem}.shard{i}of{n}{base.suffix}")
+
+
+def shard_paths(base: Path, num_shards: int) -> List[Path]:
+    return [shard_path(base, (i, num_shards)) for i in range(num_shards)]
+
+
+def worker_devices(num_workers: int) -> List[str]:
+    """One device per worker: GPUs round-robin, else CPU."""
+    try:
+        import torch
+
+        gpus = torch.cuda.device_count()
+    except ImportError:  # pragma: no cover
+        gpus = 0
+    if gpus == 0:
+        return ["cpu"] * num_workers
+    return [f"cuda:{k % gpus}" for k in range(num_workers)]
+
+
+def _worker(module: str, func: str, kwargs: Dict[str, Any]) -> None:
+    getattr(importlib.import_module(module), func)(**kwargs)
+
+
+def launch_workers(module: str, func: str, kwargs_list: Sequence[Dict[str, Any]]) -> None:
+    """Run ``module.func(**kwargs)`` in one process per kwargs dict and wait."""
+    ctx = mp.get_context(START_METHOD)
+    procs = [ctx.Process(target=_worker, args=(module, func, kwargs)) for kwargs in kwargs_list]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    failed = [k for k, p in enumerate(procs) if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"shard workers {failed} failed; rerun with --resume to finish them")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Merge shard journals into the standard results JSON")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p_merge = sub.add_parser("merge", help="Fold shard journals; the generation settings are read from them")
+    p_merge.add_argument("--runner", choices=["simple", "dual"], default="simple")
+    p_merge.add_argument("--split", default="test")
+    p_merge.add_argument("--num_shards", type=int, required=True)
+    p_merge.add_argument("--output_dir", default=".")
+    p_merge.add_argument("--journal", default=None, help="Base journal path used by the shards, if overridden")
+    p_merge.add_argument("--answer_mode", choices=["simple", "scored"], default="simple", help="run_simple only")
+    p_merge.add_argument("--profile", action="store_true", help="Add perf summaries (shards were run with --profile)")
+    args = ap.parse_args(argv)
+
+    if args.command == "merge":
+        try:
+            if args.runner == "simple":
+                from .run_simple import merge_simple
+
+                print(merge_simple(args.split, None, args.output_dir, args.num_shards, journal=args.journal, answer_mode=args.answer_mode, profile=args.profile))
+            else:
+                from .run_dual import merge_dual
+
+                print(merge_dual(args.split, None, args.output_dir, args.num_shards, journal=args.journal, profile=args.profile))
+        except (FileNotFoundError, ValueError) as exc:
+            ap.error(str(exc))
+
+
+if __name__ == "__main__":
+    main()
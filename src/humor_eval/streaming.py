@@ -0,0 +1,223 @@
+"""Streaming generation that stops once the final answer is fixed.
+
+Generated tokens are detokenized incrementally and fed to ``AnswerWatcher``,
+which mirrors ``extract_answer``: generation stops after the first closed
+``<answer>`` tag containing a letter, which fixes what ``extract_answer``
+returns for any continuation. Only the text that arrived since the last step
+is scanned for closing tags, so checks stay O(1) per token.
+
+With ``heuristic=True`` it also stops after a closed ``<conclusion>`` with a
+letter (the last LLaVA-CoT stage), a ``<|begin_of_box|>X<|end_of_box|>`` token,
+or, in simple mode, a bare letter followed by whitespace. These only guess that
+the model has committed: a later ``<answer>`` would override a conclusion, and a
+later letter would override a bare one, so they can change the answer. Either
+way the stored response is the truncated text, so the offline parser applied to
+it yields the answer the watcher saw. Each item records ``stop_reason`` (``answer``,
+``conclusion``, ``box``, ``letter``, ``eos`` or ``max_new_tokens``),
+``generated_tokens`` and ``tokens_saved``: the decode budget left when it
+stopped early, an upper bound on the steps actually avoided.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, TypedDict
+
+import torch
+from PIL.Image import Image
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+from .models import _eos_token_ids, prepare_batch_inputs, prepare_inputs
+from .parsing import CHOICES, _ANSWER_TAG_RE, _BOX_LETTER_RE, _CONCLUSION_TAG_RE, _LETTER_RE
+
+
+class StopInfo(TypedDict):
+    stop_reason: str
+    generated_tokens: int
+    tokens_saved: int
+
+
+_CLOSING_TAGS = (("</answer>", "answer"), ("</conclusion>", "conclusion"), ("<|end_of_box|>", "box"))
+_LOOKBACK = max(len(tag) for tag, _ in _CLOSING_TAGS)
+
+
+class IncrementalDecoder:
+    """Decode a growing id sequence one token at a time without re-decoding it
+    all; text is held back while a multi-byte character is incomplete."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.ids: List[int] = []
+        self._prefix = 0
+        self._read = 0
+
+    def push(self, token_id: int) -> str:
+        self.ids.append(token_id)
+        prefix_text = self.tokenizer.decode(self.ids[self._prefix:self._read])
+        new_text = self.tokenizer.decode(self.ids[self._prefix:])
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            self._prefix, self._read = self._read, len(self.ids)
+            return new_text[len(prefix_text):]
+        return ""
+
+
+class AnswerWatcher:
+    """Incremental counterpart of ``extract_answer``: ``feed`` text deltas and
+    it returns a stop reason once further text cannot change the answer, or,
+    with ``heuristic``, once the model looks committed to one."""
+
+    def __init__(self, answer_mode: str = "reasoned", heuristic: bool = False):
+        self.answer_mode = answer_mode
+        self.heuristic = heuristic
+        self.text = ""
+        self._lower = ""
+        self.stop_reason: Optional[str] = None
+
+    def feed(self, delta: str) -> Optional[str]:
+        if self.stop_reason is not None or not delta:
+            return self.stop_reason
+        start = max(0, len(self._lower) - _LOOKBACK)
+        self.text += delta
+        self._lower += delta.lower()
+        for tag, reason in _CLOSING_TAGS if self.heuristic else _CLOSING_TAGS[:1]:
+            if self._lower.find(tag, start) != -1 and self._certain(reason):
+                self.stop_reason = reason
+                return reason
+        if self.heuristic and self.answer_mode == "simple" and delta[-1].isspace() and self.text.strip() in CHOICES:
+            self.stop_reason = "letter"
+        return self.stop_reason
+
+    def _certain(self, reason: str) -> bool:
+        if reason == "answer":
+            m = _ANSWER_TAG_RE.search(self.text)
+            return bool(m and _LETTER_RE.search(m.group(1)))
+        if reason == "conclusion":
+            # An open <answer> tag would still take priority.
+            if "<answer>" in self._lower:
+                return False
+            m = _CONCLUSION_TAG_RE.search(self.text)
+            return bool(m and _LETTER_RE.search(m.group(1)))
+        return bool(_BOX_LETTER_RE.search(self.text))
+
+
+class AnswerStoppingCriteria(StoppingCriteria):
+    """Per-row stopping for ``generate``; rows stop independently in a batch."""
+
+    def __init__(self, tokenizer, prompt_len: int, batch_size: int, answer_mode: str, eos_token_ids=(), heuristic: bool = False):
+        self.prompt_len = prompt_len
+        self.eos_token_ids = set(eos_token_ids)
+        self.decoders = [IncrementalDecoder(tokenizer) for _ in range(batch_size)]
+        self.watchers = [AnswerWatcher(answer_mode, heuristic) for _ in range(batch_size)]
+        # Number of generated tokens when each row stopped (None while running).
+        self.stopped_at: List[Optional[int]] = [None] * batch_size
+        self._ended = [False] * batch_size
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        n_new = input_ids.shape[-1] - self.prompt_len
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        last = input_ids[:, -1].tolist()
+        for row, token_id in enumerate(last):
+            if self._ended[row] or self.stopped_at[row] is not None:
+                done[row] = True
+                continue
+            if token_id in self.eos_token_ids:
+                # generate pads finished rows; keep padding out of the watcher.
+                self._ended[row] = True
+                continue
+            if self.watchers[row].feed(self.decoders[row].push(token_id)):
+                self.stopped_at[row] = n_new
+                done[row] = True
+        return done
+
+
+def stream_generate(
+    processor,
+    model,
+    inputs,
+    max_new_tokens: int,
+    answer_mode: str,
+    image: Image | None = None,
+    prefix_cache=None,
+    heuristic: bool = False,
+    **generate_kwargs,
+) -> List[Tuple[str, StopInfo]]:
+    """``generate`` with early stopping, for ``prepare_inputs`` or left-padded
+    ``prepare_batch_inputs`` output. Returns ``(response, StopInfo)`` per row."""
+    inputs = inputs.to(model.device, non_blocking=True)
+    extra = prefix_cache.generate_kwargs(processor, model, image, inputs) if prefix_cache is not None else {}
+    prompt_len = inputs["input_ids"].shape[-1]
+    tokenizer = getattr(processor, "tokenizer", processor)
+    eos_ids = _eos_token_ids(model)
+    criteria = AnswerStoppingCriteria(tokenizer, prompt_len, inputs["input_ids"].shape[0], answer_mode, eos_ids, heuristic)
+    outputs = model.generate(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        stopping_criteria=StoppingCriteriaList([criteria]),
+        **extra,
+        **generate_kwargs,
+    )
+    results = []
+    for row, seq in enumerate(outputs):
+        generated = seq[prompt_len:].tolist()
+        stop = criteria.stopped_at[row]
+        if stop is not None:
+            generated = generated[:stop]
+            reason = criteria.watchers[row].stop_reason
+        else:
+            reason = "max_new_tokens"
+            for pos, token_id in enumerate(generated):
+                if token_id in eos_ids:
+                    generated = generated[: pos + 1]
+                    reason = "eos"
+                    break
+        info = StopInfo(
+            stop_reason=reason,
+            generated_tokens=len(generated),
+            tokens_saved=max_new_tokens - len(generated) if stop is not None else 0,
+        )
+        results.append((processor.decode(generated).strip(), info))
+    return results
+
+
+def chat_infer_streaming(
+    processor,
+    model,
+    image: Image,
+    text: str,
+    max_new_tokens: int = 64,
+    answer_mode: str = "simple",
+    prefix_cache=None,
+    heuristic: bool = False,
+    **generate_kwargs,
+) -> Tuple[str, StopInfo]:
+    """``chat_infer`` with early stopping; also returns the ``StopInfo``."""
+    inputs = prepare_inputs(processor, image, text, answer_mode)
+    return stream_generate(
+        processor, model, inputs, max_new_tokens, answer_mode, image=image, prefix_cache=prefix_cache, heuristic=heuristic,
+        **generate_kwargs,
+    )[0]
+
+
+def chat_infer_batch_streaming(
+    processor,
+    model,
+    images: Sequence[Image],
+    texts: Sequence[str],
+    max_new_tokens: int = 64,
+    answer_mode: str = "simple",
+    heuristic: bool = False,
+    **generate_kwargs,
+) -> List[Tuple[str, StopInfo]]:
+    inputs = prepare_batch_inputs(processor, images, texts, answer_mode)
+    return stream_generate(processor, model, inputs, max_new_tokens, answer_mode, heuristic=heuristic, **generate_kwargs)
+
+
+def summarize_stops(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Stop-reason counts and token totals over result records."""
+    reasons: Dict[str, int] = {}
+    generated = saved = 0
+    for rec in records:
+        if "stop_reason" not in rec:
+            continue
+        reasons[rec["stop_reason"]] = reasons.get(rec["stop_reason"], 0) + 1
+        generated += rec["generated_tokens"]
+        saved += rec["tokens_saved"]
+    return {"stop_reasons": reasons, "generated_tokens": generated, "tokens_saved": saved}
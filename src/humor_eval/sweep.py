@@ -0,0 +1,406 @@
+"""Grid sweep over splits x answer modes x max_new_tokens x prompt variants x image budgets.
+
+One process loads the processor and model once and each split once, then runs
+every cell of the grid into its own journal (``sweep_<cell>.journal.jsonl``)
+and results JSON, and writes a consolidated summary table. Work shared between
+cells is reused:
+
+- one image-prefix KV cache (``--image_cache_mb``) serves every cell;
+- within a (split, variant, mode) group budgets run largest first, and a greedy
+  response that hit EOS within a smaller budget is exactly what that budget
+  generates, so it is copied instead of generated again;
+- ``scored`` ignores ``max_new_tokens``, so its largest budget is copied to the
+  others.
+
+Cells are always profiled (copying needs each item's generated token count), so
+records carry ``perf`` and the summary has latency and tokens/sec; copied
+records drop ``perf``. Voting runs (``--num_samples``) copy nothing.
+
+Every runner flag (``options.add_eval_args``) applies to all cells: each cell
+runs with the sweep's ``EvalOptions`` plus its own split, token budget and image
+budget, through one ``evaluate.EvalSession``. ``--split``, ``--max_image_side``
+and ``--max_image_tiles`` are the defaults of ``--splits`` and
+``--image_budgets``; ``--max_new_tokens`` takes several budgets. Prompt variants replace the instruction sentence of
+every prompt (``models.PROMPT_VARIANTS``, or ``--variants_file`` with a JSON
+``{name: instruction}`` object).
+
+Image budgets (``resolution.ImageBudget`` specs such as ``full``, ``tiles2``,
+``side560``) resize every cartoon before preprocessing. Each row reports
+``items_per_s``, the mean ``image_tiles`` and ``prefill_tokens`` (prompt tokens
+plus vision tokens of the tiles). With several budgets the summary names, per
+group of otherwise equal cells, the budget with the fewest prefill tokens whose
+accuracy is within ``--accuracy_tolerance`` of ``full``.
+
+The summary also estimates the wall-clock time of running every cell as its
+own job: this run's time plus a model load and a split load per extra cell,
+plus the generation time of copied items and prefix-cache hits.
+
+    python -m humor_eval.sweep --splits test test_hard test_very_hard \\
+        --answer_modes simple reasoned --max_new_tokens 512 2048 --prompt_variants default plain
+    python -m humor_eval.sweep --splits test --image_budgets full tiles3 tiles2 tiles1 --accuracy_tolerance 0.01
+"""
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import replace
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Collection, Dict, List, NamedTuple, Sequence, Set, Tuple
+
+from .data import TASK_ORDER, load_entries
+from .journal import ItemKey, JournalFold, ResultJournal, completed_keys, item_key, write_json
+from .models import PROMPT_VARIANTS, load_draft_model, load_generation_config, load_model, prompt_instruction, set_threads
+from .options import EvalOptions, add_eval_args
+from .profiling import summarize_perf
+from .resolution import ImageBudget, tile_tokens
+from .run_dual import mode_sections
+
+if TYPE_CHECKING:
+    from .evaluate import EvalSession
+
+ANSWER_MODES = ("simple", "reasoned", "scored")
+
+
+class Cell(NamedTuple):
+    split: str
+    answer_mode: str
+    max_new_tokens: int
+    prompt_variant: str
+    image_budget: str = "full"
+
+    @property
+    def name(self) -> str:
+        name = f"{self.split}_{self.answer_mode}_{self.max_new_tokens}_{self.prompt_variant}"
+        return name if self.image_budget == "full" else f"{name}_{self.image_budget}"
+
+    def options(self, base: EvalOptions) -> EvalOptions:
+        """``base`` with the cell's split, token budget and image budget."""
+        budget = ImageBudget.parse(self.image_budget)
+        return replace(
+            base, split=self.split, max_new_tokens=self.max_new_tokens, max_image_side=budget.max_side, max_image_tiles=budget.max_tiles,
+        )
+
+
+def grid(
+    splits: Sequence[str],
+    answer_modes: Sequence[str],
+    budgets: Sequence[int],
+    variants: Sequence[str],
+    image_budgets: Sequence[str] = ("full",),
+) -> List[Cell]:
+    """Every cell, grouped by split, variant, image budget and mode, largest
+    token budget first."""
+    unique = lambda xs: list(dict.fromkeys(xs))  # noqa: E731
+    return [
+        Cell(split, mode, tokens, variant, image)
+        for split in unique(splits)
+        for variant in unique(variants)
+        for image in unique(ImageBudget.parse(b).name for b in image_budgets)
+        for mode in unique(answer_modes)
+        for tokens in sorted(set(budgets), reverse=True)
+    ]
+
+
+def reusable(rec: Dict[str, Any], source: Cell, cell: Cell) -> bool:
+    """Whether ``rec`` from ``source`` is exactly what ``cell`` would produce."""
+    if cell.answer_mode == "scored":
+        return True
+    perf = rec.get("perf")
+    if perf is None:
+        return False
+    # Fewer tokens than the source budget means the row ended on EOS.
+    return perf["generated_tokens"] < source.max_new_tokens and perf["generated_tokens"] <= cell.max_new_tokens
+
+
+def copy_reusable(
+    journal: ResultJournal,
+    source: Cell,
+    source_path: Path,
+    cell: Cell,
+    base: EvalOptions,
+    done: Collection[ItemKey],
+) -> Tuple[Set[ItemKey], float]:
+    """Journal ``source`` results that ``cell`` can reuse; returns their keys
+    and the generation seconds they cost in ``source``. ``base`` holds the
+    settings the cells share."""
+    fold = JournalFold(source_path, source.split, source.answer_mode, source.options(base).params(source.answer_mode))
+    params = cell.options(base).params(cell.answer_mode)
+    copied: Set[ItemKey] = set()
+    seconds = 0.0
+    for task in TASK_ORDER:
+        for index, rec in zip(fold.indices(task), fold.results(task)):
+            key = item_key(cell.split, task, index, cell.answer_mode, params)
+            if key in done or not reusable(rec, source, cell):
+                continue
+            perf = rec.pop("perf", None)
+            if perf is not None:
+                seconds += (perf["preprocess_s"] + perf["ttft_s"] + perf["decode_s"]) / perf["batch_size"]
+            journal.append(cell.split, index, cell.answer_mode, params, rec)
+            copied.add(key)
+    journal.sync()
+    return copied, seconds
+
+
+def run_cell(
+    cell: Cell,
+    entries,
+    session: EvalSession,
+    base: EvalOptions,
+    ts: str,
+    instruction: str,
+    source: Cell | None = None,
+    tiles: Sequence[int] = (),
+    tokens_per_tile: int = 0,
+) -> Tuple[Dict[str, Any], JournalFold, Dict[str, Any]]:
+    """Evaluate one cell (copying what ``source`` allows) with ``session``, whose
+    options are ``base`` plus the cell's. Returns its summary row, fold and
+    sections. ``tiles`` are the image tiles of each entry under the cell's budget."""
+    o = cell.options(base)
+    session.use(o)
+    start = time.perf_counter()
+    journal_path = Path(o.output_dir) / f"sweep_{cell.name}.journal.jsonl"
+    done = completed_keys(journal_path) if o.resume else set()
+    copied: Set[ItemKey] = set()
+    copied_s = 0.0
+    with ResultJournal(journal_path) as jr:
+        if source is not None:
+            source_path = Path(o.output_dir) / f"sweep_{source.name}.journal.jsonl"
+            copied, copied_s = copy_reusable(jr, source, source_path, cell, base, done)
+            done = set(done) | copied
+        with prompt_instruction(instruction):
+            done = session.journal_cached(entries, [cell.answer_mode], jr, done, None)
+            generated = session.pending(entries, cell.answer_mode, done, None)
+            session.evaluate(entries, cell.answer_mode, jr, done)
+    fold = JournalFold(journal_path, cell.split, cell.answer_mode, o.params(cell.answer_mode))
+    sections = mode_sections(fold, cell.answer_mode, cell.split, profile=True)
+    out_path = Path(o.output_dir) / f"sweep_{cell.name}_{ts}.json"
+    meta = dict(cell._asdict(), prompt_instruction=instruction, generated_at=ts, copied=len(copied))
+    if source is not None:
+        meta["copied_from"] = source.name
+    write_json(out_path, {"meta": meta, **sections})
+
+    counts = [fold.counts(task) for task in TASK_ORDER]
+    total, correct = sum(t for t, _ in counts), sum(c for _, c in counts)
+    row: Dict[str, Any] = dict(cell._asdict(), cell=cell.name)
+    for task, (task_total, task_correct) in zip(TASK_ORDER, counts):
+        row[f"{task}_accuracy"] = task_correct / task_total if task_total else 0.0
+    perfs = [rec["perf"] for task in TASK_ORDER for rec in fold.results(task) if "perf" in rec]
+    item_s = sum((p["preprocess_s"] + p["ttft_s"] + p["decode_s"]) / p["batch_size"] for p in perfs)
+    image_tiles = sum(tiles) / len(tiles) if tiles else 0.0
+    prompt_tokens = sum(p["prompt_tokens"] for p in perfs) / len(perfs) if perfs else 0.0
+    row.update(
+        accuracy=correct / total if total else 0.0,
+        items=total,
+        generated=len(generated),
+        copied=len(copied),
+        copied_generation_s=copied_s,
+        tokens_per_s=summarize_perf(chain.from_iterable(fold.results(task) for task in TASK_ORDER)).get("tokens_per_s", 0.0),
+        items_per_s=len(perfs) / item_s if item_s else 0.0,
+        image_tiles=image_tiles,
+        prefill_tokens=prompt_tokens + image_tiles * tokens_per_tile,
+        seconds=time.perf_counter() - start,
+        output=str(out_path),
+    )
+    return row, fold, sections
+
+
+TABLE_COLUMNS = (
+    "cell", "ranking_accuracy", "matching_accuracy", "accuracy", "items", "generated", "copied", "items_per_s",
+    "prefill_tokens", "seconds",
+)
+
+
+def _text(value: Any) -> str:
+    return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+
+def format_table(rows: Sequence[Dict[str, Any]]) -> str:
+    texts = [[_text(row[c]) for c in TABLE_COLUMNS] for row in rows]
+    widths = [max(len(c), *(len(t[i]) for t in texts)) for i, c in enumerate(TABLE_COLUMNS)]
+
+    def line(values: Sequence[str]) -> str:
+        return " | ".join(v.ljust(w) if i == 0 else v.rjust(w) for i, (v, w) in enumerate(zip(values, widths)))
+
+    return "\n".join([line(TABLE_COLUMNS)] + [line(t) for t in texts])
+
+
+def cheapest_budgets(rows: Sequence[Dict[str, Any]], tolerance: float = 0.01) -> Dict[str, Dict[str, Any]]:
+    """Per group of cells differing only in image budget: the budget with the
+    fewest prefill tokens (then most items/s) whose accuracy is at most
+    ``tolerance`` below the ``full`` cell's (or the costliest cell's)."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        group = Cell(row["split"], row["answer_mode"], row["max_new_tokens"], row["prompt_variant"]).name
+        groups.setdefault(group, []).append(row)
+    picks: Dict[str, Dict[str, Any]] = {}
+    for group, members in groups.items():
+        if len(members) < 2:
+            continue
+        base = next((r for r in members if r["image_budget"] == "full"), None) or max(members, key=lambda r: r["prefill_tokens"])
+        ok = [r for r in members if r is base or r["accuracy"] >= base["accuracy"] - tolerance]
+        best = min(ok, key=lambda r: (r["prefill_tokens"], -r["items_per_s"]))
+        picks[group] = {
+            "baseline": base["image_budget"],
+            "image_budget": best["image_budget"],
+            "accuracy_drop": base["accuracy"] - best["accuracy"],
+            "prefill_tokens": best["prefill_tokens"],
+            "prefill_tokens_saved": base["prefill_tokens"] - best["prefill_tokens"],
+            "speedup": best["items_per_s"] / base["items_per_s"] if base["items_per_s"] else 0.0,
+        }
+    return picks
+
+
+def run_sweep(
+    options: EvalOptions | None = None,
+    splits: Sequence[str] | None = None,
+    answer_modes: Sequence[str] = ("simple",),
+    max_new_tokens: Sequence[int] | None = None,
+    prompt_variants: Sequence[str] = ("default",),
+    variants_file: str | None = None,
+    image_budgets: Sequence[str] | None = None,
+    accuracy_tolerance: float = 0.01,
+    **overrides,
+) -> str:
+    """Run the whole grid; returns the summary JSON path. ``overrides`` are
+    ``EvalOptions`` fields applied on top of ``options`` for every cell; the
+    axes default to its ``split``, ``max_new_tokens`` and image budget."""
+    # Copying needs every item's generated token count.
+    o = replace(options or EvalOptions(), profile=True, **overrides)
+    o.validate()
+    unsupported = [flag for flag, on in (
+        ("--shard", o.shard), ("--num_workers", o.num_workers > 1), ("--journal", o.journal), ("--adaptive", o.adaptive),
+    ) if on]
+    if unsupported:
+        raise ValueError(f"the sweep writes one journal per cell and does not support {', '.join(unsupported)}")
+    from .evaluate import EvalSession
+
+    variants = dict(PROMPT_VARIANTS)
+    if variants_file:
+        variants.update(json.loads(Path(variants_file).read_text()))
+    unknown = [v for v in prompt_variants if v not in variants]
+    if unknown:
+        raise ValueError(f"unknown prompt variants {unknown}; known: {sorted(variants)}")
+    bad_modes = [m for m in answer_modes if m not in ANSWER_MODES]
+    if bad_modes:
+        raise ValueError(f"answer modes must be in {ANSWER_MODES}, got {bad_modes}")
+    cells = grid(
+        splits or [o.split], answer_modes, max_new_tokens or [o.max_new_tokens], prompt_variants, image_budgets or [o.image_budget().name],
+    )
+    Path(o.output_dir).mkdir(parents=True, exist_ok=True)
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    set_threads(o.threads, o.interop_threads)
+    start = time.perf_counter()
+    session = EvalSession(o, "sweep", load_generation_config=load_generation_config)
+    session.load(load_model, load_draft_model)
+    model_load_s = time.perf_counter() - start
+    image_processor = getattr(session.processor, "image_processor", None)
+    tokens_per_tile = tile_tokens(session.model)
+    rows: List[Dict[str, Any]] = []
+    folds: Dict[str, JournalFold] = {}
+    sections: Dict[str, Dict[str, Any]] = {}
+    split_load_s: Dict[str, float] = {}
+    for split in dict.fromkeys(c.split for c in cells):
+        t0 = time.perf_counter()
+        entries = load_entries(split)
+        split_load_s[split] = time.perf_counter() - t0
+        sources: Dict[Tuple[str, str, str], Cell] = {}
+        # Image sizes are read once per split, on first use; tiles per budget follow from them.
+        sizes: List[Tuple[int, int]] = []
+        tiles: Dict[str, List[int]] = {}
+        for cell in (c for c in cells if c.split == split):
+            group = (cell.prompt_variant, cell.image_budget, cell.answer_mode)
+            if not sizes:
+                sizes = [entry["images"].size for entry in entries]
+            if cell.image_budget not in tiles:
+                budget = ImageBudget.parse(cell.image_budget)
+                tiles[cell.image_budget] = [budget.tile_count(w, h, image_processor) for w, h in sizes]
+            row, folds[cell.name], sections[cell.name] = run_cell(
+                cell, entries, session, o, ts, variants[cell.prompt_variant],
+                source=sources.get(group) if session.voter is None else None,
+                tiles=tiles[cell.image_budget], tokens_per_tile=tokens_per_tile,
+            )
+            rows.append(row)
+            sources.setdefault(group, cell)
+    wall_s = time.perf_counter() - start
+
+    prefix_cache = session.prefix_cache
+    saved = {
+        "model_loads_s": model_load_s * (len(cells) - 1),
+        "split_loads_s": sum(s * (sum(c.split == split for c in cells) - 1) for split, s in split_load_s.items()),
+        "copied_generation_s": sum(r["copied_generation_s"] for r in rows),
+        "prefix_cache_s": prefix_cache.summary()["prefill_seconds_saved"] if prefix_cache is not None else 0.0,
+    }
+    saved_s = sum(saved.values())
+    summary = {
+        "meta": {
+            "generated_at": ts,
+            "cells": len(cells),
+            "precision": o.precision,
+            "prompt_variants": {v: variants[v] for v in dict.fromkeys(prompt_variants)},
+            "wall_s": wall_s,
+            "model_load_s": model_load_s,
+            "split_load_s": split_load_s,
+            "separate_jobs_estimate_s": wall_s + saved_s,
+            "saved_s": saved_s,
+            "saved": saved,
+        },
+        "cells": rows,
+    }
+    session.use(o)
+    session.report(summary["meta"], folds, sections)
+    picks = cheapest_budgets(rows, accuracy_tolerance)
+    if picks:
+        summary["meta"]["image_budgets"] = {"accuracy_tolerance": accuracy_tolerance, "cheapest": picks}
+    out_path = Path(o.output_dir) / f"sweep_summary_{ts}.json"
+    write_json(out_path, summary)
+    print(format_table(rows))
+    print(
+        f"Sweep of {len(cells)} cells took {wall_s:.1f}s; as separate jobs ~{wall_s + saved_s:.1f}s "
+        f"(saved {saved_s:.1f}s: " + ", ".join(f"{k} {v:.1f}" for k, v in saved.items()) + ")"
+    )
+    for group, pick in picks.items():
+        print(
+            f"{group}: cheapest image budget within {accuracy_tolerance:.3f} of {pick['baseline']} is {pick['image_budget']} "
+            f"(accuracy -{pick['accuracy_drop']:.4f}, {pick['prefill_tokens_saved']:.0f} fewer prefill tokens, {pick['speedup']:.2f}x items/s)"
+        )
+    print(f"Saved sweep summary to {out_path}")
+    return str(out_path)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    import argparse
+
+    # "resolve" lets --max_new_tokens take several budgets instead of the runners' one.
+    ap = argparse.ArgumentParser(
+        description="Evaluate a grid of splits x modes x budgets x prompt variants x image budgets with one model load",
+        conflict_handler="resolve",
+    )
+    add_eval_args(ap)
+    ap.add_argument("--splits", nargs="+", default=None, help="Splits to sweep (default: --split)")
+    ap.add_argument("--answer_modes", nargs="+", default=["simple"], choices=list(ANSWER_MODES))
+    ap.add_argument("--max_new_tokens", nargs="+", type=int, default=[512], help="Token budgets to sweep")
+    ap.add_argument("--prompt_variants", nargs="+", default=["default"], help=f"Built in: {', '.join(PROMPT_VARIANTS)}")
+    ap.add_argument("--variants_file", default=None, help="JSON object of extra {name: instruction} prompt variants")
+    ap.add_argument(
+        "--image_budgets", nargs="+", default=None,
+        help="Image budgets: full, side<N>, tiles<N> or side<N>_tiles<N> (default: --max_image_side / --max_image_tiles)",
+    )
+    ap.add_argument("--accuracy_tolerance", type=float, default=0.01, help="Accuracy drop allowed when picking the cheapest image budget")
+    args = ap.parse_args(argv)
+    run_sweep(
+        replace(EvalOptions.from_args(args), max_new_tokens=args.max_new_tokens[0]),
+        splits=args.splits,
+        answer_modes=args.answer_modes,
+        max_new_tokens=args.max_new_tokens,
+        prompt_variants=args.prompt_variants,
+        variants_file=args.variants_file,
+        image_budgets=args.image_budgets,
+        accuracy_tolerance=args.accuracy_tolerance,
+    )
+
+
+if __name__ == "__main__":
+    main()
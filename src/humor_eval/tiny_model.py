@@ -0,0 +1,201 @@
+"""Tiny randomly initialised Llama-3.2V-shaped model for CPU-only tests.
+
+Everything is built locally (byte-level tokenizer, Mllama image processor and
+model) so no Hub download is needed. Outputs are meaningless but deterministic,
+which is all parity tests and benchmarks need. ``build_stub_model`` pairs the
+same processor with a model-free ``generate`` for measuring harness overhead.
+"""
+from __future__ import annotations
+
+import random
+from types import SimpleNamespace
+from typing import List
+
+import torch
+from PIL import Image as PILImage
+from tokenizers import Tokenizer, decoders, models as tok_models, pre_tokenizers
+from transformers import (
+    GenerationConfig,
+    MllamaConfig,
+    MllamaForConditionalGeneration,
+    MllamaImageProcessor,
+    MllamaProcessor,
+    PreTrainedTokenizerFast,
+)
+
+from .dataset_types import DatasetEntry
+
+SPECIAL_TOKENS = [
+    "<|begin_of_text|>",
+    "<|eot_id|>",
+    "<|start_header_id|>",
+    "<|end_header_id|>",
+    "<|image|>",
+    "<|python_tag|>",
+    "<|finetune_right_pad_id|>",
+]
+
+CHAT_TEMPLATE = (
+    "{% for m in messages %}<|start_header_id|>{{ m['role'] }}<|end_header_id|>\n\n"
+    "{% for c in m['content'] %}{% if c['type'] == 'image' %}<|image|>{% else %}{{ c['text'] }}{% endif %}{% endfor %}"
+    "<|eot_id|>{% endfor %}"
+    "{% if add_generation_prompt %}<|start_header_id|>assistant<|end_header_id|>\n\n{% endif %}"
+)
+
+
+def build_tiny_processor() -> MllamaProcessor:
+    vocab = {c: i for i, c in enumerate(sorted(pre_tokenizers.ByteLevel.alphabet()))}
+    tok = Tokenizer(tok_models.BPE(vocab=vocab, merges=[]))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    tok.add_special_tokens(SPECIAL_TOKENS)
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok,
+        bos_token="<|begin_of_text|>",
+        eos_token="<|eot_id|>",
+        pad_token="<|finetune_right_pad_id|>",
+        model_input_names=["input_ids", "attention_mask"],
+    )
+    image_processor = MllamaImageProcessor(size={"height": 16, "width": 16}, max_image_tiles=2)
+    return MllamaProcessor(image_processor=image_processor, tokenizer=tokenizer, chat_template=CHAT_TEMPLATE)
+
+
+def build_tiny_model(seed: int = 0):
+    """Return (processor, model) for a ~25k parameter Mllama on CPU."""
+    processor = build_tiny_processor()
+    tokenizer = processor.tokenizer
+    config = MllamaConfig(
+        vision_config=dict(
+            image_size=16,
+            patch_size=8,
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_global_layers=1,
+            intermediate_layers_indices=[0],
+            attention_heads=2,
+            intermediate_size=32,
+            max_num_tiles=2,
+            supported_aspect_ratios=[[1, 1], [1, 2], [2, 1]],
+            vision_output_dim=32,
+            initializer_range=0.3,
+        ),
+        text_config=dict(
+            vocab_size=len(tokenizer),
+            hidden_size=16,
+            num_hidden_layers=2,
+            cross_attention_layers=[1],
+            num_attention_heads=2,
+            num_key_value_heads=1,
+            intermediate_size=32,
+            pad_token_id=tokenizer.pad_token_id,
+            bos_token_id=tokenizer.bos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            rope_scaling={"rope_type": "default"},
+            initializer_range=0.3,
+        ),
+        image_token_index=tokenizer.convert_tokens_to_ids("<|image|>"),
+    )
+    torch.manual_seed(seed)
+    model = MllamaForConditionalGeneration(config)
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+    model.generation_config.eos_token_id = tokenizer.eos_token_id
+    model.eval()
+    return processor, model
+
+
+class StubModel(torch.nn.Module):
+    """Deterministic stand-in for a vision-to-sequence model.
+
+    ``generate`` runs no network: each row gets a scripted reasoned answer whose
+    letter depends on the prompt ids, emitted token by token (so streamers and
+    stopping criteria see a normal decode) and cut to ``max_new_tokens``.
+    """
+
+    def __init__(self, tokenizer):
+        super().__init__()
+        self.tokenizer = tokenizer
+        self.config = SimpleNamespace(model_type="stub")
+        self.generation_config = GenerationConfig(
+            eos_token_id=tokenizer.eos_token_id, pad_token_id=tokenizer.pad_token_id
+        )
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device("cpu")
+
+    def _script(self, row: torch.Tensor) -> List[int]:
+        letter = "ABCDE"[int(row.sum()) % 5]
+        text = f"<think>the caption with the twist wins</think><answer>{letter}</answer>"
+        return self.tokenizer.encode(text, add_special_tokens=False) + [self.tokenizer.eos_token_id]
+
+    @torch.no_grad()
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor | None = None,
+        max_new_tokens: int = 20,
+        min_new_tokens: int | None = None,
+        streamer=None,
+        stopping_criteria=None,
+        output_logits: bool = False,
+        return_dict_in_generate: bool = False,
+        **kwargs,
+    ):
+        min_new = min_new_tokens or self.generation_config.min_new_tokens or 0
+        filler = self.tokenizer.encode(" ", add_special_tokens=False)
+        scripts = []
+        for row in input_ids:
+            script = self._script(row)
+            if len(script) < min_new:
+                script = script[:-1] + filler * (min_new - len(script)) + script[-1:]
+            scripts.append(script[:max_new_tokens])
+        if streamer is not None:
+            streamer.put(input_ids.cpu())
+        sequences, logits = input_ids, []
+        pad = self.generation_config.pad_token_id
+        for step in range(max(map(len, scripts))):
+            token = torch.tensor([[s[step] if step < len(s) else pad] for s in scripts], dtype=input_ids.dtype)
+            step_logits = torch.zeros(len(scripts), len(self.tokenizer))
+            step_logits[torch.arange(len(scripts)), token[:, 0]] = 1.0
+            logits.append(step_logits)
+            sequences = torch.cat([sequences, token], dim=-1)
+            if streamer is not None:
+                streamer.put(token[:, 0])
+            if stopping_criteria is not None and all(stopping_criteria(sequences, step_logits)):
+                break
+        if streamer is not None:
+            streamer.end()
+        if return_dict_in_generate:
+            return SimpleNamespace(sequences=sequences, logits=tuple(logits) if output_logits else None)
+        return sequences
+
+
+def build_stub_model():
+    """Return (processor, model) where the model is a ``StubModel``."""
+    processor = build_tiny_processor()
+    return processor, StubModel(processor.tokenizer)
+
+
+def synthetic_entries(n: int, seed: int = 0) -> List[DatasetEntry]:
+    """Dataset-shaped entries with small random images and captions."""
+    rng = random.Random(seed)
+    entries: List[DatasetEntry] = []
+    for i in range(n):
+        task = "ranking" if i % 2 == 0 else "matching"
+        letters = ["A", "B"] if task == "ranking" else ["A", "B", "C", "D", "E"]
+        captions = "\n".join(
+            f"{letter}) " + " ".join(rng.choice(["cat", "desk", "boss", "pun", "dog", "lawyer"]) for _ in range(rng.randint(2, 8)))
+            for letter in letters
+        )
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        image = PILImage.new("RGB", (rng.randint(12, 48), rng.randint(12, 48)), color)
+        entries.append(
+            DatasetEntry(
+                images=image,
+                contest_number=500 + i // 3,
+                problem=f"<image>The image is a cartoon from the New Yorker Cartoon Caption Contest.\nWhich caption is funnier:\n{captions}\n\n",
+                answer=rng.choice(letters),
+                task=task,
+            )
+        )
+    return entries
@@ -0,0 +1,181 @@
+"""Self-consistency voting over k sampled continuations from one prefill.
+
+``Voter.generate`` samples ``num_samples`` continuations of one prompt in a
+single ``generate`` call. For Mllama the prompt (image included) is prefilled
+once and its KV cache is repeated k times, so the rows only differ from the
+last prompt token on; other models fall back to k batched prefills. Each sample
+stops once its answer is fixed (``streaming.AnswerStoppingCriteria``), and the
+whole call stops as soon as the samples still running cannot change the
+majority. ``extract_answer`` is applied to every finished sample; samples cut
+off by that early decision keep their partial text but get no answer and no
+vote. The response is the first sample with the winning answer and the result
+record keeps all samples and the vote distribution under ``vote``::
+
+    python -m humor_eval.run_dual --split test --num_samples 5 --temperature 0.7
+
+Sampling is seeded per item (``seed``), so reruns and shards reproduce the same
+samples. The settings are part of the journal key.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import torch
+from transformers import StoppingCriteriaList
+
+from .dataset_types import VoteInfo
+from .models import _eos_token_ids
+from .parsing import extract_answer
+from .prefix_cache import prefill, supports_prefix_cache
+from .streaming import AnswerStoppingCriteria
+
+
+def tally(answers: Iterable[Optional[str]]) -> Dict[str, int]:
+    """Vote counts per letter, in first-seen order (``None``, an unfinished
+    sample, and ``Unknown`` do not vote)."""
+    votes: Dict[str, int] = {}
+    for answer in answers:
+        if answer is not None and answer != "Unknown":
+            votes[answer] = votes.get(answer, 0) + 1
+    return votes
+
+
+def majority(votes: Dict[str, int]) -> str:
+    """Most voted letter (ties go to the first seen), ``Unknown`` without votes."""
+    return max(votes, key=votes.get) if votes else "Unknown"
+
+
+def decided(votes: Dict[str, int], pending: int) -> bool:
+    """Whether ``pending`` more votes can no longer change the majority."""
+    counts = sorted(votes.values(), reverse=True) + [0, 0]
+    return counts[0] > counts[1] + pending
+
+
+class VoteStoppingCriteria(AnswerStoppingCriteria):
+    """Stops each row once its answer is fixed, and every row once the
+    finished rows' majority is out of reach for the rest."""
+
+    def __init__(self, tokenizer, prompt_len: int, num_samples: int, answer_mode: str, eos_token_ids=()):
+        super().__init__(tokenizer, prompt_len, num_samples, answer_mode, eos_token_ids)
+        self.answers: Dict[int, str] = {}
+        self.decided_early = False
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        done = super().__call__(input_ids, scores, **kwargs)
+        if not self.decided_early:
+            for row, watcher in enumerate(self.watchers):
+                if row not in self.answers and (self._ended[row] or self.stopped_at[row] is not None):
+                    self.answers[row] = extract_answer(watcher.text)
+            pending = len(self.watchers) - len(self.answers)
+            self.decided_early = pending > 0 and decided(tally(self.answers.values()), pending)
+        if self.decided_early:
+            done[:] = True
+        return done
+
+
+def shared_prefill(model, inputs, num_samples: int) -> Tuple[Dict[str, Any], Dict[str, Any], float]:
+    """Inputs repeated ``num_samples`` times plus extra ``generate`` kwargs: a
+    KV cache of all but the last prompt token, prefilled once and repeated
+    (Mllama), else nothing. Also returns the prefill seconds."""
+    expanded = {
+        key: value.repeat_interleave(num_samples, dim=0) if isinstance(value, torch.Tensor) else value
+        for key, value in inputs.items()
+    }
+    if not supports_prefix_cache(model) or inputs["input_ids"].shape[0] != 1:
+        return expanded, {}, 0.0
+    cache, seconds = prefill(model, inputs, inputs["input_ids"].shape[-1] - 1)
+    cache.batch_repeat_interleave(num_samples)
+    return expanded, {"past_key_values": cache}, seconds
+
+
+class Voter:
+    """Sampling settings for k-sample majority voting."""
+
+    def __init__(self, num_samples: int, temperature: float = 0.7, top_p: float = 1.0, seed: int = 0):
+        if num_samples < 2:
+            raise ValueError(f"num_samples must be >= 2 for voting, got {num_samples}")
+        if temperature <= 0:
+            raise ValueError(f"temperature must be > 0, got {temperature}")
+        self.num_samples = num_samples
+        self.temperature = temperature
+        self.top_p = top_p
+        self.seed = seed
+
+    def params(self) -> Dict[str, Any]:
+        """Settings that change the samples; part of the journal key."""
+        return {"num_samples": self.num_samples, "temperature": self.temperature, "top_p": self.top_p, "seed": self.seed}
+
+    def generate(
+        self, processor, model, inputs, max_new_tokens: int, answer_mode: str, **generate_kwargs
+    ) -> Tuple[str, VoteInfo]:
+        """Vote over samples of one ``prepare_inputs`` prompt; returns the
+        first sample with the winning answer and the ``VoteInfo``."""
+        inputs = inputs.to(model.device, non_blocking=True)
+        prompt_len = inputs["input_ids"].shape[-1]
+        expanded, extra, prefill_s = shared_prefill(model, inputs, self.num_samples)
+        eos_ids = _eos_token_ids(model)
+        tokenizer = getattr(processor, "tokenizer", processor)
+        criteria = VoteStoppingCriteria(tokenizer, prompt_len, self.num_samples, answer_mode, eos_ids)
+        torch.manual_seed(self.seed)
+        start = time.perf_counter()
+        outputs = model.generate(
+            **expanded,
+            max_new_tokens=max_new_tokens,
+            do_sample=True,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            stopping_criteria=StoppingCriteriaList([criteria]),
+            **extra,
+            **generate_kwargs,
+        )
+        decode_s = time.perf_counter() - start
+        samples, tokens = [], 0
+        for row, seq in enumerate(outputs):
+            generated = seq[prompt_len:].tolist()
+            stop = criteria.stopped_at[row]
+            if stop is not None:
+                generated = generated[:stop]
+            else:
+                for pos, token_id in enumerate(generated):
+                    if token_id in eos_ids:
+                        generated = generated[: pos + 1]
+                        break
+            tokens += len(generated)
+            samples.append(processor.decode(generated).strip())
+        # Rows still running when the vote was decided have no answer yet.
+        finished = [not criteria.decided_early or row in criteria.answers for row in range(self.num_samples)]
+        answers = [extract_answer(s) if done else None for s, done in zip(samples, finished)]
+        votes = tally(answers)
+        winner = majority(votes)
+        resp = samples[answers.index(winner)] if winner in answers else samples[0]
+        return resp, VoteInfo(
+            samples=samples,
+            answers=answers,
+            votes=votes,
+            decided_early=criteria.decided_early,
+            generated_tokens=tokens,
+            prefill_s=prefill_s,
+            decode_s=decode_s,
+        )
+
+
+def summarize_votes(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sample, token and timing totals over records that carry ``vote``.
+    ``prefill_s_saved`` is the prefill time k separate calls would have
+    repeated."""
+    infos = [rec["vote"] for rec in records if "vote" in rec]
+    if not infos:
+        return {"items": 0}
+    k = len(infos[0]["samples"])
+    return {
+        "items": len(infos),
+        "num_samples": k,
+        "decided_early": sum(i["decided_early"] for i in infos),
+        "unfinished_samples": sum(a is None for i in infos for a in i["answers"]),
+        "unanimous": sum(len(i["votes"]) == 1 and max(i["votes"].values()) == k for i in infos),
+        "generated_tokens": sum(i["generated_tokens"] for i in infos),
+        "prefill_s": sum(i["prefill_s"] for i in infos),
+        "decode_s": sum(i["decode_s"] for i in infos),
+        "prefill_s_saved": sum(i["prefill_s"] for i in infos) * (k - 1),
+    }
@@ -0,0 +1,151 @@
+import json
+from collections import Counter
+
+import pytest
+
+from humor_eval.adaptive import Adaptive, SequentialMonitor, load_baselines, stratified_order, wilson
+from humor_eval.columnar import item_key as content_key
+
+
+def _entries(n_ranking=60, n_matching=30, per_contest=3):
+    entries = []
+    for task, n in (("ranking", n_ranking), ("matching", n_matching)):
+        for i in range(n):
+            entries.append({"task": task, "contest_number": 100 + i // per_contest, "problem": f"{task} {i}", "answer": "A"})
+    return entries
+
+
+def _rec(entry, correct):
+    return {**entry, "is_correct": correct}
+
+
+def test_stratified_order_is_a_seeded_balanced_permutation():
+    entries = _entries()
+    order = stratified_order(entries, seed=1)
+    assert sorted(order) == list(range(len(entries)))
+    assert order == stratified_order(entries, seed=1) != stratified_order(entries, seed=2)
+    # Tasks in proportion (2:1) along every prefix.
+    for n in (3, 9, 30):
+        assert Counter(entries[i]["task"] for i in order[:n]) == {"ranking": 2 * n // 3, "matching": n // 3}
+    # Every contest of a task appears once before any appears twice.
+    ranking = [entries[i]["contest_number"] for i in order if entries[i]["task"] == "ranking"]
+    assert len(set(ranking[:20])) == 20
+
+
+def test_wilson_interval():
+    center, half = wilson(8, 10, 1.96)
+    assert center - half == pytest.approx(0.4902, abs=1e-3) and center + half == pytest.approx(0.9433, abs=1e-3)
+
+
+def test_monitor_stops_on_width_at_a_planned_look():
+    entries = _entries(600, 400)
+    monitor = SequentialMonitor(entries, "test", "simple", Adaptive(target_width=0.15, min_items=40, check_every=10))
+    assert monitor.looks == 1 + 96
+    for n, index in enumerate(monitor.order, 1):
+        if monitor.observe(index, _rec(entries[index], n % 4 != 0)):
+            break
+    summary = monitor.summary()
+    assert summary["stop_reason"] == "width" and summary["width"] <= 0.15
+    assert 40 <= summary["evaluated"] < 1000 and (summary["evaluated"] - 40) % 10 == 0
+    assert summary["items_saved"] == 1000 - summary["evaluated"] and summary["order"] == monitor.order
+    assert summary["interval"][0] < summary["accuracy"] < summary["interval"][1]
+    assert set(summary["tasks"]) == {"ranking", "matching"}
+    with pytest.raises(RuntimeError):
+        monitor.observe(monitor.order[monitor.n], _rec(entries[0], True))
+
+
+def test_monitor_rejects_out_of_order_results():
+    entries = _entries()
+    monitor = SequentialMonitor(entries, "test", "simple", Adaptive())
+    with pytest.raises(RuntimeError, match="out of order"):
+        monitor.observe(monitor.order[1], _rec(entries[monitor.order[1]], True))
+
+
+def test_monitor_paired_comparison_against_a_baseline():
+    entries = _entries(300, 200)
+    keys = [content_key("test", e["task"], e["contest_number"], e["problem"]) for e in entries]
+    settings = Adaptive(target_width=0.1, min_items=20, check_every=5)
+
+    # Right wherever the baseline was wrong: clearly better.
+    better = SequentialMonitor(entries, "test", "simple", settings, baseline={k: i % 2 == 0 for i, k in enumerate(keys)})
+    for index in better.order:
+        if better.observe(index, _rec(entries[index], True)):
+            break
+    assert better.reason == "better" and better.n < 100
+    assert better.summary()["baseline"]["losses"] == 0 and better.summary()["baseline"]["interval"][0] > 0
+
+    # Identical answers: the difference is pinned at 0 once the interval is narrow.
+    same = SequentialMonitor(entries, "test", "simple", settings, baseline={k: i % 3 == 0 for i, k in enumerate(keys)})
+    for index in same.order:
+        if same.observe(index, _rec(entries[index], index % 3 == 0)):
+            break
+    assert same.reason == "equivalent" and same.n < len(entries)
+
+    with pytest.raises(ValueError, match="shares no items"):
+        SequentialMonitor(entries, "val", "simple", settings, baseline={0: True})
+
+
+def test_load_baselines_reads_both_layouts(tmp_path):
+    old = tmp_path / "old.json"
+    old.write_text(json.dumps({
+        "summary": {"split": "test", "answer_mode": "reasoned"},
+        "results": [{"task": "ranking", "contest_number": "7", "problem": "p", "is_correct": "False"}],
+    }))
+    new = tmp_path / "new.json"
+    new.write_text(json.dumps({
+        "meta": {"split": "test"},
+        "matching": {"summary": {"answer_mode": "simple"}, "results": [{"task": "matching", "contest_number": 8, "problem": "q", "is_correct": True}]},
+    }))
+    baselines = load_baselines([old, new], "test")
+    assert baselines == {
+        "reasoned": {content_key("test", "ranking", 7, "p"): False},
+        "simple": {content_key("test", "matching", 8, "q"): True},
+    }
+    with pytest.raises(ValueError, match="not 'val'"):
+        load_baselines([old], "val")
+
+
+def test_run_simple_adaptive_stops_early_and_resumes_without_the_model(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.journal import read_journal
+    from humor_eval.tiny_model import build_stub_model, synthetic_entries
+
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(24))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: build_stub_model())
+    options = dict(max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, adaptive=True, target_width=1.5, min_items=6, check_every=2)
+    first = json.loads(open(run_simple_mod.run_simple(**options)).read())
+    stats = first["meta"]["adaptive"]
+    assert stats["stop_reason"] == "width" and stats["evaluated"] == 6 and stats["items_saved"] == 18
+    assert stats["seconds_per_item"] > 0 and stats["gpu_hours_saved"] is not None
+    assert first["ranking"]["summary"]["total_entries"] + first["matching"]["summary"]["total_entries"] == 6
+    journal = tmp_path / "results_simple_only_test.journal.jsonl"
+    assert sorted(rec["index"] for _, rec in read_journal(journal)) == sorted(stats["order"][:6])
+
+    def no_model(*args, **kwargs):
+        raise AssertionError("model loaded on a settled resume")
+
+    monkeypatch.setattr(run_simple_mod, "load_model", no_model)
+    resumed = json.loads(open(run_simple_mod.run_simple(resume=True, **options)).read())
+    assert resumed["meta"]["adaptive"]["evaluated"] == 6 and resumed["meta"]["adaptive"]["replayed"] == 6
+    assert resumed["ranking"]["results"] == first["ranking"]["results"]
+
+    with pytest.raises(ValueError, match="--adaptive"):
+        run_simple_mod.run_simple(batch_size=2, **options)
+
+
+def test_run_dual_adaptive_uses_one_order_per_mode(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.run_dual as run_dual_mod
+    from humor_eval.tiny_model import build_stub_model, synthetic_entries
+
+    monkeypatch.setattr(run_dual_mod, "load_entries", lambda split: synthetic_entries(12))
+    monkeypatch.setattr(run_dual_mod, "load_model", lambda device=None, **options: build_stub_model())
+    simple, reasoned = run_dual_mod.run_dual(
+        max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, adaptive=True, target_width=1.5, min_items=4, check_every=2,
+    )
+    stats = json.loads(open(reasoned).read())["meta"]["adaptive"]
+    assert stats["simple"]["order"] == stats["reasoned"]["order"]
+    assert stats["simple"]["evaluated"] == stats["reasoned"]["evaluated"] == 4
+    data = json.loads(open(simple).read())
+    assert data["ranking"]["summary"]["total_entries"] + data["matching"]["summary"]["total_entries"] == 4
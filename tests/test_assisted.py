@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from humor_eval.assisted import Assistant, draft_info, summarize_drafts
+from humor_eval.evaluate import evaluate_entries
+from humor_eval.profiling import Profiler
+from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+
+def _strip(results, *keys):
+    return [{k: v for k, v in rec.items() if k not in keys} for rec in results]
+
+
+@pytest.mark.parametrize("draft_seed", [0, 1])
+def test_assisted_results_match_plain_generation(draft_seed):
+    entries = synthetic_entries(4)
+    processor, model = build_tiny_model()
+    _, draft = build_tiny_model(draft_seed)
+    plain = evaluate_entries(entries, processor, model, "reasoned", 24, show_progress=False, profiler=Profiler())
+    assistant = Assistant(draft, num_draft_tokens=3, verify=True)
+    assisted = evaluate_entries(
+        entries, processor, model, "reasoned", 24, show_progress=False, profiler=Profiler(), assistant=assistant
+    )
+    assert _strip(assisted, "perf", "draft") == _strip(plain, "perf")
+    for rec, ref in zip(assisted, plain):
+        info = rec["draft"]
+        assert info["identical"] and info["speedup"] > 0
+        assert rec["perf"]["generated_tokens"] == ref["perf"]["generated_tokens"]
+        assert info["accepted_tokens"] + info["verify_steps"] == rec["perf"]["generated_tokens"]
+        if draft_seed == 0:  # the draft is the main model: every proposal is kept
+            assert info["acceptance_rate"] == 1.0 and info["tokens_per_step"] > 1.0
+    summary = summarize_drafts(assisted)
+    assert summary["items"] == 4 and summary["mismatches"] == 0
+
+
+def test_assistant_ignored_in_scored_mode_and_rejects_batching():
+    entries = synthetic_entries(2)
+    processor, model = build_tiny_model()
+    assistant = Assistant(build_tiny_model(1)[1])
+    scored = evaluate_entries(entries, processor, model, "scored", 1, show_progress=False, assistant=assistant)
+    assert all("draft" not in rec for rec in scored)
+    with pytest.raises(ValueError):
+        evaluate_entries(entries, processor, model, "simple", 8, batch_size=2, show_progress=False, assistant=assistant)
+    with pytest.raises(ValueError):
+        Assistant(model, num_draft_tokens=0)
+    assert draft_info(10, 4, 9, 3)["accepted_tokens"] == 6
+    assert summarize_drafts([{}]) == {"items": 0}
+
+
+def test_run_dual_with_draft_model(tmp_path, monkeypatch):
+    import humor_eval.run_dual as run_dual_mod
+
+    monkeypatch.setattr(run_dual_mod, "load_entries", lambda split: synthetic_entries(3))
+    monkeypatch.setattr(run_dual_mod, "load_model", lambda device=None, **options: build_tiny_model())
+    monkeypatch.setattr(run_dual_mod, "load_draft_model", lambda model_id, device=None, precision="auto": build_tiny_model(1)[1])
+    plain = run_dual_mod.run_dual(max_new_tokens=16, output_dir=str(tmp_path / "plain"), show_progress=False)
+    assisted = run_dual_mod.run_dual(
+        max_new_tokens=16, output_dir=str(tmp_path / "draft"), show_progress=False, draft_model="tiny-draft", num_draft_tokens=2
+    )
+    for plain_path, assisted_path in zip(plain, assisted):
+        a, b = json.loads(open(plain_path).read()), json.loads(open(assisted_path).read())
+        for task in ("ranking", "matching"):
+            assert _strip(b[task]["results"], "draft") == a[task]["results"]
+            assert all(rec["draft"]["num_draft_tokens"] == 2 for rec in b[task]["results"])
+    meta = json.loads(open(assisted[1]).read())["meta"]["draft"]
+    assert meta["model"] == "tiny-draft" and meta["reasoned"]["items"] == 3
+    with pytest.raises(ValueError):
+        run_dual_mod.run_dual(output_dir=str(tmp_path), draft_model="tiny-draft", server_url="http://localhost:1/v1")
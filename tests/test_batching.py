@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from humor_eval.evaluate import evaluate_entries
+from humor_eval.models import length_buckets
+from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+
+def test_length_buckets_groups_similar_lengths():
+    buckets = length_buckets([5, 1, 9, 2, 8, 1], batch_size=2)
+    assert buckets == [[1, 5], [3, 0], [4, 2]]
+    assert sorted(i for b in buckets for i in b) == list(range(6))
+
+
+def test_length_buckets_rejects_zero():
+    with pytest.raises(ValueError):
+        length_buckets([1, 2], batch_size=0)
+
+
+@pytest.mark.parametrize("answer_mode", ["simple", "reasoned"])
+def test_batched_matches_per_item(answer_mode):
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(7)
+    single = evaluate_entries(entries, processor, model, answer_mode, max_new_tokens=12, batch_size=1, show_progress=False)
+    batched = evaluate_entries(entries, processor, model, answer_mode, max_new_tokens=12, batch_size=3, show_progress=False)
+    assert batched == single
+    assert len({r["model_answer"] for r in single}) > 1
+
+
+def test_batched_trims_rows_that_stop_early():
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(6)
+    first = evaluate_entries(entries[:1], processor, model, "simple", max_new_tokens=12, show_progress=False)[0]
+    # Make a token the model actually emits the EOS so rows finish at different steps.
+    model.generation_config.eos_token_id = processor.tokenizer(first["model_answer"], add_special_tokens=False)["input_ids"][2]
+    single = evaluate_entries(entries, processor, model, "simple", max_new_tokens=12, batch_size=1, show_progress=False)
+    batched = evaluate_entries(entries, processor, model, "simple", max_new_tokens=12, batch_size=6, show_progress=False)
+    assert batched == single
+    assert len({len(r["model_answer"]) for r in single}) > 1
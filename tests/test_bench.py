@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from humor_eval.bench import bench_backend, precision_agreement, regressions, time_item, vote_cost
+from humor_eval.models import chat_infer
+from humor_eval.tiny_model import build_stub_model, synthetic_entries
+
+
+def test_stub_is_deterministic_and_parseable():
+    processor, model = build_stub_model()
+    entry = synthetic_entries(1)[0]
+    first = chat_infer(processor, model, entry["images"], entry["problem"], max_new_tokens=64)
+    assert first == chat_infer(processor, model, entry["images"], entry["problem"], max_new_tokens=64)
+    assert first.startswith("<think>") and first.endswith("</answer>")
+
+
+def test_min_new_tokens_pins_decode_length():
+    processor, model = build_stub_model()
+    model.generation_config.min_new_tokens = 90
+    timing = time_item(processor, model, synthetic_entries(1)[0], max_new_tokens=90)
+    assert timing["tokens"] == 90
+    assert timing["latency"] >= timing["preprocess"] + timing["prefill"]
+
+
+def test_stub_suite_reports_every_metric():
+    metrics = bench_backend("stub", items=3, max_new_tokens=8)
+    assert metrics["run_simple_items_per_s"] > 0 and metrics["run_dual_items_per_s"] > 0
+    assert metrics["tokens_per_s"] > 0 and metrics["peak_rss_mb"] > 0
+
+
+def test_vote_cost_times_shared_and_separate_calls():
+    processor, model = build_stub_model()
+    metrics = vote_cost(processor, model, synthetic_entries(2), num_samples=3, max_new_tokens=16)
+    assert metrics["vote_call_ms_p50"] > 0 and metrics["vote_speedup_vs_separate"] > 0
+
+
+def test_regressions_respect_direction_and_threshold():
+    baseline = {"backends": {"stub": {"item_latency_ms_p50": 10.0, "tokens_per_s": 100.0, "load_s": 1.0}}}
+    ok = {"backends": {"stub": {"item_latency_ms_p50": 11.0, "tokens_per_s": 95.0, "load_s": 0.5}}}
+    bad = {"backends": {"stub": {"item_latency_ms_p50": 14.0, "tokens_per_s": 60.0, "load_s": 1.0}}}
+    assert regressions(ok, baseline, threshold=0.25) == []
+    found = regressions(bad, baseline, threshold=0.25)
+    assert [line.split(":")[0] for line in found] == ["stub.item_latency_ms_p50", "stub.tokens_per_s"]
+
+
+@pytest.mark.parametrize("precision", ["bfloat16", "int8"])
+def test_reduced_precision_agrees_with_float32(precision):
+    agreement = precision_agreement(precision, items=6)
+    assert agreement["choice_prob_max_diff"] < 0.05
+
+
+def test_precision_options_reach_load_model(tmp_path, monkeypatch, request):
+    import json
+
+    import torch
+
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.models import apply_precision, precision_dtype
+    from humor_eval.tiny_model import build_tiny_model
+
+    with pytest.raises(ValueError):
+        precision_dtype("int4", on_cuda=False)
+    seen = {}
+
+    def load_model(device=None, **options):
+        seen.update(options)
+        processor, model = build_tiny_model()
+        return processor, apply_precision(model, options["precision"])
+
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(2))
+    monkeypatch.setattr(run_simple_mod, "load_model", load_model)
+    request.addfinalizer(lambda threads=torch.get_num_threads(): torch.set_num_threads(threads))
+    out = run_simple_mod.run_simple(max_new_tokens=3, output_dir=str(tmp_path), show_progress=False, precision="int8", threads=2)
+    meta = json.loads(open(out).read())["meta"]
+    assert seen == {"precision": "int8", "max_cpu_memory_gb": None, "offload_dir": str(tmp_path / "offload")}
+    assert meta["load"]["precision"] == "int8" and meta["load"]["threads"] == 2
+
+
+def test_int8_quantization_does_not_warn():
+    import warnings
+
+    from humor_eval.models import quantize_int8
+    from humor_eval.tiny_model import build_tiny_model
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        quantize_int8(build_tiny_model()[1])
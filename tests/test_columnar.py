@@ -0,0 +1,106 @@
+import json
+import os
+import random
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from humor_eval.analytics import group_stats, load_runs
+from humor_eval.columnar import ColumnarRun, convert, ensure_columnar
+
+
+def _record(rng, task, i):
+    correct = rng.choice("AB" if task == "ranking" else "ABCDE")
+    extracted = rng.choice([correct, "A", "Unknown"])
+    return {
+        "contest_number": str(500 + i) if i % 2 else 500 + i,
+        "problem": f"problem {i} – ünïcode",
+        "correct_answer": correct,
+        "model_answer": f"<answer>{extracted}</answer>",
+        "reasoning": "because" * (i % 3),
+        "extracted_answer": extracted,
+        "task": task,
+        "is_correct": extracted == correct,
+    }
+
+
+def _nested(seed, n=40, split="test", mode="simple"):
+    rng = random.Random(seed)
+    out = {"meta": {"split": split, "max_new_tokens": 8}}
+    for task in ("ranking", "matching"):
+        results = [_record(rng, task, i) for i in range(n)]
+        out[task] = {"summary": {"answer_mode": mode, "split": split, "task": task}, "results": results}
+    return out
+
+
+def _flat(seed, n=40):
+    nested = _nested(seed, n)
+    return {"summary": {"split": "test"}, "results": nested["ranking"]["results"] + nested["matching"]["results"]}
+
+
+@pytest.mark.parametrize("layout", [_nested, _flat])
+def test_roundtrip(tmp_path, layout):
+    data = layout(1)
+    src = tmp_path / "run.json"
+    src.write_text(json.dumps(data))
+    run = ColumnarRun(convert(src, tmp_path / "run.npz"))
+    originals = data["results"] if "results" in data else data["ranking"]["results"] + data["matching"]["results"]
+    expected = [dict(r, contest_number=int(r["contest_number"])) for r in originals]
+    assert list(run.records()) == expected
+    assert run.meta["split"] == "test"
+
+
+def test_string_correctness_of_older_runs(tmp_path):
+    data = _flat(3, n=4)
+    for rec in data["results"]:
+        rec["is_correct"] = str(rec["is_correct"])
+    src = tmp_path / "old.json"
+    src.write_text(json.dumps(data))
+    run = ColumnarRun(convert(src, tmp_path / "old.npz"))
+    assert [r["is_correct"] for r in run.records()] == [r["is_correct"] == "True" for r in data["results"]]
+
+
+def test_group_stats_match_python_loop(tmp_path):
+    paths = []
+    for seed, split in enumerate(["test", "test_hard", "test"]):
+        p = tmp_path / f"r{seed}.json"
+        p.write_text(json.dumps(_nested(seed, split=split)))
+        paths.append(p)
+    rows = group_stats(load_runs(paths, tmp_path / "cache"), by=("split", "task"), n_boot=200)
+    for row in rows:
+        recs = [
+            r
+            for p in paths
+            for d in [json.loads(p.read_text())]
+            if d["meta"]["split"] == row["split"]
+            for r in d[row["task"]]["results"]
+        ]
+        assert row["total"] == len(recs)
+        assert row["correct"] == sum(r["is_correct"] for r in recs)
+        assert row["unknown"] == sum(r["extracted_answer"] == "Unknown" for r in recs)
+        assert row["ci_low"] <= row["accuracy"] <= row["ci_high"]
+    assert {(r["split"], r["task"]) for r in rows} == {(s, t) for s in ("test", "test_hard") for t in ("ranking", "matching")}
+
+
+def test_stale_cache_is_reconverted(tmp_path):
+    src = tmp_path / "run.json"
+    src.write_text(json.dumps(_nested(0, n=3)))
+    first = ensure_columnar(src)
+    assert len(ColumnarRun(first)) == 6
+    src.write_text(json.dumps(_nested(0, n=5)))
+    os.utime(src, (first.stat().st_mtime + 10, first.stat().st_mtime + 10))
+    assert len(ColumnarRun(ensure_columnar(src))) == 10
+
+
+def test_hundred_runs_under_a_second(tmp_path):
+    paths = []
+    for seed in range(100):
+        p = tmp_path / f"r{seed}.json"
+        p.write_text(json.dumps(_nested(seed, n=350)))
+        paths.append(convert(p, tmp_path / f"r{seed}.npz"))
+    start = time.perf_counter()
+    rows = group_stats(load_runs(paths), by=("run", "task"), n_boot=1000)
+    assert time.perf_counter() - start < 1.0
+    assert len(rows) == 200
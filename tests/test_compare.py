@@ -0,0 +1,74 @@
+import json
+import math
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from humor_eval.compare import ComparisonIndex, build_index, mcnemar_exact, pairwise
+
+
+def _run(path, correct, order=None, split="test"):
+    items = [
+        {
+            "contest_number": 600 + i,
+            "problem": f"problem {i}",
+            "correct_answer": "A",
+            "model_answer": "A" if ok else "B",
+            "reasoning": "",
+            "extracted_answer": "A" if ok else "B",
+            "task": "ranking" if i % 2 else "matching",
+            "is_correct": ok,
+        }
+        for i, ok in enumerate(correct)
+    ]
+    if order is not None:
+        items = [items[k] for k in order]
+    path.write_text(json.dumps({"summary": {"split": split}, "results": items}))
+    return path
+
+
+def test_join_ignores_order_and_counts_helped_hurt(tmp_path):
+    rng = random.Random(0)
+    a = [rng.random() < 0.5 for _ in range(50)]
+    b = [rng.random() < 0.6 for _ in range(50)]
+    order = list(range(50))
+    rng.shuffle(order)
+    paths = [_run(tmp_path / "a.json", a), _run(tmp_path / "b.json", b, order=order)]
+    index = build_index(paths)
+    counts = index.pair_counts()
+    assert counts["helped"][0, 1] == sum((not x) and y for x, y in zip(a, b))
+    assert counts["hurt"][0, 1] == sum(x and not y for x, y in zip(a, b))
+    [row] = pairwise(index, n_boot=500)
+    assert row["shared"] == 50
+    assert row["acc_a"] == pytest.approx(sum(a) / 50) and row["acc_b"] == pytest.approx(sum(b) / 50)
+    assert row["ci_low"] <= row["diff"] <= row["ci_high"]
+
+
+def test_mcnemar_matches_direct_binomial():
+    def direct(b, c):
+        m = b + c
+        if m == 0:
+            return 1.0
+        tail = sum(math.comb(m, k) for k in range(min(b, c) + 1)) / 2**m
+        return min(1.0, 2 * tail)
+
+    b = np.array([0, 3, 10, 25, 7])
+    c = np.array([0, 9, 10, 4, 30])
+    assert mcnemar_exact(b, c) == pytest.approx([direct(x, y) for x, y in zip(b, c)])
+
+
+def test_incremental_index_matches_fresh_build(tmp_path):
+    rng = random.Random(1)
+    paths = [_run(tmp_path / f"r{k}.json", [rng.random() < 0.5 for _ in range(30)]) for k in range(3)]
+    paths.append(_run(tmp_path / "hard.json", [True] * 10, split="test_hard"))
+    index_path = tmp_path / "index.npz"
+    build_index(paths[:2], index_path)
+    grown = build_index(paths, index_path)
+    fresh = build_index(paths)
+    assert grown.names == fresh.names
+    for name in ("shared", "helped", "hurt"):
+        assert (grown.pair_counts()[name] == fresh.pair_counts()[name]).all()
+    # Runs on different splits share no items, so they form no pair.
+    assert len(pairwise(ComparisonIndex.load(index_path), n_boot=10)) == 3
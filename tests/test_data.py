@@ -0,0 +1,65 @@
+import pytest
+
+datasets = pytest.importorskip("datasets")
+
+from PIL import Image
+
+import humor_eval.data as data
+
+
+def _fake_split():
+    rows = [("matching", 10), ("ranking", 11), ("other", 12), ("ranking", 13), ("matching", 14)]
+    features = datasets.Features(
+        {
+            "images": datasets.Image(),
+            "task": datasets.Value("string"),
+            "contest_number": datasets.Value("int64"),
+            "problem": datasets.Value("string"),
+            "answer": datasets.Value("string"),
+        }
+    )
+    return datasets.Dataset.from_dict(
+        {
+            "images": [Image.new("RGB", (4 + i, 4), (i * 40, 0, 0)) for i in range(len(rows))],
+            "task": [t for t, _ in rows],
+            "contest_number": [c for _, c in rows],
+            "problem": [f"problem {c}" for _, c in rows],
+            "answer": ["A"] * len(rows),
+        },
+        features=features,
+    )
+
+
+def test_lazy_order_matches_eager(monkeypatch, tmp_path):
+    ds = _fake_split()
+    monkeypatch.setattr(data, "load_dataset", lambda name, split: ds)
+    lazy = data.load_entries("test", index_dir=tmp_path)
+    eager = data.load_entries_eager("test")
+    assert len(lazy) == len(eager) == 4
+    assert [e["contest_number"] for e in lazy] == [e["contest_number"] for e in eager] == [11, 13, 10, 14]
+    assert lazy.tasks == ["ranking", "ranking", "matching", "matching"]
+    assert lazy[3]["images"].size == eager[3]["images"].size == (8, 4)
+
+
+def test_meta_and_subset_skip_images(monkeypatch, tmp_path):
+    monkeypatch.setattr(data, "load_dataset", lambda name, split: _fake_split())
+    entries = data.load_entries("test", index_dir=tmp_path)
+    assert "images" not in data.entry_meta(entries, 0)
+    sub = data.select(entries, [3, 0])
+    assert [data.entry_meta(sub, i)["contest_number"] for i in range(len(sub))] == [14, 11]
+    assert sub[0]["images"].size == (8, 4)
+    assert data.select([{"a": 1}, {"a": 2}], [1]) == [{"a": 2}]
+
+
+def test_index_is_cached_on_disk(monkeypatch, tmp_path):
+    ds = _fake_split()
+    monkeypatch.setattr(data, "load_dataset", lambda name, split: ds)
+    first = data.load_entries("test", index_dir=tmp_path)
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    def fail(_):
+        raise AssertionError("index should come from disk")
+
+    monkeypatch.setattr(data, "_build_index", fail)
+    second = data.load_entries("test", index_dir=tmp_path)
+    assert second.contest_numbers == first.contest_numbers
@@ -0,0 +1,79 @@
+import json
+import time
+
+import pytest
+
+from humor_eval.heartbeat import Heartbeat, main, prometheus_text, read_heartbeats, stale
+
+
+def _rec(task, correct, answer="A", tokens=None):
+    rec = {"task": task, "is_correct": correct, "extracted_answer": answer}
+    if tokens is not None:
+        rec["perf"] = {"generated_tokens": tokens}
+    return rec
+
+
+def test_counters_rates_and_prometheus(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_ARRAY_TASK_ID", "3")
+    hb = Heartbeat(tmp_path / "hb.json", tmp_path / "hb.prom", interval_s=3600, window=2, labels={"split": "test", "shard": None})
+    hb.start("simple", total=10, skipped=4)
+    assert json.loads((tmp_path / "hb.json").read_text())["items_done"] == 0
+    for rec in (_rec("ranking", True, tokens=5), _rec("ranking", False, "Unknown", tokens=7), _rec("ranking", False, tokens=3)):
+        hb.update("simple", rec)
+    assert json.loads((tmp_path / "hb.json").read_text())["items_done"] == 0  # within the interval: no write
+    hb.close()
+    snap = json.loads((tmp_path / "hb.json").read_text())
+    assert snap["state"] == "done" and snap["items_done"] == 3 and snap["items_total"] == 10
+    assert snap["labels"] == {"slurm_array_task_id": "3", "split": "test"}
+    assert snap["generated_tokens"] == 15 and snap["tokens_per_s"] > 0 and snap["eta_s"] > 0
+    task = snap["tasks"]["simple/ranking"]
+    assert task["accuracy"] == pytest.approx(1 / 3) and task["unknown_rate"] == pytest.approx(1 / 3)
+    assert task["recent_accuracy"] == 0.0 and task["recent_unknown_rate"] == 0.5
+    prom = (tmp_path / "hb.prom").read_text()
+    assert prom == prometheus_text(snap)
+    assert 'humor_eval_items_done{slurm_array_task_id="3",split="test",host=' in prom
+    assert 'humor_eval_running{' in prom and prom.count("humor_eval_task_accuracy{") == 1
+
+
+def test_update_is_cheap_between_writes(tmp_path):
+    hb = Heartbeat(tmp_path / "hb.json", interval_s=3600)
+    hb.start("reasoned", total=20000)
+    rec = _rec("matching", True)
+    start = time.perf_counter()
+    for _ in range(20000):
+        hb.update("reasoned", rec)
+    assert (time.perf_counter() - start) / 20000 < 50e-6 and hb.writes == 1
+
+
+def test_watch_flags_stale_running_jobs(tmp_path, capsys):
+    Heartbeat(tmp_path / "done.json").close()
+    running = Heartbeat(tmp_path / "running.json")
+    running.start("simple", total=5)
+    (tmp_path / "other.json").write_text("{}")
+    snaps = read_heartbeats([tmp_path])
+    assert [s["state"] for s in snaps] == ["done", "running"]
+    assert stale(snaps[1], 60, now=snaps[1]["updated"] + 61) and not stale(snaps[0], 60, now=snaps[0]["updated"] + 61)
+    with pytest.raises(SystemExit) as exc:
+        main(["watch", str(tmp_path), "--stale_s", "600"])
+    assert exc.value.code == 0
+    with pytest.raises(SystemExit) as exc:
+        main(["watch", str(tmp_path), "--stale_s", "-1"])
+    assert exc.value.code == 1 and "STALE" in capsys.readouterr().out
+
+
+def test_run_dual_writes_heartbeat(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.run_dual as run_dual_mod
+    from humor_eval.tiny_model import build_stub_model, synthetic_entries
+
+    monkeypatch.setattr(run_dual_mod, "load_entries", lambda split: synthetic_entries(4))
+    monkeypatch.setattr(run_dual_mod, "load_model", lambda device=None, **options: build_stub_model())
+    run_dual_mod.run_dual(
+        max_new_tokens=80, output_dir=str(tmp_path), show_progress=False, profile=True,
+        heartbeat=str(tmp_path / "hb" / "dual.json"), heartbeat_prom=str(tmp_path / "hb" / "dual.prom"), heartbeat_s=0,
+    )
+    snap = json.loads((tmp_path / "hb" / "dual.json").read_text())
+    assert snap["state"] == "done" and snap["items_total"] == 8 and snap["items_done"] == 8
+    assert set(snap["tasks"]) == {"simple/ranking", "simple/matching", "reasoned/ranking", "reasoned/matching"}
+    assert snap["tokens_per_s"] > 0 and snap["labels"]["runner"] == "dual" and snap["heartbeat_writes"] >= 8
+    assert (tmp_path / "hb" / "dual.prom").exists()
@@ -0,0 +1,19 @@
+import pytest
+
+from humor_eval.imports import LIGHT_MODULES, import_profile
+
+
+def test_light_modules_import_without_heavy_dependencies():
+    profile = import_profile(LIGHT_MODULES)
+    assert profile["heavy"] == [], f"heavy modules on the light import path: {profile['heavy']}"
+    assert "humor_eval" in profile["packages"]
+
+
+def test_cli_help_does_not_load_the_model_stack():
+    for module in ("humor_eval.cli", "humor_eval.rescore", "humor_eval.run_simple", "humor_eval.run_dual", "humor_eval.sweep", "humor_eval.shard"):
+        assert import_profile(command=["-m", module, "--help"])["heavy"] == []
+
+
+def test_heavy_imports_are_detected():
+    pytest.importorskip("torch")
+    assert "torch" in import_profile(["humor_eval.evaluate"])["heavy"]
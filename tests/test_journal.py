@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from humor_eval.journal import JournalFold, ResultJournal, completed_keys, read_journal, write_json
+
+
+def _rec(task, correct, answer="A"):
+    return {"task": task, "is_correct": correct, "model_answer": answer, "problem": "café “quote”"}
+
+
+def test_write_json_matches_json_dumps(tmp_path):
+    payload = {
+        "summary": {"accuracy": 0.4364963503649635, "task": None, "empty": {}},
+        "results": iter([{"a": [1, 2, {"b": []}]}, {"c": True}]),
+        "none": iter([]),
+        "meta": {"split": "test"},
+    }
+    expected = json.dumps({**payload, "results": [{"a": [1, 2, {"b": []}]}, {"c": True}], "none": []}, indent=2)
+    write_json(tmp_path / "out.json", payload)
+    assert (tmp_path / "out.json").read_text() == expected
+
+
+def test_fold_orders_by_index_and_last_write_wins(tmp_path):
+    path = tmp_path / "j.jsonl"
+    params = {"model_id": "m", "max_new_tokens": 8}
+    with ResultJournal(path, fsync_every=2) as jr:
+        jr.append("test", 3, "simple", params, _rec("ranking", False, "B"))
+        jr.append("test", 1, "simple", params, _rec("ranking", True))
+        jr.append("test", 3, "simple", params, _rec("ranking", True, "C"))
+        jr.append("test", 2, "simple", {"model_id": "m", "max_new_tokens": 16}, _rec("ranking", True))
+        jr.append("test", 4, "reasoned", params, _rec("matching", True))
+    fold = JournalFold(path, "test", "simple", params)
+    assert fold.counts("ranking") == (2, 2)
+    assert [r["model_answer"] for r in fold.results("ranking")] == ["A", "C"]
+    assert fold.counts("matching") == (0, 0)
+    assert list(fold.results("matching")) == []
+    assert len(completed_keys(path)) == 4
+
+
+def test_torn_trailing_line_is_ignored(tmp_path):
+    path = tmp_path / "j.jsonl"
+    with ResultJournal(path) as jr:
+        jr.append("test", 0, "simple", {}, _rec("ranking", True))
+    with open(path, "a") as fh:
+        fh.write('{"split": "test", "task": "rank')
+    assert len(list(read_journal(path))) == 1
+
+
+def test_append_after_torn_tail_starts_a_fresh_line(tmp_path):
+    path = tmp_path / "j.jsonl"
+    params = {"model_id": "m"}
+    with ResultJournal(path) as jr:
+        jr.append("test", 0, "simple", params, _rec("ranking", True))
+    with open(path, "a") as fh:
+        fh.write('{"split": "test", "task": "rank')
+    with ResultJournal(path) as jr:
+        jr.append("test", 1, "simple", params, _rec("ranking", False))
+        jr.append("test", 2, "simple", params, _rec("ranking", True))
+    assert JournalFold(path, "test", "simple", params).indices("ranking") == [0, 1, 2]
+    assert path.read_text().count("\n") == 3
+
+
+def test_run_simple_resume_matches_clean_run(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.evaluate as evaluate
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+    tiny = build_tiny_model()
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(6))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: tiny)
+    clean = run_simple_mod.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "clean"), show_progress=False)
+
+    real_infer = evaluate.generate_response
+    calls = {"n": 0}
+
+    def crashing_infer(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 4:
+            raise RuntimeError("simulated OOM")
+        return real_infer(*args, **kwargs)
+
+    monkeypatch.setattr(evaluate, "generate_response", crashing_infer)
+    with pytest.raises(RuntimeError):
+        run_simple_mod.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "crash"), show_progress=False)
+    monkeypatch.setattr(evaluate, "generate_response", real_infer)
+    resumed = run_simple_mod.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "crash"), show_progress=False, resume=True)
+
+    def body(path):
+        data = json.loads(open(path).read())
+        del data["meta"]["generated_at"]
+        return data
+
+    assert body(resumed) == body(clean)
+    journal = tmp_path / "crash" / "results_simple_only_test.journal.jsonl"
+    assert len(list(read_journal(journal))) == 6
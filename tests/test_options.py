@@ -0,0 +1,52 @@
+import argparse
+
+import pytest
+
+from humor_eval.options import EvalOptions, add_eval_args
+
+
+def _parse(*argv):
+    ap = argparse.ArgumentParser()
+    add_eval_args(ap)
+    return EvalOptions.from_args(ap.parse_args(list(argv)))
+
+
+def test_flags_and_fields_agree():
+    assert _parse() == EvalOptions()
+    o = _parse("--no_progress", "--num_samples", "3", "--max_image_side", "448", "--baseline", "a.json", "b.json")
+    assert not o.show_progress and o.num_samples == 3 and o.baseline == ["a.json", "b.json"]
+    assert o.image() == {"max_side": 448} and EvalOptions().image() is None
+
+
+def test_worker_options_keep_everything_but_shard_and_device():
+    o = EvalOptions(num_workers=4, early_stop=True, max_image_tiles=2)
+    w = o.worker("1/4", "cuda:1")
+    assert (w.shard, w.device, w.num_workers, w.show_progress) == ("1/4", "cuda:1", 1, False)
+    assert w.early_stop and w.max_image_tiles == 2
+
+
+def test_cpu_workers_split_the_cores(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 16)
+    o = EvalOptions(num_workers=4)
+    assert o.worker("0/4", "cpu").threads == 4
+    assert o.worker("0/4", "cuda:0").threads is None
+    assert EvalOptions(num_workers=4, threads=2).worker("0/4", "cpu").threads == 2
+
+
+@pytest.mark.parametrize("options, match", [
+    (dict(num_workers=2, shard="0/2"), "mutually exclusive"),
+    (dict(adaptive=True, batch_size=4), "--adaptive"),
+    (dict(baseline=["a.json"]), "--baseline needs --adaptive"),
+    (dict(heuristic_stop=True), "--heuristic_stop needs --early_stop"),
+    (dict(draft_model="tiny", server_url="http://x"), "--draft_model"),
+    (dict(num_samples=3, response_cache="c.sqlite"), "--num_samples"),
+])
+def test_validate_rejects_unsupported_combinations(options, match):
+    with pytest.raises(ValueError, match=match):
+        EvalOptions(**options).validate()
+
+
+def test_heuristic_stop_keys_apart_from_answer_stop():
+    answer = EvalOptions(early_stop=True).params("simple")
+    heuristic = EvalOptions(early_stop=True, heuristic_stop=True).params("simple")
+    assert answer["early_stop"] is True and heuristic["early_stop"] == "heuristic"
@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from humor_eval.models import prepare_batch_inputs, prepare_inputs
+from humor_eval.pixel_cache import PixelCache, attach_pixel_cache, cache_stats, namespace, precompute, prune
+from humor_eval.tiny_model import build_tiny_model, build_tiny_processor, synthetic_entries
+
+
+def _same(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        assert torch.equal(a[key], b[key]), key
+
+
+def test_cached_inputs_match_processor(tmp_path):
+    entries = synthetic_entries(6)
+    plain = build_tiny_processor()
+    cached = build_tiny_processor()
+    cache = attach_pixel_cache(cached, tmp_path)
+    for _ in range(2):  # misses, then memory-mapped hits
+        for e in entries:
+            _same(prepare_inputs(cached, e["images"], e["problem"]), prepare_inputs(plain, e["images"], e["problem"]))
+        images, texts = [e["images"] for e in entries], [e["problem"] for e in entries]
+        _same(prepare_batch_inputs(cached, images, texts), prepare_batch_inputs(plain, images, texts))
+    assert cache.misses == 6 and cache.hits == 6 * 3
+    assert isinstance(cache.get(next(iter(cache.dir.glob("*/*.npy"))).stem)["tiles"], np.memmap)
+    assert attach_pixel_cache(cached, tmp_path) is cache
+
+
+def test_namespace_changes_with_processor_and_model(tmp_path):
+    processor = build_tiny_processor()
+    base = namespace(processor.image_processor)
+    assert namespace(processor.image_processor, "other/model") != base
+    processor.image_processor.max_image_tiles = 1
+    assert namespace(processor.image_processor) != base
+    PixelCache(tmp_path, processor.image_processor).entry(synthetic_entries(1)[0]["images"])
+    assert prune(tmp_path, base) == [namespace(processor.image_processor)]
+    assert cache_stats(tmp_path) == {}
+
+
+def test_precompute_dedupes_and_runs_in_workers(tmp_path, monkeypatch):
+    import humor_eval.shard as shard
+
+    monkeypatch.setattr(shard, "START_METHOD", "fork")
+    entries = synthetic_entries(6)
+    for e in entries[1:3]:
+        e["images"] = entries[0]["images"]  # one cartoon shared by contest 500
+    image_processor = build_tiny_processor().image_processor
+    counts = precompute(entries, image_processor, tmp_path, workers=2)
+    assert counts == {"hits": 2, "misses": 4}
+    assert [s["entries"] for s in cache_stats(tmp_path).values()] == [4]
+    assert precompute(entries, image_processor, tmp_path, workers=1) == {"hits": 6, "misses": 0}
+
+
+def test_run_simple_with_pixel_cache_keeps_results(tmp_path, monkeypatch):
+    import humor_eval.run_simple as run_simple_mod
+
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(4))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: build_tiny_model())
+    plain = json.loads(open(run_simple_mod.run_simple(max_new_tokens=4, output_dir=str(tmp_path / "a"), show_progress=False)).read())
+    for run in ("b", "c"):
+        out = run_simple_mod.run_simple(
+            max_new_tokens=4, output_dir=str(tmp_path / run), show_progress=False, pixel_cache=str(tmp_path / "pixels")
+        )
+        data = json.loads(open(out).read())
+        assert data["ranking"] == plain["ranking"] and data["matching"] == plain["matching"]
+    assert data["meta"]["pixel_cache"]["hits"] == 4 and data["meta"]["pixel_cache"]["misses"] == 0
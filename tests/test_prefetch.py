@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+
+from humor_eval.evaluate import evaluate_entries
+from humor_eval.prefetch import Prefetcher
+from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+
+def test_map_preserves_order_and_bounds_inflight():
+    prefetcher = Prefetcher(depth=3, workers=3, pin_memory=False)
+    lock = threading.Lock()
+    live = {"now": 0, "max": 0}
+
+    def work(job):
+        with lock:
+            live["now"] += 1
+            live["max"] = max(live["max"], live["now"])
+        time.sleep(0.01 * (job % 3))
+        return job * 2
+
+    out = []
+    for result in prefetcher.map(work, range(12)):
+        with lock:
+            live["now"] -= 1
+        out.append(result)
+    assert out == [j * 2 for j in range(12)]
+    assert live["max"] <= 3 + 1  # depth queued plus the one being consumed
+    assert prefetcher.counts["wait"] == 12
+
+
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_prefetched_results_match_plain(batch_size):
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(7)
+    plain = evaluate_entries(entries, processor, model, "simple", max_new_tokens=8, batch_size=batch_size, show_progress=False)
+    prefetcher = Prefetcher(depth=2, workers=2)
+    fetched = evaluate_entries(entries, processor, model, "simple", max_new_tokens=8, batch_size=batch_size, show_progress=False, prefetcher=prefetcher)
+    assert fetched == plain
+    summary = prefetcher.summary()
+    assert {"decode", "preprocess", "wait", "h2d", "generate"} <= set(summary["seconds"])
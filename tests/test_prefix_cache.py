@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from humor_eval.evaluate import contest_order, evaluate_entries
+from humor_eval.prefix_cache import PrefixCache, image_hash
+from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+
+def test_contest_order_groups_first_seen():
+    entries = [{"contest_number": c} for c in [3, 1, 3, 2, 1]]
+    assert contest_order(entries) == [0, 2, 1, 4, 3]
+
+
+def test_image_hash_is_content_based():
+    a, b = synthetic_entries(2)
+    assert image_hash(a["images"]) == image_hash(a["images"].copy())
+    assert image_hash(a["images"]) != image_hash(b["images"])
+
+
+def test_cached_run_matches_uncached_across_modes():
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(4)
+    entries = entries + [dict(e, problem=e["problem"] + "Extra.") for e in entries]  # same images reused
+    cache = PrefixCache()
+    for mode in ("simple", "reasoned"):
+        plain = evaluate_entries(entries, processor, model, mode, max_new_tokens=10, show_progress=False)
+        cached = evaluate_entries(entries, processor, model, mode, max_new_tokens=10, show_progress=False, prefix_cache=cache, group_by_contest=True)
+        assert cached == plain
+    stats = cache.summary()
+    # 4 distinct images; everything else (second problem, second mode) hits.
+    assert stats["misses"] == 4
+    assert stats["hits"] == 12
+    assert stats["hit_rate"] == pytest.approx(0.75)
+
+
+def test_lru_eviction_respects_budget():
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(3)
+    cache = PrefixCache(max_bytes=1)
+    evaluate_entries(entries, processor, model, "simple", max_new_tokens=4, show_progress=False, prefix_cache=cache)
+    assert len(cache) == 1
+    assert cache.summary()["evictions"] == 2
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from humor_eval.profiling import summarize_perf
+
+torch = pytest.importorskip("torch")
+
+from humor_eval.models import prepare_batch_inputs
+from humor_eval.profiling import Profiler
+from humor_eval.tiny_model import build_stub_model, build_tiny_model, synthetic_entries
+
+
+def _perf(latency, tokens):
+    return {
+        "prompt_tokens": 10, "generated_tokens": tokens, "batch_size": 1, "preprocess_s": 0.0,
+        "ttft_s": latency / 2, "decode_s": latency / 2, "peak_host_mb": 1.0, "peak_device_mb": 0.0,
+    }
+
+
+def test_summarize_perf_percentiles_and_slowest():
+    records = [{"contest_number": i, "perf": _perf(float(i), 10)} for i in range(1, 11)] + [{"contest_number": 99}]
+    summary = summarize_perf(records, slowest=2)
+    assert summary["items"] == 10
+    assert summary["latency_s"]["p50"] == pytest.approx(5.5)
+    assert summary["latency_s"]["max"] == 10.0
+    assert summary["tokens_per_s"] == pytest.approx(100 / 55)
+    assert [s["contest_number"] for s in summary["slowest"]] == [10, 9]
+
+
+def test_timer_counts_rows_up_to_eos_and_skips_padding():
+    processor, model = build_stub_model()
+    entries = synthetic_entries(3)
+    inputs = prepare_batch_inputs(processor, [e["images"] for e in entries], [e["problem"] for e in entries])
+    profiler = Profiler()
+    timer = profiler.timer(model)
+    out = model.generate(**inputs, max_new_tokens=200, streamer=timer)
+    perfs = profiler.finish(timer, entries, "simple")
+
+    prompt_len = inputs["input_ids"].shape[-1]
+    eos = processor.tokenizer.eos_token_id
+    for row, perf in enumerate(perfs):
+        generated = out[row, prompt_len:].tolist()
+        assert perf["generated_tokens"] == generated.index(eos) + 1
+        assert perf["prompt_tokens"] == int(inputs["attention_mask"][row].sum())
+        assert perf["batch_size"] == 3
+    assert [e["ph"] for e in profiler.events] == ["M", "X", "X", "X", "X"]
+
+
+def test_profiled_run_keeps_results_and_writes_trace(tmp_path, monkeypatch):
+    import humor_eval.run_simple as run_simple_mod
+
+    tiny = build_tiny_model()
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(4))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: tiny)
+    plain = json.loads(open(run_simple_mod.run_simple(max_new_tokens=5, output_dir=str(tmp_path / "a"), show_progress=False)).read())
+    out = run_simple_mod.run_simple(
+        max_new_tokens=5, output_dir=str(tmp_path / "b"), show_progress=False, batch_size=2, trace=str(tmp_path / "trace.json")
+    )
+    profiled = json.loads(open(out).read())
+    for task in ("ranking", "matching"):
+        recs = profiled[task]["results"]
+        assert all(r.pop("perf")["generated_tokens"] <= 5 for r in recs)
+        assert recs == plain[task]["results"]
+        assert profiled[task]["summary"]["perf"]["items"] == 2
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    slices = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert {e["name"] for e in slices} >= {"preprocess", "prefill", "decode"}
+    assert all(e["dur"] >= 0 for e in slices)
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("torch")
+
+from humor_eval.remote import RemoteBackend, RemoteError
+from humor_eval.tiny_model import synthetic_entries
+
+
+class StandIn(ThreadingHTTPServer):
+    """Chat-completions stand-in: answers ``<answer>X</answer>`` with X taken
+    from the prompt length, after ``latency`` seconds; the first ``fail``
+    requests get a 503."""
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, latency=0.0, fail=0, status=503):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency, self.fail, self.status = latency, fail, status
+        self.requests = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    @staticmethod
+    def answer(prompt):
+        return "ABCDE"[len(prompt) % 5]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append((self.path, body))
+            failing = server.fail > 0
+            server.fail -= failing
+        time.sleep(server.latency)
+        if failing:
+            payload, status = b'{"error": "busy"}', server.status
+        else:
+            prompt = body["messages"][0]["content"][1]["text"]
+            text = f"<answer>{StandIn.answer(prompt)}</answer>"
+            payload, status = json.dumps({"choices": [{"message": {"role": "assistant", "content": text}}]}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def _items(n):
+    return [(e["images"], e["problem"]) for e in synthetic_entries(n)]
+
+
+def test_map_is_in_order_and_reuses_connections():
+    server = StandIn(latency=0.01)
+    items = _items(12)
+    with RemoteBackend(server.url, "m", concurrency=3) as backend:
+        responses = list(backend.map(items, max_new_tokens=7, answer_mode="reasoned"))
+        stats = dict(backend.stats)
+    prompts = {body["messages"][0]["content"][1]["text"] for _, body in server.requests}
+    assert len(prompts) == 12
+    from humor_eval.models import _build_prompt
+
+    assert responses == [f"<answer>{StandIn.answer(_build_prompt(t, 'reasoned'))}</answer>" for _, t in items]
+    path, body = server.requests[0]
+    assert path == "/v1/chat/completions" and body["max_tokens"] == 7 and body["model"] == "m"
+    assert body["messages"][0]["content"][0]["image_url"]["url"].startswith("data:image/png;base64,")
+    assert stats["requests"] == 12 and stats["connections"] <= 3
+    server.shutdown()
+
+
+def test_throughput_scales_with_concurrency():
+    server = StandIn(latency=0.05)
+    items = _items(16)
+    elapsed = {}
+    for concurrency in (1, 8):
+        with RemoteBackend(server.url, concurrency=concurrency) as backend:
+            start = time.perf_counter()
+            list(backend.map(items, max_new_tokens=4))
+            elapsed[concurrency] = time.perf_counter() - start
+    assert elapsed[1] >= 16 * 0.05
+    assert elapsed[1] / elapsed[8] > 3
+    server.shutdown()
+
+
+def test_retries_then_gives_up():
+    server = StandIn(fail=2)
+    with RemoteBackend(server.url, concurrency=1, backoff=0.001) as backend:
+        assert backend.chat_infer(*_items(1)[0]).startswith("<answer>")
+        assert backend.stats["retries"] == 2
+    server.fail = 10
+    with RemoteBackend(server.url, concurrency=1, max_retries=1, backoff=0.001) as backend:
+        with pytest.raises(RemoteError):
+            backend.chat_infer(*_items(1)[0])
+    server.fail, server.status = 1, 400
+    with RemoteBackend(server.url, concurrency=1, backoff=0.001) as backend:
+        with pytest.raises(RemoteError, match="400"):
+            backend.chat_infer(*_items(1)[0])
+        assert backend.stats["retries"] == 0
+    server.shutdown()
+
+
+def test_run_dual_against_server(tmp_path, monkeypatch):
+    import humor_eval.run_dual as run_dual_mod
+
+    server = StandIn(latency=0.005)
+    entries = synthetic_entries(6)
+    monkeypatch.setattr(run_dual_mod, "load_entries", lambda split: entries)
+    monkeypatch.setattr(run_dual_mod, "load_model", lambda device=None, **options: pytest.fail("model must not be loaded"))
+    out_simple, out_reasoned = run_dual_mod.run_dual(
+        max_new_tokens=5, output_dir=str(tmp_path), show_progress=False, server_url=server.url, concurrency=4
+    )
+    data = json.loads(open(out_reasoned).read())
+    assert data["meta"]["remote"]["requests"] == 12
+    got = [r["problem"] for task in ("ranking", "matching") for r in data[task]["results"]]
+    assert got == [e["problem"] for e in entries if e["task"] == "ranking"] + [e["problem"] for e in entries if e["task"] == "matching"]
+    assert all(r["extracted_answer"] in "ABCDE" for r in data["ranking"]["results"])
+    server.shutdown()
+
+
+def _no_hub_config():
+    raise AssertionError("remote runs must not load the local generation config")
+
+
+def test_journal_and_response_cache_key_on_the_served_model(tmp_path, monkeypatch):
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.journal import read_journal
+
+    server = StandIn()
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(4))
+    monkeypatch.setattr(run_simple_mod, "load_generation_config", _no_hub_config)
+    options = dict(
+        max_new_tokens=5, output_dir=str(tmp_path), show_progress=False, server_url=server.url,
+        response_cache=str(tmp_path / "responses.sqlite"),
+    )
+    run_simple_mod.run_simple(server_model="small", **options)
+    run_simple_mod.run_simple(server_model="large", resume=True, **options)
+    # A fresh journal for "small" is filled from the response cache.
+    run_simple_mod.run_simple(server_model="small", journal=str(tmp_path / "again.journal.jsonl"), **options)
+    assert [body["model"] for _, body in server.requests] == ["small"] * 4 + ["large"] * 4
+    journal = tmp_path / "results_simple_only_test.journal.jsonl"
+    assert sorted(rec["generation"]["model_id"] for _, rec in read_journal(journal)) == ["large"] * 4 + ["small"] * 4
+    server.shutdown()
+
+
+def test_remote_and_local_runs_of_one_model_do_not_share_keys(tmp_path, monkeypatch):
+    from transformers import GenerationConfig
+
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.journal import read_journal
+    from humor_eval.tiny_model import build_tiny_model
+
+    tiny = build_tiny_model()
+    server = StandIn()
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(3))
+    monkeypatch.setattr(run_simple_mod, "load_generation_config", GenerationConfig)
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: tiny)
+    options = dict(
+        max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, resume=True,
+        response_cache=str(tmp_path / "responses.sqlite"),
+    )
+    run_simple_mod.run_simple(**options)
+    # The default --server_model is MODEL_ID, yet the server decodes differently.
+    out = run_simple_mod.run_simple(server_url=server.url, **options)
+    assert len(server.requests) == 3
+    assert json.load(open(out))["meta"]["response_cache"]["hits"] == 0
+    backends = [rec["generation"].get("backend") for _, rec in read_journal(tmp_path / "results_simple_only_test.journal.jsonl")]
+    assert backends == [None] * 3 + ["remote"] * 3
+    server.shutdown()
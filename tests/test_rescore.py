@@ -0,0 +1,92 @@
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from humor_eval.parsing import extract_answer, parse_model_response, scan_response
+from humor_eval.rescore import bench, rescore_files
+
+REPO_RESULTS = Path(__file__).resolve().parents[1] / "results.json"
+
+_TOKENS = [
+    "<think>", "</think>", "<reasoning>", "</reasoning>", "<answer>", "</answer>", "<Conclusion>",
+    "</CONCLUSION>", "<|begin_of_box|>", "<|end_of_box|>", "A", "B", "E", "F", "AB", " ", "\n", "x", "<", ">", "/",
+]
+
+
+def _old(text):
+    reasoning, segment = parse_model_response(text)
+    return reasoning, segment, extract_answer(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "B",
+        " C \n",
+        "<think>some reasoning here</think><answer> C </answer>",
+        "Random text <|begin_of_box|>D<|end_of_box|> also <answer> B </answer>",
+        "Some analysis chooses A then revises to E",
+        "No valid choice here: Z or Q",
+        "<answer>none</answer> <conclusion>D</conclusion> then A",
+        "<answer>B</answer><answer>C</answer>",
+        "<REASONING>r</reasoning><think>t</think>",
+        "<answer> unterminated A",
+    ],
+)
+def test_scan_matches_old_parsers(text):
+    assert scan_response(text) == _old(text)
+
+
+def test_scan_matches_old_parsers_fuzz():
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = "".join(rng.choice(_TOKENS) for _ in range(rng.randint(0, 20)))
+        assert scan_response(text) == _old(text), text
+
+
+@pytest.mark.skipif(not REPO_RESULTS.exists(), reason="no results.json in the repo")
+def test_bench_on_repo_results_agrees():
+    assert bench(REPO_RESULTS, repeat=1)["mismatches"] == 0
+
+
+def _rec(task, answer, text, extracted):
+    return {
+        "contest_number": 1,
+        "problem": "p",
+        "correct_answer": answer,
+        "model_answer": text,
+        "reasoning": "",
+        "extracted_answer": extracted,
+        "task": task,
+        "is_correct": extracted == answer,
+    }
+
+
+def test_rescore_rewrites_and_diffs(tmp_path):
+    stale = _rec("ranking", "A", "<think>t</think><answer>A</answer>", "B")
+    fine = _rec("ranking", "B", "B", "B")
+    scored = dict(_rec("matching", "C", "", "C"), choice_probs={"C": 0.9, "D": 0.1})
+    data = {
+        "meta": {"split": "test"},
+        "ranking": {"summary": {"total_entries": 2, "correct_answers": 1, "accuracy": 0.5}, "results": [stale, fine]},
+        "matching": {"summary": {"total_entries": 1, "correct_answers": 1, "accuracy": 1.0}, "results": [scored]},
+    }
+    src = tmp_path / "run.json"
+    src.write_text(json.dumps(data, indent=2))
+    diff_path = tmp_path / "diff.jsonl"
+    with open(diff_path, "w") as diff:
+        totals = rescore_files([src], workers=2, out_dir=tmp_path / "out", diff=diff, chunksize=1)
+    assert (totals["records"], totals["skipped"], totals["changed"]) == (2, 1, 1)
+
+    [change] = [json.loads(line) for line in diff_path.read_text().splitlines()]
+    assert change["index"] == 0
+    assert change["before"] == {"reasoning": "", "extracted_answer": "B", "is_correct": False}
+    assert change["after"] == {"reasoning": "t", "extracted_answer": "A", "is_correct": True}
+
+    out = json.loads((tmp_path / "out" / "run.json").read_text())
+    assert out["ranking"]["summary"]["correct_answers"] == 2
+    assert out["ranking"]["summary"]["accuracy"] == 1.0
+    assert out["matching"] == data["matching"]
+    assert json.loads(src.read_text()) == data  # dry-run source untouched
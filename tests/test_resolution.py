@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from PIL import Image
+
+from humor_eval.resolution import ImageBudget, budgeted
+
+torch = pytest.importorskip("torch")
+
+from humor_eval.models import prepare_inputs
+from humor_eval.tiny_model import build_tiny_model, build_tiny_processor, synthetic_entries
+
+
+def test_parse_and_real_llama_geometry():
+    assert ImageBudget.parse("full").params() == {} and not ImageBudget.parse("full")
+    assert ImageBudget.parse("side1120_tiles2").params() == {"max_side": 1120, "max_tiles": 2}
+    assert ImageBudget.parse("tiles2").name == "tiles2" and ImageBudget(560).name == "side560"
+    for bad in ("tiles", "side0", "half"):
+        with pytest.raises(ValueError):
+            ImageBudget.parse(bad)
+    # Without a processor the Llama 3.2V defaults apply: 560px tiles, at most 4.
+    image = Image.new("RGB", (1600, 1200))
+    assert ImageBudget().tiles(image) == 4
+    assert ImageBudget(max_tiles=2).size(1600, 1200) == (747, 560) and ImageBudget(max_tiles=2).tiles(image) == 2
+    assert ImageBudget(max_tiles=1).tiles(image) == 1 and ImageBudget(560).size(1600, 1200) == (560, 420)
+    assert ImageBudget(max_tiles=2).apply(Image.new("RGB", (300, 200))).size == (300, 200)
+
+
+def test_processor_cuts_budgeted_images_into_the_predicted_tiles():
+    processor = build_tiny_processor()
+    entries = synthetic_entries(8)
+    for budget in (ImageBudget(), ImageBudget(max_tiles=1), ImageBudget(max_side=16)):
+        view = budgeted(entries, budget, processor)
+        for i, entry in enumerate(view):
+            w, h = entries[i]["images"].size
+            assert abs(entry["images"].size[0] / entry["images"].size[1] - w / h) < 0.2
+            inputs = prepare_inputs(processor, entry["images"], entry["problem"])
+            assert int(inputs["aspect_ratio_mask"].sum()) == budget.tiles(entries[i]["images"], processor.image_processor)
+    assert sum(ImageBudget().tiles(e["images"], processor.image_processor) for e in entries) > len(entries)
+    view = budgeted(entries, ImageBudget(max_tiles=1), processor)
+    assert view.meta(3)["task"] == entries[3]["task"] and len(view.subset([1, 2])) == 2
+
+
+def test_run_simple_keys_journal_on_image_budget(tmp_path, monkeypatch):
+    import humor_eval.run_simple as run_simple_mod
+
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(4))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: build_tiny_model())
+    out = run_simple_mod.run_simple(max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, max_image_tiles=1)
+    assert json.loads(open(out).read())["meta"]["image_budget"] == {"max_tiles": 1}
+
+    def no_model(device=None, **options):
+        raise AssertionError("model loaded although every item is journaled")
+
+    monkeypatch.setattr(run_simple_mod, "load_model", no_model)
+    run_simple_mod.run_simple(max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, max_image_tiles=1, resume=True)
+    with pytest.raises(AssertionError):  # full-resolution results use a different journal key
+        run_simple_mod.run_simple(max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, resume=True)
+
+
+def test_sweep_picks_cheapest_budget_within_tolerance(tmp_path, monkeypatch):
+    import humor_eval.sweep as sweep_mod
+
+    monkeypatch.setattr(sweep_mod, "load_model", lambda device=None, **options: build_tiny_model())
+    monkeypatch.setattr(sweep_mod, "load_entries", lambda split: synthetic_entries(6))
+    summary_path = sweep_mod.run_sweep(
+        answer_modes=["simple"], max_new_tokens=[4], output_dir=str(tmp_path), show_progress=False,
+        image_budgets=["full", "tiles1"], accuracy_tolerance=1.0,
+    )
+    summary = json.loads(open(summary_path).read())
+    rows = {row["image_budget"]: row for row in summary["cells"]}
+    assert rows["full"]["cell"] == "test_simple_4_default" and rows["tiles1"]["cell"] == "test_simple_4_default_tiles1"
+    assert rows["tiles1"]["image_tiles"] == 1.0 < rows["full"]["image_tiles"]
+    assert rows["tiles1"]["prefill_tokens"] < rows["full"]["prefill_tokens"] and rows["full"]["items_per_s"] > 0
+    pick = summary["meta"]["image_budgets"]["cheapest"]["test_simple_4_default"]
+    assert pick["baseline"] == "full" and pick["image_budget"] == "tiles1" and pick["prefill_tokens_saved"] > 0
+    worse = [dict(row, accuracy=0.5 if row["image_budget"] == "full" else 0.4) for row in summary["cells"]]
+    assert sweep_mod.cheapest_budgets(worse, 0.05)["test_simple_4_default"]["image_budget"] == "full"
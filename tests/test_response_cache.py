@@ -0,0 +1,92 @@
+import json
+import multiprocessing as mp
+
+import pytest
+
+from humor_eval.response_cache import ResponseCache, response_key
+
+
+def _writer(path, worker):
+    with ResponseCache(path) as cache:
+        for i in range(40):
+            cache.put(f"{worker}-{i}", "x" * 10, "m", "simple")
+
+
+def test_key_depends_on_every_field():
+    base = dict(model_id="m", prompt="p", image_digest="i", max_new_tokens=8, answer_mode="simple", decoding={"do_sample": False})
+    keys = {response_key(**base)}
+    for field, value in [("model_id", "m2"), ("prompt", "p2"), ("image_digest", "i2"), ("max_new_tokens", 9), ("answer_mode", "reasoned"), ("decoding", {"do_sample": True})]:
+        keys.add(response_key(**dict(base, **{field: value})))
+    assert len(keys) == 7
+
+
+def test_lru_prune_keeps_recently_used(tmp_path):
+    with ResponseCache(tmp_path / "c.sqlite", max_bytes=25) as cache:
+        for key in ("a", "b", "c"):
+            cache.put(key, "0123456789", "m", "simple")
+        assert cache.get("a") == "0123456789"  # refresh "a"
+        assert cache.prune() == 1
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+        stats = cache.stats()
+    assert stats["entries"] == 2 and stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_concurrent_writers(tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    ResponseCache(path).close()
+    procs = [mp.get_context("spawn").Process(target=_writer, args=(path, w)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    with ResponseCache(path) as cache:
+        assert cache.stats()["entries"] == 160
+
+
+def test_fully_cached_rerun_skips_model_load(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+    from transformers import GenerationConfig
+
+    tiny = build_tiny_model()
+    cache_path = str(tmp_path / "responses.sqlite")
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(5))
+    monkeypatch.setattr(run_simple_mod, "load_generation_config", GenerationConfig)
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: tiny)
+    first = run_simple_mod.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "a"), show_progress=False, response_cache=cache_path)
+
+    def no_model(device=None, **options):
+        raise AssertionError("model should not load on a fully cached rerun")
+
+    monkeypatch.setattr(run_simple_mod, "load_model", no_model)
+    second = run_simple_mod.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "b"), show_progress=False, response_cache=cache_path)
+
+    a, b = json.load(open(first)), json.load(open(second))
+    assert a["ranking"] == b["ranking"] and a["matching"] == b["matching"]
+    assert b["meta"]["response_cache"]["hits"] == 5
+    assert b["meta"]["response_cache"]["misses"] == 0
+
+
+def test_precision_is_part_of_both_keys(tmp_path, monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.journal import read_journal
+    from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+    from transformers import GenerationConfig
+
+    tiny = build_tiny_model()
+    loads = []
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(3))
+    monkeypatch.setattr(run_simple_mod, "load_generation_config", GenerationConfig)
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: loads.append(options) or tiny)
+    options = dict(max_new_tokens=4, output_dir=str(tmp_path), show_progress=False, resume=True, response_cache=str(tmp_path / "r.sqlite"))
+    run_simple_mod.run_simple(**options)
+    out = run_simple_mod.run_simple(precision="bfloat16", **options)
+    # Neither the journal nor the cache hands the float32 answers to the bf16 run.
+    assert [o["precision"] for o in loads] == ["auto", "bfloat16"]
+    assert json.load(open(out))["meta"]["response_cache"]["hits"] == 0
+    weights = [rec["generation"].get("weights") for _, rec in read_journal(tmp_path / "results_simple_only_test.journal.jsonl")]
+    assert weights == [None] * 3 + [{"precision": "bfloat16"}] * 3
@@ -0,0 +1,71 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from humor_eval.evaluate import evaluate_entries
+from humor_eval.models import chat_score, choice_probabilities, prepare_inputs, present_choices
+from humor_eval.prefetch import Prefetcher
+from humor_eval.prefix_cache import PrefixCache
+from humor_eval.response_cache import ResponseCache
+from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+
+def test_present_choices():
+    assert present_choices("pick one:\nA) x\nB) y\n") == ["A", "B"]
+    assert present_choices("A) a\nB) b\nC) c\nD) d\nE) e") == ["A", "B", "C", "D", "E"]
+    assert present_choices("no options listed") == ["A", "B", "C", "D", "E"]
+
+
+def test_choice_probabilities_renormalise_over_letters():
+    logits = torch.tensor([0.0, 2.0, 1.0, 5.0])
+    probs = choice_probabilities(logits, {"A": [1], "B": [2, 0]})
+    assert probs["A"] == pytest.approx(torch.e**2 / (torch.e**2 + torch.e + 1))
+    assert sum(probs.values()) == pytest.approx(1.0)
+
+
+def test_scored_matches_single_forward_pass():
+    processor, model = build_tiny_model()
+    entry = synthetic_entries(1)[0]
+    probs = chat_score(processor, model, entry["images"], entry["problem"])
+    assert list(probs) == ["A", "B"]
+    inputs = prepare_inputs(processor, entry["images"], entry["problem"], "scored")
+    with torch.no_grad():
+        logits = model(**inputs).logits[0, -1]
+    tokenizer = processor.tokenizer
+    ids = [tokenizer.convert_tokens_to_ids(letter) for letter in "AB"]
+    expected = torch.softmax(logits[ids], dim=-1)
+    assert [probs["A"], probs["B"]] == pytest.approx(expected.tolist(), abs=1e-5)
+
+
+def _probs(results):
+    return [r["choice_probs"] for r in results]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"batch_size": 3}, {"prefix_cache": PrefixCache()}, {"batch_size": 2, "prefetcher": Prefetcher(depth=2, pin_memory=False)}],
+)
+def test_scored_paths_agree(kwargs):
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(6)
+    plain = evaluate_entries(entries, processor, model, "scored", max_new_tokens=8, show_progress=False)
+    other = evaluate_entries(entries, processor, model, "scored", max_new_tokens=8, show_progress=False, **kwargs)
+    assert [r["extracted_answer"] for r in other] == [r["extracted_answer"] for r in plain]
+    for a, b in zip(_probs(other), _probs(plain)):
+        assert list(a) == list(b)
+        assert list(a.values()) == pytest.approx(list(b.values()), abs=1e-4)
+
+
+def test_scored_records_and_cache_roundtrip(tmp_path):
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(4)
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    first = evaluate_entries(entries, processor, model, "scored", max_new_tokens=8, show_progress=False, response_cache=cache)
+    for rec, entry in zip(first, entries):
+        assert rec["extracted_answer"] == max(rec["choice_probs"], key=rec["choice_probs"].get)
+        assert set(rec["choice_probs"]) == set(present_choices(entry["problem"]))
+        assert rec["is_correct"] == (rec["extracted_answer"] == entry["answer"])
+    again = evaluate_entries(entries, processor, model, "scored", max_new_tokens=8, show_progress=False, response_cache=cache)
+    assert again == first
+    assert cache.stats()["hits"] == len(entries)
+    cache.close()
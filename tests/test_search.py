@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from humor_eval.search import SearchIndex, main
+
+
+def _record(task, number, reasoning, correct=True):
+    return {
+        "contest_number": number,
+        "problem": f"caption contest {number}",
+        "correct_answer": "A",
+        "model_answer": f"<think>{reasoning}</think><answer>A</answer>",
+        "reasoning": reasoning,
+        "extracted_answer": "A" if correct else "B",
+        "task": task,
+        "is_correct": correct,
+    }
+
+
+def _write(path, records, split="test", mode="reasoned"):
+    nested = {
+        task: {"summary": {"split": split, "answer_mode": mode}, "results": [r for r in records if r["task"] == task]}
+        for task in ("ranking", "matching")
+    }
+    path.write_text(json.dumps(nested))
+    return path
+
+
+def test_term_phrase_prefix_and_filters(tmp_path):
+    run = _write(
+        tmp_path / "a.json",
+        [
+            _record("ranking", 1, "The pun on bark is the joke"),
+            _record("matching", 2, "A double meaning of the word bark", correct=False),
+            _record("matching", 3, "The absurdity of a dog at a desk"),
+        ],
+    )
+    with SearchIndex(tmp_path / "idx.sqlite") as index:
+        assert index.update([run])["records"] == 3
+        assert {h["contest_number"] for h in index.search("bark")} == {1, 2}
+        assert [h["contest_number"] for h in index.search('"double meaning"')] == [2]
+        assert [h["contest_number"] for h in index.search("absurd*")] == [3]
+        assert [h["contest_number"] for h in index.search("bark", task="ranking")] == [1]
+        hit = index.search("bark", correct=False)[0]
+        assert hit["contest_number"] == 2 and "[bark]" in hit["snippet"] and hit["answer_mode"] == "reasoned"
+        assert index.search("bark", split="validation") == []
+        with pytest.raises(ValueError):
+            index.search('"unbalanced')
+
+
+def test_update_only_reads_new_and_changed_files(tmp_path, capsys):
+    (tmp_path / "runs").mkdir()
+    first = _write(tmp_path / "runs" / "a.json", [_record("ranking", 1, "irony")])
+    second = _write(tmp_path / "runs" / "b.json", [_record("ranking", 2, "flat string")], mode="simple")
+    index = SearchIndex(tmp_path / "idx.sqlite")
+    assert index.update([tmp_path / "runs"]) == {"added": 2, "updated": 0, "unchanged": 0, "removed": 0, "records": 2}
+    assert index.update([tmp_path / "runs"])["unchanged"] == 2
+    _write(second, [_record("ranking", 2, "irony again"), _record("matching", 4, "irony")], mode="simple")
+    os.utime(second, ns=(1, 1))  # a different mtime, whatever the clock resolution
+    stats = index.update([tmp_path / "runs"])
+    assert (stats["updated"], stats["unchanged"], stats["records"]) == (1, 1, 2)
+    assert sorted(h["contest_number"] for h in index.search("irony")) == [1, 2, 4]
+    first.unlink()
+    assert index.update([tmp_path / "runs"], prune=True)["removed"] == 1
+    assert index.stats()["records"] == 2 and index.search("flat") == []
+    index.close()
+
+    main(["--index", str(tmp_path / "idx.sqlite"), "query", "irony", "--answer_mode", "simple", "--json"])
+    hits = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(h["contest_number"] for h in hits) == [2, 4]
@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from humor_eval.shard import main, parse_shard, shard_indices, shard_path
+
+
+def test_parse_and_partition():
+    assert parse_shard(None) is None
+    assert parse_shard("1/4") == (1, 4)
+    for bad in ("4/4", "-1/2", "x", "1/0"):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+    parts = [shard_indices(10, (i, 3)) for i in range(3)]
+    assert sorted(sum(parts, [])) == list(range(10))
+    assert shard_path(Path("out/r.journal.jsonl"), (1, 4)) == Path("out/r.journal.shard1of4.jsonl")
+
+
+def _body(path):
+    data = json.loads(open(path).read())
+    return {k: v for k, v in data.items() if k != "meta"}
+
+
+@pytest.fixture
+def tiny_runner(monkeypatch):
+    pytest.importorskip("torch")
+    import humor_eval.run_simple as run_simple_mod
+    from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+    tiny = build_tiny_model()
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(7))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: tiny)
+    return run_simple_mod
+
+
+def test_shards_merge_to_unsharded_results(tmp_path, tiny_runner):
+    clean = tiny_runner.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "clean"), show_progress=False)
+    out = str(tmp_path / "sharded")
+    for i in range(3):
+        part = tiny_runner.run_simple(max_new_tokens=6, output_dir=out, show_progress=False, shard=f"{i}/3")
+        assert json.loads(open(part).read())["meta"]["shard"] == f"{i}/3"
+    merged = tiny_runner.merge_simple("test", 6, out, 3)
+    assert _body(merged) == _body(clean)
+    assert json.loads(open(merged).read())["meta"]["shards"] == 3
+
+
+def test_merge_cli_reads_settings_from_the_journals(tmp_path, tiny_runner):
+    clean = tiny_runner.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "clean"), show_progress=False)
+    out = str(tmp_path / "sharded")
+    for i in range(2):
+        tiny_runner.run_simple(max_new_tokens=6, output_dir=out, show_progress=False, shard=f"{i}/2")
+    main(["merge", "--num_shards", "2", "--output_dir", out])
+    merged = sorted(Path(out).glob("results_simple_only_test_2*.json"))[-1]
+    assert _body(merged) == _body(clean)
+    assert json.loads(merged.read_text())["meta"]["max_new_tokens"] == 6
+
+    # A second run with other settings in the same journals: refuse to guess.
+    tiny_runner.run_simple(max_new_tokens=4, output_dir=out, show_progress=False, shard="0/2")
+    with pytest.raises(SystemExit):
+        main(["merge", "--num_shards", "2", "--output_dir", out])
+
+
+def test_missing_shard_is_an_error(tmp_path, tiny_runner):
+    out = str(tmp_path / "sharded")
+    tiny_runner.run_simple(max_new_tokens=6, output_dir=out, show_progress=False, shard="0/2")
+    with pytest.raises(FileNotFoundError):
+        tiny_runner.merge_simple("test", 6, out, 2)
+
+
+def test_worker_processes_merge_deterministically(tmp_path, tiny_runner, monkeypatch):
+    import humor_eval.shard as shard
+
+    monkeypatch.setattr(shard, "START_METHOD", "fork")  # keep the monkeypatched loaders
+    clean = tiny_runner.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "clean"), show_progress=False)
+    merged = tiny_runner.run_simple(max_new_tokens=6, output_dir=str(tmp_path / "workers"), num_workers=2)
+    assert _body(merged) == _body(clean)
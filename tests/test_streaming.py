@@ -0,0 +1,109 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from transformers import LogitsProcessor, LogitsProcessorList
+
+from humor_eval.evaluate import evaluate_entries
+from humor_eval.models import extract_answer, prepare_batch_inputs, prepare_inputs
+from humor_eval.streaming import AnswerWatcher, stream_generate
+from humor_eval.tiny_model import build_tiny_model, synthetic_entries
+
+
+@pytest.mark.parametrize(
+    "text, mode, heuristic, reason",
+    [
+        ("<think>x</think><answer>B</answer> then A again", "reasoned", False, "answer"),
+        ("<SUMMARY>s</SUMMARY><CONCLUSION>The answer is C.</CONCLUSION> and E", "reasoned", True, "conclusion"),
+        ("<SUMMARY>s</SUMMARY><CONCLUSION>The answer is C.</CONCLUSION> and E", "reasoned", False, None),
+        ("<|begin_of_box|>E<|end_of_box|> trailing D", "reasoned", True, "box"),
+        ("<|begin_of_box|>E<|end_of_box|> trailing D", "reasoned", False, None),
+        ("A\nBecause B is worse", "simple", True, "letter"),
+        ("A\nBecause B is worse", "simple", False, None),
+        ("A\nBecause B is worse", "reasoned", True, None),
+        ("<answer>none</answer><conclusion>D</conclusion> C", "reasoned", True, None),
+    ],
+)
+def test_watcher_stops_where_offline_parser_is_fixed(text, mode, heuristic, reason):
+    for chunk in (1,) if reason == "letter" else (1, 3):
+        watcher = AnswerWatcher(mode, heuristic)
+        stopped_at = None
+        for pos in range(0, len(text), chunk):
+            if watcher.feed(text[pos:pos + chunk]):
+                stopped_at = pos + chunk
+                break
+        assert watcher.stop_reason == reason
+        if reason is not None:
+            assert extract_answer(text[:stopped_at]) == extract_answer(watcher.text)
+            if reason in ("answer", "conclusion"):
+                assert extract_answer(text[:stopped_at]) == extract_answer(text)
+
+
+def test_heuristic_stop_can_change_the_answer():
+    text = "A\n\nOn reflection, the caption fits B"
+    answers = {}
+    for heuristic in (False, True):
+        watcher = AnswerWatcher("simple", heuristic)
+        for char in text:
+            if watcher.feed(char):
+                break
+        answers[heuristic] = extract_answer(watcher.text)
+    assert answers == {False: "B", True: "A"}
+
+
+def test_streaming_without_stop_matches_plain_generation():
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(5)
+    plain = evaluate_entries(entries, processor, model, "reasoned", max_new_tokens=10, show_progress=False)
+    for batch_size in (1, 2):
+        streamed = evaluate_entries(entries, processor, model, "reasoned", max_new_tokens=10, batch_size=batch_size, show_progress=False, early_stop=True)
+        assert [r["model_answer"] for r in streamed] == [r["model_answer"] for r in plain]
+        assert all(r["stop_reason"] in ("eos", "max_new_tokens") and r["tokens_saved"] == 0 for r in streamed)
+
+
+class _Script(LogitsProcessor):
+    """Force each row to emit a fixed token script."""
+
+    def __init__(self, prompt_len, scripts):
+        self.prompt_len = prompt_len
+        self.scripts = scripts
+
+    def __call__(self, input_ids, scores):
+        step = input_ids.shape[-1] - self.prompt_len
+        forced = torch.full_like(scores, float("-inf"))
+        for row, script in enumerate(self.scripts):
+            forced[row, script[min(step, len(script) - 1)]] = 0.0
+        return forced
+
+
+def _encode(processor, text):
+    return processor.tokenizer.encode(text, add_special_tokens=False)
+
+
+def test_forced_answer_tag_stops_early():
+    processor, model = build_tiny_model()
+    entry = synthetic_entries(1)[0]
+    inputs = prepare_inputs(processor, entry["images"], entry["problem"], "reasoned")
+    script = _encode(processor, "<think>hm</think><answer>B</answer> and then A forever")
+    processors = LogitsProcessorList([_Script(inputs["input_ids"].shape[-1], [script])])
+    [(resp, info)] = stream_generate(processor, model, inputs, 64, "reasoned", logits_processor=processors)
+    assert resp == "<think>hm</think><answer>B</answer>"
+    assert extract_answer(resp) == "B"
+    assert info == {"stop_reason": "answer", "generated_tokens": len(resp), "tokens_saved": 64 - len(resp)}
+
+
+def test_batch_rows_stop_independently():
+    processor, model = build_tiny_model()
+    entries = synthetic_entries(2)
+    inputs = prepare_batch_inputs(processor, [e["images"] for e in entries], [e["problem"] for e in entries], "reasoned")
+    eos = processor.tokenizer.eos_token_id
+    scripts = [
+        _encode(processor, "<CONCLUSION>C</CONCLUSION> tail tail tail"),
+        _encode(processor, "no tags here") + [eos],
+    ]
+    processors = LogitsProcessorList([_Script(inputs["input_ids"].shape[-1], scripts)])
+    (first, first_info), (second, second_info) = stream_generate(
+        processor, model, inputs, 40, "reasoned", heuristic=True, logits_processor=processors
+    )
+    assert first == "<CONCLUSION>C</CONCLUSION>" and first_info["stop_reason"] == "conclusion"
+    assert second.startswith("no tags here") and second_info["stop_reason"] == "eos"
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from humor_eval.sweep import Cell, grid, reusable
+
+pytest.importorskip("torch")
+
+from humor_eval.models import PROMPT_VARIANTS, prompt_instruction
+from humor_eval.tiny_model import build_stub_model, synthetic_entries
+
+
+def test_grid_runs_largest_budget_first_per_group():
+    cells = grid(["test", "test"], ["simple", "reasoned"], [16, 64, 16], ["default"])
+    assert cells[:2] == [Cell("test", "simple", 64, "default"), Cell("test", "simple", 16, "default")]
+    assert len(cells) == 4
+    source, small = Cell("test", "reasoned", 64, "default"), Cell("test", "reasoned", 16, "default")
+    assert reusable({"perf": {"generated_tokens": 10}}, source, small)
+    assert not reusable({"perf": {"generated_tokens": 20}}, source, small)
+    assert not reusable({"perf": {"generated_tokens": 64}}, source, Cell("test", "reasoned", 64, "default"))
+    assert not reusable({}, source, small)
+    assert reusable({}, source._replace(answer_mode="scored"), small._replace(answer_mode="scored"))
+
+
+def _results(path):
+    data = json.loads(open(path).read())
+    return [{k: v for k, v in r.items() if k != "perf"} for task in ("ranking", "matching") for r in data[task]["results"]]
+
+
+def test_sweep_loads_once_and_matches_separate_runs(tmp_path, monkeypatch):
+    import humor_eval.run_simple as run_simple_mod
+    import humor_eval.sweep as sweep_mod
+
+    stub = build_stub_model()
+    calls = {"model": 0, "splits": []}
+
+    def load_model(device=None, **options):
+        calls["model"] += 1
+        return stub
+
+    def load_entries(split):
+        calls["splits"].append(split)
+        return synthetic_entries(5)
+
+    monkeypatch.setattr(sweep_mod, "load_model", load_model)
+    monkeypatch.setattr(sweep_mod, "load_entries", load_entries)
+    summary_path = sweep_mod.run_sweep(
+        splits=["test", "test_hard"], answer_modes=["simple", "scored"], max_new_tokens=[80, 70, 16],
+        prompt_variants=["default", "plain"], output_dir=str(tmp_path / "sweep"), show_progress=False,
+    )
+    summary = json.loads(open(summary_path).read())
+    assert calls == {"model": 1, "splits": ["test", "test_hard"]}
+    rows = {row["cell"]: row for row in summary["cells"]}
+    assert len(rows) == 2 * 2 * 3 * 2
+    # The stub answers in 65 tokens: 70 reuses 80, 16 cannot; scored always reuses.
+    assert rows["test_simple_70_default"]["copied"] == 5 and rows["test_simple_70_default"]["generated"] == 0
+    assert rows["test_simple_16_plain"]["copied"] == 0 and rows["test_simple_16_plain"]["generated"] == 5
+    assert rows["test_hard_scored_16_plain"]["copied"] == 5
+    assert summary["meta"]["separate_jobs_estimate_s"] >= summary["meta"]["wall_s"]
+
+    monkeypatch.setattr(run_simple_mod, "load_entries", lambda split: synthetic_entries(5))
+    monkeypatch.setattr(run_simple_mod, "load_model", lambda device=None, **options: stub)
+    for name in ("test_simple_70_default", "test_simple_16_plain", "test_hard_scored_16_plain"):
+        cell = rows[name]
+        with prompt_instruction(PROMPT_VARIANTS[cell["prompt_variant"]]):
+            alone = run_simple_mod.run_simple(
+                split=cell["split"], max_new_tokens=cell["max_new_tokens"], answer_mode=cell["answer_mode"],
+                output_dir=str(tmp_path / name), show_progress=False,
+            )
+        assert _results(cell["output"]) == _results(alone)
+    assert _results(rows["test_simple_80_plain"]["output"]) != _results(rows["test_simple_80_default"]["output"])
+
+
+def test_sweep_cli_takes_the_runner_flags(tmp_path, monkeypatch):
+    import humor_eval.sweep as sweep_mod
+    from transformers import GenerationConfig
+
+    loads = []
+    monkeypatch.setattr(sweep_mod, "load_model", lambda device=None, **options: loads.append(options) or build_stub_model())
+    monkeypatch.setattr(sweep_mod, "load_entries", lambda split: synthetic_entries(3))
+    monkeypatch.setattr(sweep_mod, "load_generation_config", GenerationConfig)
+    out = tmp_path / "sweep"
+    sweep_mod.main([
+        "--max_new_tokens", "80", "16", "--early_stop", "--precision", "float32", "--no_progress",
+        "--response_cache", str(tmp_path / "r.sqlite"), "--output_dir", str(out),
+    ])
+    [summary_path] = out.glob("sweep_summary_*.json")
+    summary = json.loads(summary_path.read_text())
+    assert loads == [{"precision": "float32", "max_cpu_memory_gb": None, "offload_dir": str(out / "offload")}]
+    assert summary["meta"]["early_stop"]["stop_reasons"] and "response_cache" in summary["meta"]
+    for row in summary["cells"]:
+        data = json.loads(open(row["output"]).read())
+        assert all("stop_reason" in rec for rec in data["ranking"]["results"])
+    with pytest.raises(ValueError, match="--shard"):
+        sweep_mod.run_sweep(shard="0/2", output_dir=str(out))
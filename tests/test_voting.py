@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from transformers import LogitsProcessor, LogitsProcessorList
+
+from humor_eval.models import chat_infer, prepare_inputs
+from humor_eval.tiny_model import build_stub_model, build_tiny_model, synthetic_entries
+from humor_eval.voting import VoteStoppingCriteria, Voter, decided, majority, summarize_votes, tally
+
+
+def test_tally_majority_and_decided():
+    votes = tally(["B", "Unknown", "A", "B", "A"])
+    assert votes == {"B": 2, "A": 2} and majority(votes) == "B"
+    assert majority({}) == "Unknown"
+    assert decided({"A": 3}, 2) and not decided({"A": 3}, 3)
+    assert decided({"A": 3, "C": 1}, 1) and not decided({"A": 2, "C": 1}, 1)
+    with pytest.raises(ValueError):
+        Voter(1)
+
+
+def test_low_temperature_samples_match_greedy_with_shared_prefill():
+    processor, model = build_tiny_model()
+    entry = synthetic_entries(1)[0]
+    greedy = chat_infer(processor, model, entry["images"], entry["problem"], 12, "reasoned")
+    inputs = prepare_inputs(processor, entry["images"], entry["problem"], "reasoned")
+    resp, info = Voter(3, temperature=1e-4).generate(processor, model, inputs, 12, "reasoned")
+    assert info["samples"] == [greedy] * 3 and resp == greedy
+    assert info["prefill_s"] > 0 and info["generated_tokens"] == 3 * 12
+    again = Voter(3, temperature=1.5, seed=7)
+    assert again.generate(processor, model, inputs, 12, "reasoned")[1]["samples"] == again.generate(
+        processor, model, inputs, 12, "reasoned"
+    )[1]["samples"]
+
+
+def test_vote_stops_once_the_majority_is_out_of_reach():
+    processor, _ = build_stub_model()
+    tokenizer = processor.tokenizer
+    answer = tokenizer.encode("<answer>A</answer>", add_special_tokens=False)
+    filler = tokenizer.encode(" more thinking" * 20, add_special_tokens=False)
+    rows = [answer] * 3 + [filler] * 2
+    criteria = VoteStoppingCriteria(tokenizer, 1, 5, "reasoned", [tokenizer.eos_token_id])
+    ids = torch.zeros(5, 1, dtype=torch.long)
+    for step in range(len(filler)):
+        ids = torch.cat([ids, torch.tensor([[row[min(step, len(row) - 1)]] for row in rows])], dim=-1)
+        if criteria(ids, None).all():
+            break
+    assert criteria.decided_early and step == len(answer) - 1
+    assert criteria.answers == {0: "A", 1: "A", 2: "A"}
+
+
+class _Script(LogitsProcessor):
+    """Force each row to emit a fixed token script."""
+
+    def __init__(self, prompt_len, scripts):
+        self.prompt_len = prompt_len
+        self.scripts = scripts
+
+    def __call__(self, input_ids, scores):
+        step = input_ids.shape[-1] - self.prompt_len
+        forced = torch.full_like(scores, float("-inf"))
+        for row, script in enumerate(self.scripts):
+            forced[row, script[min(step, len(script) - 1)]] = 0.0
+        return forced
+
+
+def test_unfinished_samples_do_not_vote():
+    processor, model = build_tiny_model()
+    entry = synthetic_entries(1)[0]
+    inputs = prepare_inputs(processor, entry["images"], entry["problem"], "reasoned")
+    encode = lambda text: processor.tokenizer.encode(text, add_special_tokens=False)
+    # Two rows are still "leaning B" when the three A answers decide the vote.
+    scripts = [encode("<answer>A</answer>")] * 3 + [encode(" leaning B" * 20)] * 2
+    processors = LogitsProcessorList([_Script(inputs["input_ids"].shape[-1], scripts)])
+    resp, info = Voter(5).generate(processor, model, inputs, 64, "reasoned", logits_processor=processors)
+    assert info["decided_early"] and resp == "<answer>A</answer>"
+    assert info["answers"] == ["A"] * 3 + [None] * 2 and info["votes"] == {"A": 3}
+    assert "B" in info["samples"][3]
+    assert summarize_votes([{"vote": info}])["unfinished_samples"] == 2
+
+
+def test_run_dual_with_num_samples(tmp_path, monkeypatch):
+    import humor_eval.run_dual as run_dual_mod
+
+    monkeypatch.setattr(run_dual_mod, "load_entries", lambda split: synthetic_entries(4))
+    monkeypatch.setattr(run_dual_mod, "load_model", lambda device=None, **options: build_stub_model())
+    out = tmp_path / "vote"
+    _, reasoned = run_dual_mod.run_dual(max_new_tokens=80, output_dir=str(out), show_progress=False, num_samples=3)
+    data = json.loads(open(reasoned).read())
+    for rec in data["ranking"]["results"] + data["matching"]["results"]:
+        vote = rec["vote"]
+        finished = [a for a in vote["answers"] if a is not None]
+        assert len(vote["samples"]) == 3 and sum(vote["votes"].values()) == sum(a != "Unknown" for a in finished)
+        assert rec["extracted_answer"] == majority(vote["votes"]) and rec["model_answer"] in vote["samples"]
+    assert data["meta"]["vote"]["num_samples"] == 3 and data["meta"]["vote"]["reasoned"]["items"] == 4
+    assert summarize_votes(data["ranking"]["results"])["unanimous"] == len(data["ranking"]["results"])
+
+    def no_model(device=None, **options):
+        raise AssertionError("model loaded although every item is journaled")
+
+    monkeypatch.setattr(run_dual_mod, "load_model", no_model)
+    run_dual_mod.run_dual(max_new_tokens=80, output_dir=str(out), show_progress=False, num_samples=3, resume=True)
+    with pytest.raises(AssertionError):  # greedy results use a different journal key
+        run_dual_mod.run_dual(max_new_tokens=80, output_dir=str(out), show_progress=False, resume=True)
+    with pytest.raises(ValueError):
+        run_dual_mod.run_dual(output_dir=str(tmp_path), num_samples=3, response_cache=str(tmp_path / "rc.sqlite"))